@@ -0,0 +1,87 @@
+"""Measure commit latency and throughput for each durability mode.
+
+Usage:
+    python benchmarks/durability.py [--engine journal] [--events 2000] [--batch 1] [--dir PATH]
+
+Run it with ``--dir`` on the filesystem the logs will live on: fsync is nearly
+free on tmpfs, so results from ``/tmp`` say little about a build farm's disks.
+Latency is the wall time of one ``append_many`` call; throughput counts the final
+``sync()`` too, so batch mode is charged for the fsyncs it deferred.
+"""
+
+import argparse
+import datetime as dt
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from plogr.storage import STORES, open_store  # noqa: E402
+from plogr.storage.durability import DURABILITY_MODES  # noqa: E402
+
+
+def _events(count: int) -> List[Dict[str, object]]:
+    start = dt.datetime(2025, 1, 1)
+    return [
+        {
+            "name": f"pkg{i % 500}",
+            "manager": "dnf",
+            "action": "install" if i % 4 else "remove",
+            "scope": "system",
+            "date": (start + dt.timedelta(seconds=i)).isoformat(),
+            "removed": not i % 4,
+            "version": "1.0-1.fc42",
+        }
+        for i in range(count)
+    ]
+
+
+def run(engine: str, mode: str, events: int, batch: int, base_dir: Path) -> Dict[str, float]:
+    """Append *events* in commits of *batch* and return latency/throughput figures"""
+    with tempfile.TemporaryDirectory(dir=base_dir) as data_dir:
+        store = open_store(engine, Path(data_dir), settings={"durability": mode})
+        store.ensure()
+        payload = _events(events)
+        latencies: List[float] = []
+
+        started = time.perf_counter()
+        for offset in range(0, events, batch):
+            t0 = time.perf_counter()
+            store.append_many(payload[offset : offset + batch])
+            latencies.append(time.perf_counter() - t0)
+        store.sync()
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "events_per_s": events / elapsed,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engine", choices=sorted(STORES), default="journal")
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=1, help="events per commit")
+    parser.add_argument("--dir", type=Path, default=None, help="where to create test logs")
+    args = parser.parse_args()
+
+    print(f"engine={args.engine} events={args.events} batch={args.batch}")
+    print(f"{'mode':<8} {'p50 ms':>9} {'p99 ms':>9} {'events/s':>10}")
+    for mode in DURABILITY_MODES:
+        result = run(args.engine, mode, args.events, max(args.batch, 1), args.dir)
+        print(
+            f"{mode:<8} {result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f} "
+            f"{result['events_per_s']:>10.0f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
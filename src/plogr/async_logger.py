@@ -0,0 +1,148 @@
+"""Asyncio front end to ``PackageLogger`` for event-loop applications"""
+
+import asyncio
+import datetime as dt
+import logging
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Mapping, Optional, TypeVar
+
+from .config import Config
+from .logger import PackageLogger
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Records handed from the executor to the event loop per step of ``query``.
+QUERY_CHUNK = 512
+
+
+class AsyncPackageLogger:
+    """Log and query package events without blocking the event loop.
+
+    Every file operation runs off the loop. Writes go through the background
+    writer of the wrapped ``PackageLogger``: events from callers awaiting at
+    the same time are committed together, one lock and one write per batch.
+    Handing events to the writer, which waits while its queue is full, reads,
+    flushes and shutdown run on a dedicated executor. Validation, event
+    building and storage are the sync logger's own code.
+
+    Create one with ``await AsyncPackageLogger.open(config)``, which sets up
+    the log directory off the loop, and close it with ``await aclose()`` or
+    ``async with``.
+    """
+
+    def __init__(self, logger: PackageLogger, executor: Optional[Executor] = None) -> None:
+        """Wrap *logger*, starting its background writer if it has none
+
+        Args:
+            executor: Runs reads and shutdown; a private single-thread pool by default
+        """
+        if logger.writer is None:
+            logger.enable_background_writes()
+        self.logger = logger
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(1, thread_name_prefix="plogr-async")
+
+    @classmethod
+    async def open(
+        cls, config: Optional[Config] = None, executor: Optional[Executor] = None
+    ) -> "AsyncPackageLogger":
+        """Open the log selected by *config* without blocking the loop"""
+        pool = executor or ThreadPoolExecutor(1, thread_name_prefix="plogr-async")
+        loop = asyncio.get_running_loop()
+        logger = await loop.run_in_executor(pool, lambda: PackageLogger(config, async_writes=True))
+        instance = cls(logger, pool)
+        instance._own_executor = executor is None
+        return instance
+
+    async def __aenter__(self) -> "AsyncPackageLogger":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def log_package(
+        self,
+        name: str,
+        manager: str,
+        action: str,
+        version: Optional[str] = None,
+        metadata: Optional[Dict] = None,
+        transaction_id: Optional[str] = None,
+        timestamp: Optional[str] = None,
+    ) -> bool:
+        """Log a package action; see ``PackageLogger.log_package``"""
+        future = await self._run(
+            lambda: self.logger.submit_package(
+                name, manager, action, version, metadata, transaction_id, timestamp
+            )
+        )
+        return await self._written(future) == 1
+
+    async def log_packages(
+        self, events: Iterable[Mapping[str, Any]], transaction_id: Optional[str] = None
+    ) -> int:
+        """Log several package actions in one write; see ``PackageLogger.log_packages``"""
+        future = await self._run(lambda: self.logger.submit_packages(events, transaction_id))
+        return await self._written(future)
+
+    async def query(
+        self,
+        name: Optional[str] = None,
+        manager: Optional[str] = None,
+        since: Optional[dt.date] = None,
+        until: Optional[dt.date] = None,
+        action: Optional[str] = None,
+        removed: Optional[bool] = None,
+        metadata: Optional[Mapping[str, Any]] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the records ``PackageLogger.query`` returns, as they are read
+
+        Records come from ``PackageLogger.stream``, fetched on the executor
+        ``QUERY_CHUNK`` at a time, so a long result is never collected in a
+        list and other tasks run between chunks.
+        """
+        records = self.logger.stream(
+            name, manager, since, until, action=action, removed=removed, metadata=metadata
+        )
+
+        def fetch() -> list:
+            return [record for _, record in islice(records, QUERY_CHUNK)]
+
+        while True:
+            try:
+                chunk = await self._run(fetch)
+            except Exception as e:
+                logger.error(f"Error querying log file: {e}")
+                return
+            for record in chunk:
+                yield record
+            if len(chunk) < QUERY_CHUNK:
+                return
+
+    async def get_statistics(self, recompute: bool = False) -> Dict[str, Any]:
+        """Return the status counters; see ``PackageLogger.get_statistics``"""
+        return await self._run(lambda: self.logger.get_statistics(recompute))
+
+    async def flush(self) -> None:
+        """Return once every event logged so far is written and synced"""
+        await self._run(self.logger.flush)
+
+    async def aclose(self) -> None:
+        """Drain pending writes, stop the writer thread and release the executor"""
+        await self._run(self.logger.close)
+        if self._own_executor:
+            self._executor.shutdown(wait=False)
+
+    async def _run(self, func: Callable[[], T]) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func)
+
+    @staticmethod
+    async def _written(future: "Future[int]") -> int:
+        try:
+            return await asyncio.wrap_future(future)
+        except Exception:
+            # The writer thread has logged the error.
+            return 0
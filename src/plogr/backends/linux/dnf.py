@@ -93,6 +93,9 @@ class DnfBackend(PackageBackend):
     def register_transaction(self, transaction: Any) -> bool:
         """Register a DNF transaction for logging
 
+        The whole transaction is handed to the logger as one batch, so it is
+        recorded with a single write.
+
         Args:
             transaction: DNF transaction object with install_set and remove_set attributes
 
@@ -103,58 +106,37 @@ class DnfBackend(PackageBackend):
             return False
 
         success = True
-
-        for pkg in getattr(transaction, "install_set", []):
-            if not self._log_package_install(pkg):
-                success = False
-
-        for pkg in getattr(transaction, "remove_set", []):
-            if not self._log_package_remove(pkg):
-                success = False
+        events: list[dict[str, Any]] = []
+
+        for action, packages in (
+            ("install", getattr(transaction, "install_set", [])),
+            ("remove", getattr(transaction, "remove_set", [])),
+        ):
+            for pkg in packages:
+                event = self._package_event(pkg, action)
+                if event is None:
+                    success = False
+                else:
+                    events.append(event)
+
+        if self.logger and events:
+            try:
+                self.logger.log_packages(events)
+            except Exception as e:
+                logger.error(f"Error logging DNF transaction: {e}")
+                return False
 
         return success
 
-    def _log_package_install(self, pkg: Any) -> bool:
-        """Log an installed package
-
-        Args:
-            pkg: Package object from DNF
-
-        Returns:
-            bool: True if logging was successful, False otherwise
-        """
-        try:
-            name = getattr(pkg, "name", "")
-            version = getattr(pkg, "version", "")
-            release = getattr(pkg, "release", "")
-            full_version = f"{version}-{release}" if version and release else version
-
-            if self.logger:
-                self.logger.log_package(
-                    name=name,
-                    manager=self.name,
-                    action="install",
-                    version=full_version,
-                    metadata={
-                        "arch": getattr(pkg, "arch", None),
-                        "repo": getattr(pkg, "reponame", None),
-                        "epoch": getattr(pkg, "epoch", None),
-                    },
-                )
-            return True
-
-        except Exception as e:
-            logger.error(f"Error logging package install {getattr(pkg, 'name', 'unknown')}: {e}")
-            return False
-
-    def _log_package_remove(self, pkg: Any) -> bool:
-        """Log a removed package
+    def _package_event(self, pkg: Any, action: str) -> Optional[dict[str, Any]]:
+        """Build the plogr event for a package in a transaction
 
         Args:
             pkg: Package object from DNF
+            action: Either "install" or "remove"
 
         Returns:
-            bool: True if logging was successful, False otherwise
+            Event mapping for ``PackageLogger.log_packages``, or None on error
         """
         try:
             name = getattr(pkg, "name", "")
@@ -162,20 +144,18 @@ class DnfBackend(PackageBackend):
             release = getattr(pkg, "release", "")
             full_version = f"{version}-{release}" if version and release else version
 
-            if self.logger:
-                self.logger.log_package(
-                    name=name,
-                    manager=self.name,
-                    action="remove",
-                    version=full_version,
-                    metadata={
-                        "arch": getattr(pkg, "arch", None),
-                        "repo": getattr(pkg, "reponame", None),
-                        "epoch": getattr(pkg, "epoch", None),
-                    },
-                )
-            return True
+            return {
+                "name": name,
+                "manager": self.name,
+                "action": action,
+                "version": full_version,
+                "metadata": {
+                    "arch": getattr(pkg, "arch", None),
+                    "repo": getattr(pkg, "reponame", None),
+                    "epoch": getattr(pkg, "epoch", None),
+                },
+            }
 
         except Exception as e:
-            logger.error(f"Error logging package removal {getattr(pkg, 'name', 'unknown')}: {e}")
-            return False
+            logger.error(f"Error reading package {action} {getattr(pkg, 'name', 'unknown')}: {e}")
+            return None
@@ -2,7 +2,6 @@ import click
 import os
 from functools import wraps
 import datetime as dt
-import json
 import sys
 
 
@@ -33,6 +32,55 @@ def require_sudo_for_system_scope(f):
     return decorated_function
 
 
+def _transaction_options(f):
+    """Add the options that give a hook's submission an idempotency key."""
+    f = click.option(
+        "--timestamp",
+        default=None,
+        help="Start time of the transaction, if its id can repeat (e.g. a process id)",
+    )(f)
+    return click.option(
+        "--transaction-id",
+        default=None,
+        help="Package manager transaction id; repeated submissions of it are ignored",
+    )(f)
+
+
+def _parse_when(ctx, param, value):
+    """Parse a date (``2025-01-31``) or a datetime (``2025-01-31T14:00``) option."""
+    if value is None:
+        return None
+    try:
+        if len(value) == 10:
+            return dt.date.fromisoformat(value)
+        return dt.datetime.fromisoformat(value)
+    except ValueError:
+        raise click.BadParameter(f"expected YYYY-MM-DD or YYYY-MM-DDTHH:MM[:SS], got {value!r}")
+
+
+def _parse_meta(ctx, param, value):
+    """Parse repeated ``KEY=VALUE`` options into a dict."""
+    metadata = {}
+    for item in value:
+        key, sep, wanted = item.partition("=")
+        if not sep or not key:
+            raise click.BadParameter(f"expected KEY=VALUE, got {item!r}")
+        metadata[key] = wanted
+    return metadata
+
+
+def _emit(lines):
+    """Write *lines* to stdout as they are produced; a closed pipe ends output quietly."""
+    try:
+        for line in lines:
+            click.echo(line, nl=False)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # The reader (e.g. head) has what it wanted; keep Python from complaining at exit.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+
+
 def _daemonize() -> bool:
     """Double-fork to background the process (POSIX only)."""
     if os.name == "nt":
@@ -62,6 +110,16 @@ def _daemonize() -> bool:
         return False
 
 
+def _format_bytes(size: int) -> str:
+    """Render a byte count with a binary unit (e.g. ``1.5 MiB``)."""
+    value = float(size)
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(value) < 1024 or unit == "GiB":
+            break
+        value /= 1024
+    return f"{int(value)} B" if unit == "B" else f"{value:.1f} {unit}"
+
+
 @click.group()
 def cli():
     """Plogr a local package installation and removal logger"""
@@ -105,8 +163,13 @@ def setup(scope):
     default=get_default_scope,
     help="Logging scope",
 )
+@click.option(
+    "--recompute",
+    is_flag=True,
+    help="Rebuild the statistics file from the full log instead of trusting it.",
+)
 @require_sudo_for_system_scope
-def status(scope):
+def status(scope, recompute):
     """Show current status and statistics"""
     from .config import Config
     from .logger import PackageLogger
@@ -116,16 +179,107 @@ def status(scope):
     config.save()
 
     logger = PackageLogger(config)
-    stats = logger.get_statistics()
+    stats = logger.get_statistics(recompute=recompute)
 
     click.echo(f"Scope: {stats['scope']}")
     click.echo(f"Total packages logged: {stats['total']}")
     click.echo(f"Installed: {stats['installed']}")
     click.echo(f"Removed: {stats['removed']}")
     click.echo(f"Downloads: {stats['downloads']}")
+    if stats.get("duplicates_rejected"):
+        click.echo(f"Duplicate submissions rejected: {stats['duplicates_rejected']}")
+    for title, key in (("By manager", "by_manager"), ("By scope", "by_scope")):
+        if key not in stats or not stats[key]:
+            continue
+        click.echo(f"{title}:")
+        for label, counts in stats[key].items():
+            click.echo(
+                f"  {label}: {counts['total']} logged, "
+                f"{counts['installed']} installed, {counts['removed']} removed"
+            )
+    if "compressed_segments" in stats:
+        raw, stored = stats["raw_bytes"], stats["stored_bytes"]
+        saved = raw - stored
+        click.echo(
+            f"Compression: {stats['compressed_segments']} segment(s), "
+            f"{_format_bytes(stored)} on disk for {_format_bytes(raw)} of log data "
+            f"({_format_bytes(saved)} saved, {saved * 100 // max(raw, 1)}%)"
+        )
     click.echo(f"Log location: {logger.data_dir}")
 
 
+@cli.command()
+@click.option(
+    "--by",
+    default="month",
+    type=click.Choice(["day", "week", "month"]),
+    help="Time bucket to count events in",
+)
+@click.option(
+    "--group-by",
+    "group_by",
+    multiple=True,
+    type=click.Choice(["manager", "action", "repo"]),
+    help="Count each manager, action or repo separately (repeatable; default manager and action)",
+)
+@click.option("--manager", default=None, help="Only count events of this package manager")
+@click.option("--since", default=None, callback=_parse_when, help="First day to count")
+@click.option("--until", default=None, callback=_parse_when, help="Last day to count")
+@click.option(
+    "--format",
+    "fmt",
+    default="table",
+    type=click.Choice(["table", "ndjson", "csv"]),
+    help="Aligned columns, one JSON object per line, or CSV",
+)
+@click.option(
+    "--recompute",
+    is_flag=True,
+    help="Rebuild the rollups from the full log instead of trusting them.",
+)
+@click.option(
+    "--scope",
+    type=click.Choice(["user", "system"]),
+    default=get_default_scope,
+    help="Logging scope",
+)
+@require_sudo_for_system_scope
+def stats(by, group_by, manager, since, until, fmt, recompute, scope):
+    """Count installs and removals per day, week or month"""
+    from .config import Config
+    from .logger import PackageLogger
+    from .output import format_records
+
+    config = Config()
+    config.set("scope", scope)
+    config.save()
+
+    logger = PackageLogger(config)
+    group_by = list(dict.fromkeys(group_by)) or ["manager", "action"]
+    rows = logger.get_rollups(
+        by=by,
+        group_by=group_by,
+        since=since,
+        until=until,
+        manager=manager,
+        recompute=recompute,
+    )
+    fields = ["bucket", *group_by, "events"]
+    if fmt != "table":
+        _emit(format_records(rows, fmt, fields))
+        return
+    if not rows:
+        click.echo("No events found.")
+        return
+    table = [[field.upper() for field in fields]]
+    table.extend(
+        [str(row[field]) if row[field] is not None else "-" for field in fields] for row in rows
+    )
+    widths = [max(len(line[i]) for line in table) for i in range(len(fields))]
+    for line in table:
+        click.echo("  ".join(value.ljust(width) for value, width in zip(line, widths)).rstrip())
+
+
 @cli.command()
 @click.option(
     "--scope",
@@ -145,6 +299,8 @@ def daemon(scope, background):
     from .config import Config
     from .logger import PackageLogger
     from .monitors.downloads import DownloadsMonitor
+    from .monitors.maintenance import MaintenanceRunner
+    from .monitors.toml_view import TomlViewRefresher
 
     config = Config()
     config.set("scope", scope)
@@ -160,6 +316,12 @@ def daemon(scope, background):
         if not _daemonize():
             return
 
+    # Started after backgrounding: threads do not survive the double fork.
+    toml_view = TomlViewRefresher(logger)
+    toml_view.start()
+    maintenance = MaintenanceRunner(logger)
+    maintenance.start()
+
     if scope == "user":
         monitor = DownloadsMonitor(logger)
         try:
@@ -173,6 +335,11 @@ def daemon(scope, background):
         except KeyboardInterrupt:
             monitor.stop()
             click.echo("Monitoring stopped.")
+        finally:
+            maintenance.stop()
+            # Drain queued writes so the last TOML refresh includes them.
+            logger.close()
+            toml_view.stop()
     else:
         click.echo(f"System scope monitoring started (scope: {scope}).")
         click.echo("Download monitoring is only available in user scope.")
@@ -183,6 +350,10 @@ def daemon(scope, background):
                 time.sleep(1)
         except KeyboardInterrupt:
             click.echo("Monitoring stopped.")
+        finally:
+            maintenance.stop()
+            logger.close()
+            toml_view.stop()
 
 
 @cli.command()
@@ -192,12 +363,18 @@ def daemon(scope, background):
     default=get_default_scope,
     help="Logging scope",
 )
-@click.option("--format", default="json", type=click.Choice(["json", "toml"]))
+@click.option("--format", default="json", type=click.Choice(["json", "toml", "ndjson", "csv"]))
+@click.option(
+    "--fields",
+    default=None,
+    help="Comma-separated fields for ndjson/csv, e.g. name,version,metadata.arch",
+)
 @require_sudo_for_system_scope
-def export(scope, format):
+def export(scope, format, fields):
     """Export package log in specified format"""
     from .config import Config
     from .logger import PackageLogger
+    from .output import format_records, parse_fields
 
     config = Config()
     config.set("scope", scope)
@@ -205,12 +382,110 @@ def export(scope, format):
 
     logger = PackageLogger(config)
 
-    if format == "json":
-        click.echo(logger.json_file.read_text())
+    if format in ("ndjson", "csv"):
+        records = logger.stream()
+        try:
+            _emit(format_records((rec for _, rec in records), format, parse_fields(fields)))
+        finally:
+            records.close()
+    elif format == "json":
+        click.echo(logger.export_json())
     else:
+        logger.materialize_toml()
         click.echo(logger.toml_file.read_text())
 
 
+@cli.command()
+@click.option(
+    "--scope",
+    type=click.Choice(["user", "system"]),
+    default=get_default_scope,
+    help="Logging scope",
+)
+@require_sudo_for_system_scope
+def compact(scope):
+    """Merge sealed log segments of finished months"""
+    from .config import Config
+    from .logger import PackageLogger
+
+    config = Config()
+    config.set("scope", scope)
+    config.save()
+
+    logger = PackageLogger(config)
+    merged = logger.compact()
+    click.echo(f"Compacted {merged} segment file(s) in {logger.data_dir}.")
+
+
+@cli.command()
+@click.option(
+    "--scope",
+    type=click.Choice(["user", "system"]),
+    default=get_default_scope,
+    help="Logging scope",
+)
+@click.option(
+    "--to",
+    "target",
+    required=True,
+    type=click.Choice(["json", "journal", "sqlite", "columnar"]),
+    help="Storage engine to move the log into",
+)
+@click.option(
+    "--from",
+    "source",
+    default=None,
+    type=click.Choice(["json", "journal", "sqlite", "columnar"]),
+    help="Storage engine holding the log (default: the one recorded in format.json)",
+)
+@click.option("--batch-size", default=1000, show_default=True, type=click.IntRange(min=1))
+@require_sudo_for_system_scope
+def migrate(scope, target, source, batch_size):
+    """Move the log into another storage engine, resuming an interrupted run"""
+    import time
+
+    from .config import Config
+    from .logger import PackageLogger
+    from .storage import open_store
+    from .storage.layout import read_format
+    from .storage.migration import Migration, MigrationError
+
+    config = Config()
+    config.set("scope", scope)
+    config.save()
+
+    logger = PackageLogger(config)
+    if source is None:
+        source = (read_format(logger.data_dir) or {}).get("log_format", logger.store.name)
+    source_store = open_store(source, logger.data_dir, logger.store.file_mode, config.settings)
+
+    last_report = [time.monotonic()]
+
+    def progress(report):
+        now = time.monotonic()
+        if now - last_report[0] >= 1.0:
+            last_report[0] = now
+            click.echo(f"  {report.events} events copied ({report.events_per_second:.0f} events/s)")
+
+    migration = Migration(
+        source_store, target, config.settings, batch_size=batch_size, progress=progress
+    )
+    try:
+        report = migration.run()
+    except MigrationError as err:
+        raise click.ClickException(str(err))
+
+    if report.resumed_events:
+        click.echo(f"Resumed after {report.resumed_events} events copied by an earlier run.")
+    click.echo(
+        f"Migrated {report.records} records ({report.events} events) from {source} "
+        f"to {target} in {report.seconds:.1f}s ({report.events_per_second:.0f} events/s)."
+    )
+    config.set("log_format", target)
+    config.save()
+    click.echo(f"log_format is now {target!r}; the {source} files were left in place.")
+
+
 @cli.command()
 @click.argument("name")
 @click.argument("manager")
@@ -220,8 +495,9 @@ def export(scope, format):
     default=get_default_scope,
     help="Logging scope",
 )
+@_transaction_options
 @require_sudo_for_system_scope
-def install(name, manager, scope):
+def install(name, manager, scope, transaction_id, timestamp):
     """Log a package installation"""
     from .config import Config
     from .logger import PackageLogger
@@ -230,8 +506,13 @@ def install(name, manager, scope):
     config.set("scope", scope)
     config.save()
     logger = PackageLogger(config)
-    logger.log_package(name, manager, "install")
-    click.echo(f"Logged install of '{name}' using '{manager}'.")
+    logged = logger.log_package(
+        name, manager, "install", transaction_id=transaction_id, timestamp=timestamp
+    )
+    if logged or not transaction_id:
+        click.echo(f"Logged install of '{name}' using '{manager}'.")
+    else:
+        click.echo(f"Skipped install of '{name}': already logged for transaction {transaction_id}.")
 
 
 @cli.command()
@@ -243,8 +524,9 @@ def install(name, manager, scope):
     default=get_default_scope,
     help="Logging scope",
 )
+@_transaction_options
 @require_sudo_for_system_scope
-def remove(name, manager, scope):
+def remove(name, manager, scope, transaction_id, timestamp):
     """Log a package removal"""
     from .config import Config
     from .logger import PackageLogger
@@ -253,14 +535,63 @@ def remove(name, manager, scope):
     config.set("scope", scope)
     config.save()
     logger = PackageLogger(config)
-    logger.log_package(name, manager, "remove")
-    click.echo(f"Logged removal of '{name}' using '{manager}'.")
+    logged = logger.log_package(
+        name, manager, "remove", transaction_id=transaction_id, timestamp=timestamp
+    )
+    if logged or not transaction_id:
+        click.echo(f"Logged removal of '{name}' using '{manager}'.")
+    else:
+        click.echo(f"Skipped removal of '{name}': already logged for transaction {transaction_id}.")
 
 
 @cli.command()
 @click.option("--name", default=None, help="Filter by package name (contains)")
 @click.option("--manager", default=None, help="Filter by package manager")
 @click.option("--days", default=None, type=int, help="Filter by days since log entry")
+@click.option(
+    "--since",
+    default=None,
+    callback=_parse_when,
+    help="Only events on or after this date or datetime",
+)
+@click.option(
+    "--until",
+    default=None,
+    callback=_parse_when,
+    help="Only events up to this date (inclusive) or datetime",
+)
+@click.option("--action", default=None, help="Filter by action, e.g. install or remove")
+@click.option(
+    "--removed/--installed",
+    default=None,
+    help="Only removed packages, or only packages still installed",
+)
+@click.option(
+    "--meta",
+    "metadata",
+    multiple=True,
+    callback=_parse_meta,
+    help="Only events whose metadata holds KEY=VALUE (repeatable)",
+)
+@click.option(
+    "--explain",
+    is_flag=True,
+    help="Print how the query is answered and how long it takes instead of the records",
+)
+@click.option(
+    "--format",
+    "fmt",
+    default="pretty",
+    type=click.Choice(["pretty", "ndjson", "csv"]),
+    help="Indented JSON per record, one JSON object per line, or CSV",
+)
+@click.option("--limit", default=None, type=click.IntRange(min=1), help="Stop after N records")
+@click.option(
+    "--fields",
+    default=None,
+    help="Comma-separated fields to output, e.g. name,version,metadata.arch",
+)
+@click.option("--after", default=None, help="Resume after the cursor a --limit run printed")
 @click.option(
     "--scope",
     type=click.Choice(["user", "system"]),
@@ -268,27 +599,79 @@ def remove(name, manager, scope):
     help="Logging scope",
 )
 @require_sudo_for_system_scope
-def query(name, manager, days, scope):
+def query(
+    name,
+    manager,
+    days,
+    since,
+    until,
+    action,
+    removed,
+    metadata,
+    explain,
+    fmt,
+    limit,
+    fields,
+    after,
+    scope,
+):
     """Query the package log"""
     from .config import Config
+    from .exceptions import CursorError
     from .logger import PackageLogger
+    from .output import format_records, parse_fields
 
     config = Config()
     config.set("scope", scope)
     config.save()
 
+    if days and since:
+        raise click.UsageError("--days and --since cannot be combined")
+
     logger = PackageLogger(config)
 
-    since = None
     if days:
         since = dt.date.today() - dt.timedelta(days=days)
 
-    results = logger.query(name=name, manager=manager, since=since)
-
-    if not results:
-        click.echo("No results found.")
+    filters = {
+        "name": name,
+        "manager": manager,
+        "since": since,
+        "until": until,
+        "action": action,
+        "removed": removed,
+        "metadata": metadata,
+    }
+    if explain:
+        report = logger.explain(**filters)
+        click.echo(f"Engine: {report['engine']}")
+        for line in report["plan"]:
+            click.echo(f"  {line}")
+        click.echo(f"Matched {report['matched']} record(s) in {report['seconds'] * 1000:.2f} ms")
         return
 
-    for res in results:
-        res_str = json.dumps(res, indent=2)
-        click.echo(res_str)
+    try:
+        results = logger.stream(**filters, after=after)
+    except CursorError as e:
+        raise click.BadParameter(str(e), param_hint="'--after'")
+
+    page = {"count": 0, "cursor": None, "more": False}
+
+    def limited():
+        for cursor, record in results:
+            if limit is not None and page["count"] == limit:
+                page["more"] = True
+                return
+            page["count"] += 1
+            page["cursor"] = cursor
+            yield record
+
+    try:
+        _emit(format_records(limited(), fmt, parse_fields(fields)))
+    finally:
+        results.close()
+
+    if fmt == "pretty" and not page["count"]:
+        click.echo("No results found.")
+    if page["more"]:
+        click.echo(f"More results: continue with --after {page['cursor']}", err=True)
@@ -43,6 +43,28 @@ class Config:
                 else str(_ORIGINAL_HOME / "Downloads")
             ),
             "log_format": "both",
+            # Seconds the daemon waits for a burst of events to settle before
+            # regenerating packages.toml.
+            "toml_refresh_delay": 5,
+            # Journal: seal the active segment once it reaches this size (0 = monthly only).
+            "segment_max_bytes": 16 * 1024 * 1024,
+            # Journal: codec for compacted months ("none", "gzip", "bz2" or "lzma").
+            "compression": "none",
+            # When writes reach the disk: "none" (kernel write-back), "batch" (one
+            # fsync per durability_batch_events events or durability_batch_delay
+            # seconds) or "always" (fsync before every commit returns).
+            "durability": "batch",
+            "durability_batch_events": 64,
+            "durability_batch_delay": 1.0,
+            # Write events from a background thread that batches them; callers of
+            # submit_package() do not wait for the disk. write_queue_size bounds
+            # the submissions waiting to be written before submitters block.
+            "async_writes": False,
+            "write_queue_size": 1024,
+            # Rows of parsed log kept in memory per process for repeated queries (0 = off).
+            "cache_max_events": 1_000_000,
+            # Seconds between background maintenance runs (compaction) in the daemon.
+            "maintenance_interval": 3600,
             "monitored_extensions": ".rpm, .deb, .pkg, .exe, .msi, .dmg",
         }
 
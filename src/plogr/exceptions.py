@@ -11,3 +11,7 @@ class ConfigError(PrezPkglogError):
 
 class PackageLoggingError(PrezPkglogError):
     """Generic failure while recording a package event."""
+
+
+class CursorError(PrezPkglogError, ValueError):
+    """Raised when a pagination cursor is malformed or belongs to another log."""
@@ -1,6 +1,6 @@
 from pathlib import Path
 import logging
-from typing import List, Optional, Any
+from typing import Any, Dict, List, Optional, Tuple
 
 try:
     import dnf  # type: ignore[import-untyped]
@@ -57,26 +57,27 @@ class PkgLogger(dnf.Plugin if dnf else object):  # type: ignore[misc]
             except Exception as e:
                 self.logger.error(f"Error loading config: {e}")
 
-    def _log_packages(self, packages: List[Any], action: str) -> None:
-        """Log packages to plogr"""
-        if not packages:
-            return
-
+    def _package_events(self, packages: List[Any], action: str) -> List[Dict[str, Any]]:
+        """Build plogr events for *packages*"""
+        events: List[Dict[str, Any]] = []
         for pkg in packages:
             try:
-                self.pkg_logger.log_package(
-                    name=pkg.name,
-                    manager="dnf",
-                    action=action,
-                    version=f"{pkg.version}-{pkg.release}",
-                    metadata={
-                        "arch": pkg.arch,
-                        "repo": pkg.reponame,
-                        "epoch": pkg.epoch,
-                    },
+                events.append(
+                    {
+                        "name": pkg.name,
+                        "manager": "dnf",
+                        "action": action,
+                        "version": f"{pkg.version}-{pkg.release}",
+                        "metadata": {
+                            "arch": pkg.arch,
+                            "repo": pkg.reponame,
+                            "epoch": pkg.epoch,
+                        },
+                    }
                 )
             except Exception as e:
-                self.logger.error(f"Error logging package {pkg.name}: {e}")
+                self.logger.error(f"Error reading package {getattr(pkg, 'name', 'unknown')}: {e}")
+        return events
 
     def transaction(self) -> None:
         """Log package transactions to plogr"""
@@ -86,12 +87,32 @@ class PkgLogger(dnf.Plugin if dnf else object):  # type: ignore[misc]
             self.logger.warning("No transaction data available")
             return
 
+        events: List[Dict[str, Any]] = []
+
         if hasattr(self.base.transaction, "install_set"):
             install_packages = list(self.base.transaction.install_set)
             self.logger.info(f"Found {len(install_packages)} packages to install")
-            self._log_packages(install_packages, "install")
+            events.extend(self._package_events(install_packages, "install"))
 
         if hasattr(self.base.transaction, "remove_set"):
             remove_packages = list(self.base.transaction.remove_set)
             self.logger.info(f"Found {len(remove_packages)} packages to remove")
-            self._log_packages(remove_packages, "remove")
+            events.extend(self._package_events(remove_packages, "remove"))
+
+        # The whole transaction is recorded as one commit; its history id makes
+        # a second run of the hook for the same transaction a no-op.
+        if events:
+            transaction_id, timestamp = self._history_entry()
+            for event in events:
+                event["timestamp"] = timestamp
+            # With async_writes the writer drains the queue before dnf exits.
+            self.pkg_logger.submit_packages(events, transaction_id=transaction_id)
+
+    def _history_entry(self) -> Tuple[Optional[str], str]:
+        """Return the DNF history id and start time of the finished transaction"""
+        try:
+            last = self.base.history.last()
+            return str(last.tid), str(last.beg_timestamp)
+        except Exception as e:
+            self.logger.debug(f"No history entry for the transaction: {e}")
+            return None, ""
@@ -1,15 +1,22 @@
 import datetime as dt
 import json
 import pathlib
-import os
+from concurrent.futures import Future
 from pathlib import PosixPath
-from typing import Dict, Any, Optional, Iterator, Mapping, cast, List
+from typing import Dict, Any, Iterable, Iterator, Optional, Mapping, Sequence, Tuple, cast, List
 import logging
 import threading
-from contextlib import contextmanager
+import time
 
 from .config import Config
-from .models import PkgEvent
+from .models import PkgEvent, idempotency_key, nevra
+from .output import decode_cursor, encode_cursor
+from .storage import EventStore, QueryFilters, open_store
+from .storage.base import atomic_write
+from .storage.layout import read_format, write_format
+from .storage.reader import iter_json_array
+from .storage.locking import file_lock as _file_lock
+from .writer import DEFAULT_QUEUE_SIZE, BackgroundWriter
 
 toml: Any
 
@@ -23,43 +30,18 @@ toml = cast(Optional[Any], _toml_module)  # type: ignore[assignment]
 logger = logging.getLogger(__name__)
 _TOML_WARNING_EMITTED = False
 
-if os.name == "posix":
-    import fcntl  # type: ignore
-
-    @contextmanager
-    def _file_lock(path: pathlib.Path) -> Iterator[None]:
-        """Context manager acquiring an exclusive advisory lock on *path*."""
-        with path.open("a") as lock_fp:
-            try:
-                fcntl.flock(lock_fp, fcntl.LOCK_EX)
-                yield
-            finally:
-                fcntl.flock(lock_fp, fcntl.LOCK_UN)
-
-else:
-    try:  # pragma: no cover - exercised via patched os.name in tests
-        import msvcrt  # type: ignore
-
-        @contextmanager
-        def _file_lock(path: pathlib.Path) -> Iterator[None]:
-            with path.open("a") as lock_fp:
-                try:
-                    msvcrt.locking(lock_fp.fileno(), msvcrt.LK_LOCK, 1)  # type: ignore[attr-defined]
-                    yield
-                finally:
-                    lock_fp.seek(0)
-                    msvcrt.locking(lock_fp.fileno(), msvcrt.LK_UNLCK, 1)  # type: ignore[attr-defined]
-
-    except ImportError:
-        # Non-Windows environment with os.name patched to 'nt' (tests); use a no-op lock.
-        @contextmanager
-        def _file_lock(path: pathlib.Path) -> Iterator[None]:  # pragma: no cover
-            with path.open("a"):
-                yield
+# First line of packages.toml, naming the store generation the view was built from.
+TOML_GENERATION_HEADER = "# plogr-generation: "
 
 
 class PackageLogger:
-    def __init__(self, config: Optional[Config] = None):
+    def __init__(self, config: Optional[Config] = None, async_writes: Optional[bool] = None):
+        """Open the log selected by *config*
+
+        Args:
+            async_writes: Hand writes to a background writer thread; defaults to
+                the ``async_writes`` setting
+        """
         self.config = config or Config()
         self._thread_lock = threading.RLock()
 
@@ -69,6 +51,27 @@ class PackageLogger:
         self._setup_paths()
         self._ensure_directories()
 
+        if async_writes is None:
+            async_writes = bool(self.config.get("async_writes", False))
+        self.writer: Optional[BackgroundWriter] = None
+        if async_writes:
+            self.enable_background_writes()
+
+    def enable_background_writes(self) -> None:
+        """Start the background writer that ``async_writes`` selects, if not running"""
+        if self.writer is None:
+            self.writer = BackgroundWriter(
+                self._write,
+                self.store.sync,
+                int(self.config.get("write_queue_size", DEFAULT_QUEUE_SIZE)),
+            )
+
+    def __enter__(self) -> "PackageLogger":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
     def _setup_paths(self):
         """Setup paths based on scope"""
         if self.config.is_system_scope:
@@ -80,6 +83,11 @@ class PackageLogger:
             self.json_file = self.data_dir / "packages.json"
             self.toml_file = self.data_dir / "packages.toml"
 
+        file_mode = 0o644 if self.config.is_system_scope else 0o600
+        self.store: EventStore = open_store(
+            self.config.get("log_format", "both"), self.data_dir, file_mode, self.config.settings
+        )
+
     def _ensure_directories(self):
         """Create directories if they don't exist"""
         self.data_dir.mkdir(parents=True, exist_ok=True)
@@ -89,17 +97,49 @@ class PackageLogger:
         else:
             self.data_dir.chmod(0o700)
 
-        if not self.json_file.exists():
-            self.json_file.write_text("[]")
+        self._check_format()
+        self.store.ensure()
+        try:
+            self.store.recover()
+        except OSError as err:
+            # Readers without write access to the log leave repairs to its writers.
+            logger.debug("Skipped crash recovery of %s: %s", self.data_dir, err)
         if not self.toml_file.exists():
             self.toml_file.write_text("")
 
-        if self.config.is_system_scope:
-            self.json_file.chmod(0o644)
-            self.toml_file.chmod(0o644)
-        else:
-            self.json_file.chmod(0o600)
-            self.toml_file.chmod(0o600)
+        self.toml_file.chmod(self.store.file_mode)
+
+    def _check_format(self) -> None:
+        """Warn when the data directory holds a log the configured engine cannot read.
+
+        Directories without a ``format.json`` get one: they hold whatever engine is
+        configured, or the original ``packages.json`` array if another engine is
+        configured but only that file has events.
+        """
+        layout = read_format(self.data_dir)
+        if layout is None:
+            log_format = self.store.name
+            if log_format != "json" and self._has_legacy_log():
+                log_format = "json"
+            try:
+                write_format(self.data_dir, log_format, self.store.file_mode)
+            except OSError as err:
+                logger.debug("Could not write format manifest in %s: %s", self.data_dir, err)
+            layout = {"log_format": log_format}
+        if layout.get("log_format") != self.store.name:
+            logger.warning(
+                "%s holds a %s log but log_format selects %s; run `plogr migrate --to %s`.",
+                self.data_dir,
+                layout.get("log_format"),
+                self.store.name,
+                self.store.name,
+            )
+
+    def _has_legacy_log(self) -> bool:
+        try:
+            return next(iter_json_array(self.json_file), None) is not None
+        except (OSError, ValueError):
+            return False
 
     def log_package(
         self,
@@ -108,11 +148,132 @@ class PackageLogger:
         action: str,
         version: Optional[str] = None,
         metadata: Optional[Dict] = None,
-    ) -> None:
-        """Log a package action"""
+        transaction_id: Optional[str] = None,
+        timestamp: Optional[str] = None,
+    ) -> bool:
+        """Log a package action
+
+        Args:
+            transaction_id: Identifies the package manager transaction; when given,
+                the event carries an idempotency key and a repeated submission of
+                the same action is rejected
+            timestamp: Time the transaction started, part of the key when the
+                transaction id alone may repeat (e.g. a process id)
+
+        Returns:
+            True if the event was recorded, False if it was invalid, a duplicate
+            or could not be written
+        """
+        entry = self._build_entry(
+            name, manager, action, version, metadata, transaction_id, timestamp
+        )
+        return entry is not None and self._commit([entry]) == 1
+
+    def submit_package(
+        self,
+        name: str,
+        manager: str,
+        action: str,
+        version: Optional[str] = None,
+        metadata: Optional[Dict] = None,
+        transaction_id: Optional[str] = None,
+        timestamp: Optional[str] = None,
+    ) -> "Future[int]":
+        """Log a package action without waiting for the write
+
+        Takes the arguments of ``log_package``. With a background writer the
+        event is queued and the call returns at once; otherwise it is written
+        before the call returns.
+
+        Returns:
+            Future resolving to 1 once the event is written, or to 0 if it was
+            invalid or a duplicate; a failed write sets its exception
+        """
+        entry = self._build_entry(
+            name, manager, action, version, metadata, transaction_id, timestamp
+        )
+        return self._submit([entry] if entry is not None else [])
+
+    def log_packages(
+        self, events: Iterable[Mapping[str, Any]], transaction_id: Optional[str] = None
+    ) -> int:
+        """Log several package actions under one lock acquisition and one write.
+
+        Args:
+            events: Mappings with ``name``, ``manager`` and ``action`` keys plus optional
+                ``version``, ``metadata``, ``transaction_id`` and ``timestamp``, in the
+                order the actions happened. Invalid events are skipped with a warning.
+            transaction_id: Transaction of events that do not name their own
+
+        Returns:
+            Number of events recorded; duplicates of earlier submissions are not
+        """
+        entries = self._build_entries(events, transaction_id)
+        if not entries:
+            return 0
+        return self._commit(entries) or 0
+
+    def submit_packages(
+        self, events: Iterable[Mapping[str, Any]], transaction_id: Optional[str] = None
+    ) -> "Future[int]":
+        """Log several package actions in one write without waiting for it
+
+        Takes the arguments of ``log_packages``.
+
+        Returns:
+            Future resolving to the number of events recorded
+        """
+        return self._submit(self._build_entries(events, transaction_id))
+
+    def flush(self) -> None:
+        """Return once every event logged so far is written and synced to disk"""
+        if self.writer is not None:
+            self.writer.flush()
+        else:
+            self.store.sync()
+
+    def close(self) -> None:
+        """Flush, then stop the background writer; later writes are made in the caller"""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self.store.sync()
+
+    def _build_entries(
+        self, events: Iterable[Mapping[str, Any]], transaction_id: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        entries: List[Dict[str, Any]] = []
+        for event in events:
+            entry = self._build_entry(
+                event.get("name", ""),
+                event.get("manager", ""),
+                event.get("action", ""),
+                event.get("version"),
+                event.get("metadata"),
+                event.get("transaction_id", transaction_id),
+                event.get("timestamp"),
+            )
+            if entry is not None:
+                entries.append(entry)
+        return entries
+
+    def _build_entry(
+        self,
+        name: str,
+        manager: str,
+        action: str,
+        version: Optional[str],
+        metadata: Optional[Dict],
+        transaction_id: Optional[str] = None,
+        timestamp: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Validate one action and serialize it, or return None if it is unusable."""
         if not name or not name.strip():
             logger.warning(f"Warning: Invalid package name: {name}")
-            return
+            return None
+        if not manager or not action:
+            logger.warning(f"Warning: Missing manager or action for package: {name}")
+            return None
 
         event = PkgEvent(
             name=name.strip(),
@@ -123,60 +284,100 @@ class PackageLogger:
             version=version,
             metadata=metadata,
         )
+        if transaction_id:
+            extra = metadata or {}
+            identity = nevra(event.name, version, extra.get("epoch"), extra.get("arch"))
+            event.idempotency_key = idempotency_key(
+                transaction_id, identity, action, timestamp or ""
+            )
+        return dict(event.to_dict())
+
+    def _commit(self, entries: Sequence[Mapping[str, Any]]) -> Optional[int]:
+        """Hand *entries* to the store in one write; the TOML view is refreshed lazily.
+
+        With a background writer the write is queued behind earlier submissions
+        and awaited, so concurrent callers share its batches.
+
+        Returns:
+            Number of entries written, or None if the write failed
+        """
+        if self.writer is not None:
+            try:
+                return self._submit(entries).result()
+            except Exception:
+                # The writer thread has logged the error.
+                return None
+        try:
+            return self._write(entries)
+        except Exception as e:
+            logger.error(f"Error updating log files: {e}")
+            return None
 
-        self._upsert_json_and_toml(event.to_dict())
-
-    def _upsert_json_and_toml(self, entry: Mapping[str, Any]) -> None:
-        """Upsert the JSON log, updating prior install on removal; then rewrite TOML from JSON."""
-        entry = dict(entry)
+    def _submit(self, entries: Sequence[Mapping[str, Any]]) -> "Future[int]":
+        """Queue *entries* on the background writer, or write them now without one"""
+        if self.writer is not None and entries:
+            return self.writer.submit(entries)
+        future: "Future[int]" = Future()
         try:
-            with self._thread_lock:
-                with _file_lock(self.json_file):
-                    if self.json_file.exists() and self.json_file.stat().st_size > 0:
-                        data: List[Dict[str, Any]] = json.loads(self.json_file.read_text())
-                    else:
-                        data = []
-
-                    if entry.get("removed"):
-                        # Find last matching install record to mark as removed
-                        idx_to_update: Optional[int] = None
-                        for i in range(len(data) - 1, -1, -1):
-                            rec = data[i]
-                            if (
-                                rec.get("name") == entry.get("name")
-                                and rec.get("manager") == entry.get("manager")
-                                and not rec.get("removed", False)
-                            ):
-                                idx_to_update = i
-                                break
-                        if idx_to_update is not None:
-                            data[idx_to_update]["removed"] = True
-                            data[idx_to_update]["action"] = "remove"
-                            data[idx_to_update]["date_removed"] = entry.get("date")
-                        else:
-                            data.append(entry)
-                    else:
-                        data.append(entry)
-
-                    # Write JSON back
-                    if len(data) > 1000:
-                        self._write_json_streaming(data)
-                    else:
-                        self._atomic_write(self.json_file, json.dumps(data, indent=2))
-
-                # Rewrite TOML based on the current JSON content to reflect updated flags
-                self._rewrite_toml_from_json_data(data)
+            future.set_result(self._write(entries) if entries else 0)
         except Exception as e:
             logger.error(f"Error updating log files: {e}")
+            future.set_exception(e)
+        return future
+
+    def _write(self, entries: Sequence[Mapping[str, Any]]) -> int:
+        with self._thread_lock:
+            return self.store.append_many(entries)
 
-    def _rewrite_toml_from_json_data(self, data: List[Dict[str, Any]]) -> None:
+    def toml_generation(self) -> Optional[str]:
+        """Return the store generation ``packages.toml`` was built from, if any."""
+        try:
+            with self.toml_file.open() as fp:
+                first_line = fp.readline()
+        except OSError:
+            return None
+        if first_line.startswith(TOML_GENERATION_HEADER):
+            return first_line[len(TOML_GENERATION_HEADER) :].strip()
+        return None
+
+    def toml_is_stale(self) -> bool:
+        """Check whether ``packages.toml`` lags behind the event store."""
+        return self.toml_generation() != self.store.generation()
+
+    def materialize_toml(self, force: bool = False) -> bool:
+        """Regenerate ``packages.toml`` from the store when it is stale.
+
+        Returns:
+            True if the file was rewritten, False if it was current or TOML is unavailable
+        """
+        if toml is None:
+            return False
+        with self._thread_lock:
+            # The shared lock keeps writers out, so the generation names exactly what load() reads.
+            with self.store.reading():
+                generation = self.store.generation()
+                if not force and self.toml_generation() == generation:
+                    return False
+                data = self.store.load()
+            self._rewrite_toml_from_json_data(data, generation)
+            return True
+
+    def _rewrite_toml_from_json_data(
+        self, data: List[Dict[str, Any]], generation: Optional[str] = None
+    ) -> None:
         """Rewrite TOML file completely to match JSON state."""
         if toml is None:
             return
         try:
             with self._thread_lock:
-                with _file_lock(self.toml_file):
+                # packages.toml itself is replaced on every rewrite, so lock a stable file.
+                with _file_lock(
+                    self.toml_file.with_name(self.toml_file.name + ".lock"),
+                    file_mode=self.store.file_mode,
+                ):
                     lines: List[str] = []
+                    if generation is not None:
+                        lines.append(f"{TOML_GENERATION_HEADER}{generation}\n\n")
                     for rec in data:
                         if rec.get("removed"):
                             lines.append("# --REMOVED--\n")
@@ -187,87 +388,155 @@ class PackageLogger:
         except Exception as e:
             logger.error(f"Error writing to TOML log file: {e}")
 
-    def _append_json(self, entry: Dict[str, Any]):
-        """Append entry to JSON log file"""
+    def _atomic_write(self, path: pathlib.Path, content: str) -> None:
+        """Write *content* to *path* atomically using a temporary file."""
+        atomic_write(path, content)
+
+    def compact(self) -> int:
+        """Merge cold log segments; see ``EventStore.compact``."""
         try:
-            with self._thread_lock:
-                with _file_lock(self.json_file):
-                    if self.json_file.exists() and self.json_file.stat().st_size > 0:
-                        data = json.loads(self.json_file.read_text())
-                    else:
-                        data = []
-
-                    data.append(entry)
-
-                    if len(data) > 1000:
-                        self._write_json_streaming(data)
-                    else:
-                        self._atomic_write(self.json_file, json.dumps(data, indent=2))
+            return self.store.compact()
         except Exception as e:
-            logger.error(f"Error writing to JSON log file: {e}")
+            logger.error(f"Error compacting log files: {e}")
+            return 0
 
-    def _atomic_write(self, path: pathlib.Path, content: str) -> None:
-        """Write *content* to *path* atomically using a temporary file."""
-        tmp_path = path.with_suffix(path.suffix + ".tmp")
-        tmp_path.write_text(content)
-        tmp_path.replace(path)
-
-    def _write_json_streaming(self, data: list):
-        """Write JSON data using streaming to avoid memory issues atomically."""
-        tmp_path = self.json_file.with_suffix(".json.tmp")
-        with tmp_path.open("w") as f:
-            f.write("[\n")
-            for i, item in enumerate(data):
-                json.dump(item, f, indent=2)
-                if i < len(data) - 1:
-                    f.write(",\n")
-            f.write("\n]")
-        tmp_path.replace(self.json_file)
+    def export_json(self) -> str:
+        """Return the log as a JSON array, whatever the storage engine."""
+        with self.store.reading():
+            return json.dumps(self.store.load(), indent=2)
 
     def query(
         self,
         name: Optional[str] = None,
         manager: Optional[str] = None,
         since: Optional[dt.date] = None,
+        until: Optional[dt.date] = None,
+        action: Optional[str] = None,
+        removed: Optional[bool] = None,
+        metadata: Optional[Mapping[str, Any]] = None,
     ) -> list:
-        """Query the package log"""
-        try:
-            data = json.loads(self.json_file.read_text())
-            results = data
-
-            if name:
-                results = [e for e in results if name.lower() in e.get("name", "").lower()]
+        """Query the package log
 
-            if manager:
-                results = [e for e in results if e.get("manager") == manager]
-
-            if since:
-                results = [
-                    e for e in results if dt.datetime.fromisoformat(e.get("date")).date() >= since
-                ]
-
-            return results
+        *since* and *until* take dates or datetimes and are inclusive; an
+        *until* date covers its whole day. *removed* selects removed (True) or
+        installed (False) packages, and *metadata* maps keys to the values the
+        record's metadata must hold.
+        """
+        try:
+            with self.store.reading():
+                return self.store.query(name, manager, since, until, action, removed, metadata)
         except Exception as e:
             logger.error(f"Error querying log file: {e}")
             return []
 
-    def get_statistics(self) -> Dict[str, Any]:
-        """Get statistics from log files"""
+    def stream(
+        self,
+        name: Optional[str] = None,
+        manager: Optional[str] = None,
+        since: Optional[dt.date] = None,
+        until: Optional[dt.date] = None,
+        after: Optional[str] = None,
+        action: Optional[str] = None,
+        removed: Optional[bool] = None,
+        metadata: Optional[Mapping[str, Any]] = None,
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield ``(cursor, record)`` for the records ``query`` returns, one at a time
+
+        Records are built as the caller consumes them, so memory does not grow
+        with the result. Passing a record's cursor as *after* resumes the same
+        query past it, even after more events were logged. The shared lock is
+        only held while matches are looked up (see ``stream_matching``), never
+        while the caller handles them, so a slow consumer such as a pager does
+        not hold up writers.
+
+        Raises:
+            CursorError: If *after* was not issued for this log's storage engine
+        """
+        engine = type(self.store).name
+        position = decode_cursor(after, engine) if after else None
+        filters = QueryFilters(name, manager, since, until, action, removed, metadata or {})
+
+        def records() -> Iterator[Tuple[str, Dict[str, Any]]]:
+            for found, record in self.store.stream_matching(filters, position):
+                yield encode_cursor(engine, found), record
+
+        return records()
+
+    def explain(
+        self,
+        name: Optional[str] = None,
+        manager: Optional[str] = None,
+        since: Optional[dt.date] = None,
+        until: Optional[dt.date] = None,
+        action: Optional[str] = None,
+        removed: Optional[bool] = None,
+        metadata: Optional[Mapping[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Run a query and report how the storage engine answered it
+
+        Returns:
+            Dictionary with the ``engine``, the ``plan`` as lines of text (index
+            lookups, then the fused checks cheapest first), the number of records
+            ``matched`` and the ``seconds`` spent finding them
+        """
+        filters = QueryFilters(name, manager, since, until, action, removed, metadata or {})
+        with self.store.reading():
+            plan = self.store.explain(filters)
+            started = time.perf_counter()
+            matched = sum(1 for _ in self.store.iter_matching(filters))
+            seconds = time.perf_counter() - started
+        return {
+            "engine": type(self.store).name,
+            "plan": plan,
+            "matched": matched,
+            "seconds": seconds,
+        }
+
+    def get_rollups(
+        self,
+        by: str = "month",
+        group_by: Sequence[str] = ("manager", "action"),
+        since: Optional[dt.date] = None,
+        until: Optional[dt.date] = None,
+        manager: Optional[str] = None,
+        recompute: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Count logged events per day, week or month from the rollups sidecar
+
+        Args:
+            by: ``day``, ``week`` (ISO weeks) or ``month``
+            group_by: Any of ``manager``, ``action`` and ``repo`` to count separately
+            since: First day to count
+            until: Last day to count
+            manager: Only count events of this package manager
+            recompute: Rebuild the rollups from the log instead of trusting them
+
+        Returns:
+            Rows like ``{"bucket": "2025-01", "manager": "dnf", "action":
+            "install", "events": 12}``, sorted by bucket
+        """
         try:
-            data = json.loads(self.json_file.read_text())
-
-            total = len(data)
-            installed = sum(1 for e in data if not e.get("removed", False))
-            removed = sum(1 for e in data if e.get("removed", False))
-            downloads = sum(1 for e in data if e.get("manager") == "download")
-
-            stats = {
-                "total": total,
-                "installed": installed,
-                "removed": removed,
-                "downloads": downloads,
-                "scope": self.config.scope,
-            }
+            with self.store.reading():
+                return self.store.rollup(by, group_by, since, until, manager, recompute)
+        except Exception as e:
+            logger.error(f"Error reading rollups: {e}")
+            return []
+
+    def get_statistics(self, recompute: bool = False) -> Dict[str, Any]:
+        """Get statistics from the stats sidecar the writers keep up to date
+
+        Args:
+            recompute: Rebuild the sidecar from the log instead of trusting it
+        """
+        try:
+            with self.store.reading():
+                stats: Dict[str, Any] = self.store.summary(recompute).statistics()
+                stats["duplicates_rejected"] = self.store.duplicates.rejected()
+                # Space figures are only reported once compaction has compressed something.
+                usage = self.store.space_usage()
+            if usage["compressed_segments"]:
+                stats.update(usage)
+            stats["scope"] = self.config.scope
             return stats
         except Exception:
             return {
@@ -275,6 +544,7 @@ class PackageLogger:
                 "installed": 0,
                 "removed": 0,
                 "downloads": 0,
+                "duplicates_rejected": 0,
                 "scope": self.config.scope,
             }
 
@@ -1,4 +1,6 @@
 from __future__ import annotations
+
+import hashlib
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Any, Literal, NotRequired, TypedDict
@@ -16,6 +18,7 @@ class PkgEventDict(TypedDict):
     version: NotRequired[str | None]
     metadata: NotRequired[dict[str, Any] | None]
     date_removed: NotRequired[str | None]
+    idempotency_key: NotRequired[str]
 
 
 @dataclass
@@ -29,6 +32,7 @@ class PkgEvent:
     version: str | None = None
     metadata: dict[str, Any] | None = None
     date_removed: datetime | None = None
+    idempotency_key: str | None = None
 
     def to_dict(self) -> PkgEventDict:
         d: PkgEventDict = {
@@ -46,5 +50,26 @@ class PkgEvent:
             d["metadata"] = self.metadata
         if self.date_removed:
             d["date_removed"] = self.date_removed.isoformat(timespec="seconds")
+        if self.idempotency_key:
+            d["idempotency_key"] = self.idempotency_key
 
         return d
+
+
+def nevra(name: str, version: str | None = None, epoch: Any = None, arch: str | None = None) -> str:
+    """Return the ``name-[epoch:]version.arch`` identity of a package build"""
+    evr = version or ""
+    if evr and epoch not in (None, "", 0, "0"):
+        evr = f"{epoch}:{evr}"
+    text = f"{name}-{evr}" if evr else name
+    return f"{text}.{arch}" if arch else text
+
+
+def idempotency_key(transaction_id: Any, nevra: str, action: str, timestamp: str = "") -> str:
+    """Derive the key under which a package action of a transaction is recorded once
+
+    *timestamp* is the transaction's own time, not the time it is logged, so a
+    retried submission derives the same key.
+    """
+    raw = "\x1f".join((str(transaction_id), nevra, action, timestamp))
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
@@ -119,7 +119,7 @@ class DownloadsEventHandler(FileSystemEventHandler):
                     logger.warning(f"Could not get file size for {path}: {e}")
                     file_size = 0
 
-                self.pkg_logger.log_package(
+                self.pkg_logger.submit_package(
                     path.name,
                     "download",
                     "install",
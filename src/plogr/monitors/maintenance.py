@@ -0,0 +1,58 @@
+"""Periodic background maintenance of the event store"""
+
+import logging
+import threading
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MaintenanceRunner:
+    """Run store maintenance (segment compaction) on a fixed interval.
+
+    Keeps rewrites of cold data off the hot path: hooks only ever append to the
+    active segment while the daemon tidies sealed segments in the background.
+    """
+
+    def __init__(self, logger_instance: Any, interval: Optional[float] = None):
+        if logger_instance is None:
+            raise ValueError("logger_instance must be provided")
+
+        self.pkg_logger = logger_instance
+        self.interval = float(
+            interval
+            if interval is not None
+            else self.pkg_logger.config.get("maintenance_interval", 3600)
+        )
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the maintenance thread; the first run happens immediately"""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="plogr-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the maintenance thread"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def run_once(self):
+        """Run every maintenance task once"""
+        try:
+            merged = self.pkg_logger.compact()
+            if merged:
+                logger.info(f"Compacted {merged} log segment(s)")
+        except Exception as e:
+            logger.error(f"Error during log maintenance: {e}")
+
+    def _run(self):
+        self.run_once()
+        while not self._stop_event.wait(self.interval):
+            self.run_once()
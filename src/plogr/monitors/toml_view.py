@@ -0,0 +1,76 @@
+"""Debounced regeneration of the derived TOML view"""
+
+import logging
+import threading
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TomlViewRefresher:
+    """Rebuild ``packages.toml`` once the event store has been quiet for a while.
+
+    The store generation is polled rather than hooked so that events written by
+    other processes (package manager hooks, ``plogr install``) are picked up as
+    well. A burst of events keeps pushing the deadline back and is coalesced into
+    a single rewrite once it settles.
+    """
+
+    def __init__(
+        self,
+        logger_instance: Any,
+        delay: Optional[float] = None,
+        poll_interval: float = 1.0,
+    ):
+        if logger_instance is None:
+            raise ValueError("logger_instance must be provided")
+
+        self.pkg_logger = logger_instance
+        self.delay = float(
+            delay if delay is not None else self.pkg_logger.config.get("toml_refresh_delay", 5)
+        )
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the background refresh thread"""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="plogr-toml-view", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the refresh thread and bring the view up to date one last time"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self._refresh()
+
+    def _run(self):
+        last_seen = self.pkg_logger.store.generation()
+        changed_at: Optional[float] = None
+        if self.pkg_logger.toml_is_stale():
+            changed_at = time.monotonic()
+
+        while not self._stop_event.wait(self.poll_interval):
+            generation = self.pkg_logger.store.generation()
+            if generation != last_seen:
+                last_seen = generation
+                changed_at = time.monotonic()
+                continue
+
+            if changed_at is not None and time.monotonic() - changed_at >= self.delay:
+                self._refresh()
+                changed_at = None
+
+    def _refresh(self):
+        try:
+            if self.pkg_logger.materialize_toml():
+                logger.debug("Regenerated TOML view %s", self.pkg_logger.toml_file)
+        except Exception as e:
+            logger.error(f"Error regenerating TOML view: {e}")
@@ -0,0 +1,116 @@
+"""Streaming record formats and pagination cursors for ``plogr query`` and ``export``"""
+
+import base64
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence
+
+from .exceptions import CursorError
+
+FORMATS = ("pretty", "ndjson", "csv")
+
+# CSV columns when no --fields are given, in ``PkgEvent.to_dict`` order.
+CSV_FIELDS = (
+    "name",
+    "manager",
+    "action",
+    "scope",
+    "date",
+    "removed",
+    "version",
+    "metadata",
+    "date_removed",
+)
+
+
+def encode_cursor(engine: str, position: int) -> str:
+    """Return the opaque token resuming a query after record *position*"""
+    raw = f"{engine}:{position}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, engine: str) -> int:
+    """Return the position *token* resumes after
+
+    Raises:
+        CursorError: If *token* is malformed or was issued by another storage engine
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("ascii")
+        issuer, position = raw.rsplit(":", 1)
+        value = int(position)
+    except ValueError:
+        raise CursorError(f"Invalid cursor: {token!r}") from None
+    if issuer != engine:
+        raise CursorError(f"Cursor belongs to a {issuer} log, not {engine}")
+    return value
+
+
+def parse_fields(text: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated ``--fields`` value; None selects whole records"""
+    if not text:
+        return None
+    return [field.strip() for field in text.split(",") if field.strip()]
+
+
+def project(record: Mapping[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+    """Keep *fields* of *record*, in that order; ``metadata.<key>`` picks one metadata value"""
+    if fields is None:
+        return dict(record)
+    projected: Dict[str, Any] = {}
+    for field in fields:
+        value: Any = record.get(field)
+        if value is None and "." in field:
+            head, _, key = field.partition(".")
+            parent = record.get(head)
+            value = parent.get(key) if isinstance(parent, Mapping) else None
+        projected[field] = value
+    return projected
+
+
+def format_records(
+    records: Iterable[Mapping[str, Any]], fmt: str, fields: Optional[Sequence[str]] = None
+) -> Iterator[str]:
+    """Yield *records* as text in *fmt*, one record (or CSV header) at a time
+
+    ``pretty`` is the indented JSON ``plogr query`` always printed, ``ndjson``
+    one compact JSON object per line, and ``csv`` a header row followed by one
+    row per record, with nested values JSON-encoded.
+    """
+    if fmt == "csv":
+        yield from _csv_lines(records, fields)
+        return
+    for record in records:
+        if fmt == "ndjson":
+            yield json.dumps(project(record, fields), separators=(",", ":")) + "\n"
+        else:
+            yield json.dumps(project(record, fields), indent=2) + "\n"
+
+
+def _csv_lines(
+    records: Iterable[Mapping[str, Any]], fields: Optional[Sequence[str]]
+) -> Iterator[str]:
+    columns = list(fields or CSV_FIELDS)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    def line(values: Iterable[Any]) -> str:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    yield line(columns)
+    for record in records:
+        yield line(_csv_value(value) for value in project(record, columns).values())
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True)
+    return value
@@ -0,0 +1,72 @@
+"""Storage engines for the package event log"""
+
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Type
+
+from .base import EventStore, fold_events
+from .cache import DEFAULT_CACHE_MAX_EVENTS, LOG_CACHE, ParsedLogCache
+from .columnar import ColumnarStore
+from .journal import JournalStore
+from .json_array import JsonArrayStore
+from .predicate import QueryFilters
+from .sqlite import SqliteStore
+from .table import EventTable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_FORMAT = "both"
+
+# ``log_format`` values mapped to the engine that stores the events. The JSON array
+# formats keep the TOML mirror in sync; the journal never rewrites history.
+STORES: Dict[str, Type[EventStore]] = {
+    "both": JsonArrayStore,
+    "json": JsonArrayStore,
+    "journal": JournalStore,
+    "sqlite": SqliteStore,
+    "columnar": ColumnarStore,
+}
+
+
+def open_store(
+    log_format: str,
+    data_dir: Path,
+    file_mode: int = 0o600,
+    settings: Optional[Mapping[str, Any]] = None,
+) -> EventStore:
+    """Instantiate the storage engine configured by *log_format*
+
+    Args:
+        log_format: Value of the ``log_format`` setting
+        data_dir: Directory holding the log files
+        file_mode: Permission bits applied to files the store creates
+        settings: Configuration settings carrying engine-specific options
+
+    Returns:
+        EventStore instance; unknown formats fall back to the default engine
+    """
+    store_class = STORES.get(log_format)
+    if store_class is None:
+        logger.warning("Unknown log_format %r, falling back to %r.", log_format, DEFAULT_LOG_FORMAT)
+        store_class = STORES[DEFAULT_LOG_FORMAT]
+    settings = settings or {}
+    LOG_CACHE.resize(int(settings.get("cache_max_events", DEFAULT_CACHE_MAX_EVENTS)))
+    return store_class.from_settings(data_dir, file_mode, settings)
+
+
+__all__ = [
+    "ColumnarStore",
+    "EventStore",
+    "EventTable",
+    "JournalStore",
+    "JsonArrayStore",
+    "LOG_CACHE",
+    "ParsedLogCache",
+    "QueryFilters",
+    "STORES",
+    "SqliteStore",
+    "fold_events",
+    "open_store",
+]
@@ -0,0 +1,538 @@
+"""Base storage engine interface for the package event log"""
+
+from __future__ import annotations
+
+import abc
+import datetime as dt
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    ClassVar,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Protocol,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from .dedup import DuplicateFilter
+from .durability import SyncPolicy
+from .locking import file_lock
+from .names import NameIndex
+from .sidecar import MemoryOpenInstalls, OpenInstallFile
+from .stats import LogSummary, StatsFile
+from .predicate import Plan, QueryFilters, record_plan
+from .rollups import Rollups, in_range, summarize, tally
+
+if TYPE_CHECKING:
+    from .table import EventTable
+
+logger = logging.getLogger(__name__)
+
+# Matches read per hold of the shared lock by the default ``stream_matching``.
+STREAM_CHUNK = 512
+
+Record = Dict[str, Any]
+Stamp = Tuple[int, int, int]
+# manager -> name -> number of open installs
+OpenCounts = Dict[str, Dict[str, int]]
+# (name, manager) -> positions of open installs, oldest first
+OpenPositions = Dict[Tuple[Any, Any], List[int]]
+
+
+def fold_events(
+    entries: Iterable[Mapping[str, Any]],
+    initial_open: Optional[Mapping[str, Mapping[str, int]]] = None,
+) -> List[Record]:
+    """Replay raw events into the record view used by ``query``/``get_statistics``.
+
+    A removal closes the most recent open install with the same name and manager,
+    which is flagged ``removed`` with ``action="remove"`` and a ``date_removed``
+    stamp. Removals without a matching install are kept as standalone records.
+    Entries that already carry ``date_removed`` were closed in place by releases
+    that did not store removals as events; they are kept as they are and open or
+    close nothing.
+
+    Args:
+        entries: Raw events in write order
+        initial_open: Installs still open before *entries* begin, for replaying a
+            suffix of the log; removals that close one of them are consumed
+            without producing a record
+    """
+    records = _RecordList()
+    open_installs: OpenPositions = {}
+    for manager, names in (initial_open or {}).items():
+        for name, count in names.items():
+            open_installs[(name, manager)] = [-1] * count
+    fold_into(records, entries, open_installs)
+    return records
+
+
+class RecordSink(Protocol):
+    """Container ``fold_into`` replays events into"""
+
+    def __len__(self) -> int: ...
+
+    def append(self, entry: Mapping[str, Any]) -> None: ...
+
+    def close(self, position: int, date: Any) -> None: ...
+
+
+class _RecordList(List[Record]):
+    """Plain list of record dicts usable as a ``RecordSink``"""
+
+    def append(self, entry: Mapping[str, Any]) -> None:  # type: ignore[override]
+        super().append(dict(entry))
+
+    def close(self, position: int, date: Any) -> None:
+        target = self[position]
+        target["removed"] = True
+        target["action"] = "remove"
+        target["date_removed"] = date
+
+
+def fold_into(
+    sink: RecordSink, entries: Iterable[Mapping[str, Any]], open_installs: OpenPositions
+) -> None:
+    """Replay *entries* into *sink*, closing installs as ``fold_events`` describes.
+
+    Args:
+        sink: Records folded so far
+        entries: Raw events in write order
+        open_installs: ``(name, manager)`` -> positions of open installs in *sink*,
+            oldest first and updated in place; negative positions stand for
+            installs that precede *sink*
+    """
+    for entry in entries:
+        key = (entry.get("name"), entry.get("manager"))
+        if entry.get("date_removed"):
+            pass
+        elif entry.get("removed"):
+            stack = open_installs.get(key)
+            if stack:
+                position = stack.pop()
+                if position >= 0:
+                    sink.close(position, entry.get("date"))
+                continue
+        else:
+            open_installs.setdefault(key, []).append(len(sink))
+        sink.append(entry)
+
+
+def track_open(entries: Iterable[Mapping[str, Any]], counts: OpenCounts) -> OpenCounts:
+    """Advance open-install *counts* (updated in place) past *entries*."""
+    for entry in entries:
+        manager, name = str(entry.get("manager")), str(entry.get("name"))
+        by_name = counts.setdefault(manager, {})
+        if not entry.get("removed"):
+            by_name[name] = by_name.get(name, 0) + 1
+        elif by_name.get(name):
+            by_name[name] -= 1
+            if not by_name[name]:
+                del by_name[name]
+        if not by_name:
+            del counts[manager]
+    return counts
+
+
+def folded_rows(entries: Iterable[Mapping[str, Any]], counts: OpenCounts) -> int:
+    """Return how many records *entries* fold into after installs *counts* left open
+
+    Removals that close an open install add no record of their own, exactly as
+    in ``fold_into``. *counts* is not modified.
+    """
+    remaining = {manager: dict(names) for manager, names in counts.items()}
+    rows = 0
+    for entry in entries:
+        by_name = remaining.setdefault(str(entry.get("manager")), {})
+        name = str(entry.get("name"))
+        if entry.get("date_removed"):
+            pass
+        elif entry.get("removed"):
+            if by_name.get(name):
+                by_name[name] -= 1
+                continue
+        else:
+            by_name[name] = by_name.get(name, 0) + 1
+        rows += 1
+    return rows
+
+
+def file_stamp(path: Path) -> Stamp:
+    """Return ``(st_ino, st_size, st_mtime_ns)`` identifying a data file revision."""
+    st = os.stat(path)
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def atomic_write(path: Path, content: str, sync: bool = False) -> None:
+    """Write *content* to *path* atomically using a temporary file.
+
+    With *sync*, the temporary file is flushed to disk before the rename so a
+    crash cannot publish an empty or partial file.
+    """
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with tmp_path.open("w") as fp:
+        fp.write(content)
+        if sync:
+            fp.flush()
+            os.fsync(fp.fileno())
+    tmp_path.replace(path)
+
+
+class EventStore(abc.ABC):
+    """Abstract base class for package event storage engines"""
+
+    name: ClassVar[str] = ""
+
+    def __init__(
+        self,
+        data_dir: Path,
+        file_mode: int = 0o600,
+        durability: Optional[SyncPolicy] = None,
+    ) -> None:
+        """Initialize the store
+
+        Args:
+            data_dir: Directory holding the store's files
+            file_mode: Permission bits applied to files the store creates
+            durability: When writes are synced to disk (``batch`` by default)
+        """
+        self.data_dir = data_dir
+        self.file_mode = file_mode
+        self.durability = durability or SyncPolicy()
+        self.path = data_dir / self.filename()
+        self.stats_file = StatsFile(self.path.with_name(self.path.name + ".stats"), file_mode)
+        # Data files are replaced or renamed; the lock lives in a file that never is.
+        self.lock_file = self.path.with_name(self.path.name + ".lock")
+        self.duplicates = DuplicateFilter(self.path, file_mode, self.durability.syncs_data)
+        self.names = NameIndex(self.path, file_mode)
+        self.rollups = Rollups(self.path, file_mode)
+        self.open_installs = OpenInstallFile(self.path, file_mode)
+
+    @classmethod
+    @abc.abstractmethod
+    def filename(cls) -> str:
+        """Return the name of the primary data file inside ``data_dir``"""
+        ...
+
+    @classmethod
+    def from_settings(
+        cls, data_dir: Path, file_mode: int, settings: Mapping[str, Any]
+    ) -> "EventStore":
+        """Build the store, picking engine-specific options from *settings*"""
+        return cls(data_dir, file_mode, durability=SyncPolicy.from_settings(settings))
+
+    @contextmanager
+    def reading(self) -> Iterator[None]:
+        """Hold the shared lock: readers run in parallel but never see a write half done"""
+        with file_lock(self.lock_file, shared=True):
+            yield
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        """Hold the exclusive lock; engines take it only around the file updates themselves"""
+        with file_lock(self.lock_file, file_mode=self.file_mode):
+            yield
+
+    @abc.abstractmethod
+    def ensure(self) -> None:
+        """Create the store's files if they don't exist yet"""
+        ...
+
+    def append(self, entry: Mapping[str, Any]) -> int:
+        """Durably record a single event
+
+        Args:
+            entry: Serialized ``PkgEvent`` dictionary
+
+        Returns:
+            1 if the entry was written, 0 if it was a duplicate
+        """
+        return self.append_many([entry])
+
+    @abc.abstractmethod
+    def append_many(self, entries: Sequence[Mapping[str, Any]]) -> int:
+        """Durably record *entries* in order as a single write
+
+        Removals are matched against installs earlier in the same batch exactly as
+        if the entries had been appended one at a time. Entries whose
+        ``idempotency_key`` was already written are dropped.
+
+        Args:
+            entries: Serialized ``PkgEvent`` dictionaries
+
+        Returns:
+            Number of entries written
+        """
+        ...
+
+    @abc.abstractmethod
+    def load(self) -> List[Record]:
+        """Return every record, with removals applied to their installs"""
+        ...
+
+    def iter_records(self) -> Iterator[Record]:
+        """Yield every record in log order; engines that can stream from disk override this"""
+        yield from self.load()
+
+    def load_table(self) -> "EventTable":
+        """Return every record as a columnar ``EventTable``"""
+        from .table import EventTable
+
+        return EventTable.from_records(self.load())
+
+    def recover(self) -> int:
+        """Repair what a crash may have left behind; loggers call this when they start
+
+        The base implementation removes a temporary file that an interrupted
+        replace of the data file left next to it. Engines that append to a file
+        also truncate a torn write at its end.
+
+        Returns:
+            Number of bytes of interrupted writes dropped
+        """
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        if tmp_path.exists():
+            with self.writing():
+                if tmp_path.exists():
+                    tmp_path.unlink()
+                    logger.warning("Removed %s left by an interrupted write", tmp_path)
+        return 0
+
+    def sync(self) -> None:
+        """Flush writes still waiting for a batched fsync"""
+        self.durability.flush()
+
+    def compact(self) -> int:
+        """Rewrite cold data off the hot path; engines without a layout to tidy do nothing
+
+        Returns:
+            Number of files folded away
+        """
+        return 0
+
+    def generation(self) -> str:
+        """Return a token that changes whenever the stored data changes
+
+        Derived views such as ``packages.toml`` record the token they were built
+        from, so comparing it with the current one tells whether they are stale.
+        """
+        try:
+            return "-".join(str(part) for part in file_stamp(self.path))
+        except FileNotFoundError:
+            return "0"
+
+    def query(
+        self,
+        name: Optional[str] = None,
+        manager: Optional[str] = None,
+        since: Optional[dt.date] = None,
+        until: Optional[dt.date] = None,
+        action: Optional[str] = None,
+        removed: Optional[bool] = None,
+        metadata: Optional[Mapping[str, Any]] = None,
+    ) -> List[Record]:
+        """Return records matching every given filter
+
+        Args:
+            name: Case-insensitive substring of the package name
+            manager: Exact package manager name
+            since: Earliest event date or datetime to include
+            until: Latest event date or datetime to include; a date includes its whole day
+            action: Exact action, e.g. ``remove`` for removed installs
+            removed: True for removed packages only, False for installed ones only
+            metadata: Values the record's metadata must hold under each key
+
+        Returns:
+            Matching records in log order
+        """
+        filters = QueryFilters(name, manager, since, until, action, removed, metadata or {})
+        return [record for _, record in self.iter_matching(filters)]
+
+    def iter_matching(
+        self, filters: QueryFilters, after: Optional[int] = None
+    ) -> Iterator[Tuple[int, Record]]:
+        """Yield ``(position, record)`` for the records matching *filters* past *after*
+
+        A position numbers a record in log order. Events are only ever
+        appended, so positions stay valid as the log grows, and *after*
+        resumes a query past the last position a caller saw. The default streams ``iter_records`` through the compiled test of
+        ``record_plan``. Engines that keep a table or an index override this,
+        and ``explain`` with it, to look records up.
+        """
+        plan = self._record_plan(filters)
+        if plan.empty is not None:
+            return
+        test = plan.test
+        for position, record in enumerate(self.iter_records()):
+            if (after is None or position > after) and test(record):
+                yield position, record
+
+    def stream_matching(
+        self, filters: QueryFilters, after: Optional[int] = None
+    ) -> Iterator[Tuple[int, Record]]:
+        """Yield what ``iter_matching`` does, without the shared lock held between reads
+
+        The default takes the lock for ``STREAM_CHUNK`` matches at a time and
+        resumes past the last one, as a cursor would, so a slow consumer keeps
+        writers waiting for one chunk at most. Engines that answer from an
+        in-memory ``EventTable`` take the table and its matching rows under the
+        lock once instead.
+        """
+        while True:
+            with self.reading():
+                chunk = list(islice(self.iter_matching(filters, after), STREAM_CHUNK))
+            yield from chunk
+            if len(chunk) < STREAM_CHUNK:
+                return
+            after = chunk[-1][0]
+
+    def explain(self, filters: QueryFilters) -> List[str]:
+        """Describe how ``iter_matching`` finds the records matching *filters*"""
+        return [f"read every record of {self.path.name}", *self._record_plan(filters).describe()]
+
+    def _record_plan(self, filters: QueryFilters) -> Plan:
+        names = self.matching_names(filters.name) if filters.name else None
+        return record_plan(filters, names)
+
+    def _table_names(self, filters: QueryFilters, table: "EventTable") -> Optional[Set[str]]:
+        """Return the names ``filters.name`` matches, rebuilding a stale index from *table*"""
+        return self.matching_names(filters.name, table.names) if filters.name else None
+
+    def matching_names(
+        self, name: str, source: Optional[Callable[[], Iterable[Any]]] = None
+    ) -> Optional[Set[str]]:
+        """Return the logged package names containing *name*, from the trigram index
+
+        Args:
+            source: Produces every logged name to rebuild a stale index from;
+                the names of ``iter_records`` by default
+
+        Returns:
+            The names, or None if the index is stale and cannot be rebuilt here
+            (e.g. a reader without write access), in which case callers match
+            every record themselves
+        """
+        try:
+            return self.names.matching(
+                name,
+                self.generation(),
+                source or (lambda: (r.get("name") for r in self.iter_records())),
+            )
+        except (OSError, sqlite3.Error) as err:
+            logger.debug("Name index of %s unavailable: %s", self.path, err)
+            return None
+
+    def summary(self, recompute: bool = False) -> LogSummary:
+        """Return the status counters from the stats sidecar
+
+        Args:
+            recompute: Rebuild the sidecar from the log even if it is current
+
+        Returns:
+            Summary of the log; recomputed (and stored again) when the sidecar
+            does not match the current generation
+        """
+        generation = self.generation()
+        summary = None if recompute else self.stats_file.load(generation)
+        if summary is None:
+            open_installs = (
+                None if self.open_installs.describes(generation) else MemoryOpenInstalls()
+            )
+            summary = LogSummary.from_records(self.iter_records(), open_installs)
+            self.stats_file.save(summary, generation)
+            if open_installs is not None:
+                self.open_installs.replace(open_installs, generation)
+        return summary
+
+    def rollup(
+        self,
+        by: str = "month",
+        group_by: Sequence[str] = ("manager", "action"),
+        since: Optional[dt.date] = None,
+        until: Optional[dt.date] = None,
+        manager: Optional[str] = None,
+        recompute: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Return event counts per time bucket from the rollups sidecar
+
+        Args:
+            by: Bucket size: ``day``, ``week`` (ISO weeks) or ``month``
+            group_by: Any of ``manager``, ``action`` and ``repo`` to count separately
+            since: First day to count
+            until: Last day to count
+            manager: Only count events of this package manager
+            recompute: Rebuild the sidecar from the log even if it is current
+
+        Returns:
+            One row per bucket and group, see ``rollups.summarize``; counted from
+            the log directly if the sidecar is stale and cannot be rebuilt here
+        """
+        generation = self.generation()
+        # Stale open installs left the rollups stale too; rebuilding collects them again.
+        open_installs = None if self.open_installs.describes(generation) else MemoryOpenInstalls()
+        try:
+            counts = self.rollups.counts(
+                generation,
+                self.iter_records,
+                since,
+                until,
+                manager,
+                recompute or open_installs is not None,
+                open_installs,
+            )
+        except (OSError, sqlite3.Error) as err:
+            logger.debug("Rollups of %s unavailable: %s", self.path, err)
+            counted = tally(self.iter_records())
+            counts = list(in_range(counted.items(), since, until, manager))
+        else:
+            if open_installs is not None:
+                self.open_installs.replace(open_installs, generation)
+        return summarize(counts, by, group_by)
+
+    @contextmanager
+    def committing(self, entries: Sequence[Mapping[str, Any]]) -> Iterator[List[Mapping[str, Any]]]:
+        """Hold the write lock over a write of *entries*; yields those that are not duplicates
+
+        The stats sidecar is carried over the write, and the idempotency keys
+        of the written entries are remembered once the block completes.
+        """
+        with self.writing():
+            fresh, keys, rejected = self.duplicates.screen(entries)
+            with self.tracking_summary(fresh):
+                yield fresh
+            self.duplicates.record(keys, rejected)
+
+    @contextmanager
+    def tracking_summary(self, entries: Sequence[Mapping[str, Any]]) -> Iterator[None]:
+        """Carry the sidecars derived from the log over a write of *entries*; hold the write lock
+
+        A sidecar that was already stale before the write is left alone, to be
+        recomputed by the next reader. The stats and rollups advance from what
+        the open installs report, so they go stale with them.
+        """
+        before = self.generation()
+        yield
+        after = self.generation()
+        closed = self.open_installs.track(entries, before, after)
+        if closed is not None:
+            self.stats_file.update(entries, closed, before, after)
+            self.rollups.update(entries, closed, before, after)
+        self.names.update(entries, before, after)
+
+    def space_usage(self) -> Dict[str, int]:
+        """Return ``stored_bytes``/``raw_bytes`` on disk and the compressed segment count"""
+        size = self.path.stat().st_size if self.path.exists() else 0
+        return {"stored_bytes": size, "raw_bytes": size, "compressed_segments": 0}
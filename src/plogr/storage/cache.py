@@ -0,0 +1,221 @@
+"""Process-wide cache of parsed log files, validated against their inode and mtime"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+from .base import Record
+from .checksum import verified_body
+from .reader import decode_lines, mapped
+from .table import EventTable
+
+DEFAULT_CACHE_MAX_EVENTS = 1_000_000
+
+# (st_dev, st_ino, st_mtime_ns, st_size); None for a file that does not exist.
+FileKey = Optional[Tuple[int, int, int, int]]
+# Bytes kept from just before the parsed offset to detect rewritten files.
+_FINGERPRINT_BYTES = 64
+
+
+def stat_key(path: Path) -> FileKey:
+    """Return what identifies the current contents of *path* for the cache"""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+@dataclass
+class _Entry:
+    key: Any
+    table: EventTable
+    # Tail files only: bytes of the growing file folded into ``table`` so far.
+    offset: int = 0
+    fingerprint: bytes = b""
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    tail_reads: int = 0
+    evictions: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+@dataclass
+class ParsedLogCache:
+    """LRU of ``EventTable`` views of log files, bounded by the rows they hold.
+
+    Entries are keyed by a name (normally the log's path) and validated against
+    ``stat_key`` of the files they were built from, so a hit costs one ``stat``
+    per file and no parsing. Logs that only ever grow at the end (the journal's
+    active segment, the columnar tail) remember how many bytes they have folded,
+    and when the same inode has only grown, just the new lines are parsed.
+
+    Tables handed out are shared between callers and must be treated as
+    read-only; growing one copies it first. Once the cached rows exceed
+    ``max_events``, least recently used entries are dropped. ``max_events=0``
+    disables caching.
+    """
+
+    max_events: int = DEFAULT_CACHE_MAX_EVENTS
+    stats: CacheStats = field(default_factory=CacheStats)
+
+    def __post_init__(self) -> None:
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_events > 0
+
+    @property
+    def rows(self) -> int:
+        return sum(len(entry.table) for entry in self._entries.values())
+
+    def resize(self, max_events: int) -> None:
+        """Change the row bound, evicting entries that no longer fit."""
+        with self._lock:
+            self.max_events = max_events
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def lookup(self, name: str, key: Any, build: Callable[[], EventTable]) -> EventTable:
+        """Return the table cached under *name* for *key*, building it on a miss."""
+        entry = self._get(name)
+        if entry is not None and entry.key == key:
+            self.stats.hits += 1
+            return entry.table
+        self.stats.misses += 1
+        table = build()
+        self._put(name, _Entry(key, table))
+        return table
+
+    def lookup_tail(
+        self,
+        name: str,
+        head_key: Any,
+        tail: Path,
+        build_head: Callable[[], EventTable],
+    ) -> EventTable:
+        """Return the fold of a fixed head (*head_key*) followed by the growing file *tail*.
+
+        Args:
+            name: Cache entry name
+            head_key: Identifies everything read before *tail*; any change means
+                a full rebuild
+            tail: Append-only JSON Lines file folded onto the head
+            build_head: Builds a fresh table of the head
+        """
+        tail_key = stat_key(tail)
+        key = (head_key, tail_key)
+        entry = self._get(name)
+        if entry is not None and entry.key == key:
+            self.stats.hits += 1
+            return entry.table
+
+        if entry is not None and _grew(entry, head_key, tail_key, tail):
+            self.stats.tail_reads += 1
+            table, start = entry.table.copy(), entry.offset
+        else:
+            self.stats.misses += 1
+            table, start = build_head(), 0
+
+        offset, fingerprint = start, b""
+        if tail_key is not None:
+            with mapped(tail) as mm:
+                if mm is not None:
+                    offset = _complete_end(mm, start, min(tail_key[3], len(mm)))
+                    table.extend(_records_between(mm, start, offset, tail))
+                    fingerprint = mm[max(0, offset - _FINGERPRINT_BYTES) : offset]
+        self._put(name, _Entry(key, table, offset, fingerprint))
+        return table
+
+    def _get(self, name: str) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                self._entries.move_to_end(name)
+            return entry
+
+    def _put(self, name: str, entry: _Entry) -> None:
+        with self._lock:
+            self._entries.pop(name, None)
+            if len(entry.table) > self.max_events:
+                return
+            self._entries[name] = entry
+            self._evict()
+
+    def _evict(self) -> None:
+        rows = sum(len(entry.table) for entry in self._entries.values())
+        while self._entries and rows > self.max_events:
+            _, dropped = self._entries.popitem(last=False)
+            rows -= len(dropped.table)
+            self.stats.evictions += 1
+
+
+def _grew(entry: _Entry, head_key: Any, tail_key: FileKey, tail: Path) -> bool:
+    """Whether *tail* is the same file as when *entry* was built, with bytes appended."""
+    cached_head, cached_tail = entry.key
+    if cached_head != head_key or cached_tail is None or tail_key is None:
+        return False
+    if cached_tail[:2] != tail_key[:2] or tail_key[3] < entry.offset:
+        return False
+    # Guard against a rewrite that kept the inode: the bytes before the offset must match.
+    start = entry.offset - len(entry.fingerprint)
+    with tail.open("rb") as fp:
+        fp.seek(start)
+        return fp.read(len(entry.fingerprint)) == entry.fingerprint
+
+
+def _complete_end(mm: Any, start: int, end: int) -> int:
+    """Return where the complete lines in ``mm[start:end]`` stop.
+
+    A final line without its newline may still be being written; it is left
+    for the next read unless it already decodes on its own.
+    """
+    last = mm.rfind(b"\n", start, end)
+    line_start = last + 1 if last >= 0 else start
+    if line_start == end:
+        return end
+    try:
+        json.loads(verified_body(mm[line_start:end]))
+    except ValueError:
+        return line_start
+    return end
+
+
+def _records_between(mm: Any, start: int, end: int, path: Path) -> Iterator[Record]:
+    return decode_lines(_lines_between(mm, start, end), path)
+
+
+def _lines_between(mm: Any, start: int, end: int) -> Iterator[bytes]:
+    mm.seek(start)
+    while mm.tell() < end:
+        line = mm.readline()
+        yield line[: len(line) - max(0, mm.tell() - end)]
+
+
+def tail_head_key(paths: Sequence[Path]) -> Tuple[Tuple[str, FileKey], ...]:
+    """Key the files read before a growing tail by name and ``stat_key``."""
+    return tuple((os.fspath(path), stat_key(path)) for path in paths)
+
+
+# Shared by every store in the process, so repeated loggers reuse each other's work.
+LOG_CACHE = ParsedLogCache()
@@ -0,0 +1,46 @@
+"""CRC32 checksums carried by every JSON Lines record"""
+
+from __future__ import annotations
+
+import json
+import zlib
+from typing import Any, Mapping
+
+# Each line ends with the checksum of the line without it: {...,"_crc":"1a2b3c4d"}
+_CRC_PREFIX = b',"_crc":"'
+_CRC_SUFFIX_BYTES = len(_CRC_PREFIX) + 8 + 2
+
+
+class ChecksumError(ValueError):
+    """A record's bytes do not match the checksum written with them"""
+
+
+def encode_record(entry: Mapping[str, Any]) -> bytes:
+    """Serialize *entry* as one JSON line carrying the CRC32 of its own encoding.
+
+    The checksum is a trailing ``_crc`` key, so the line is still plain JSON to
+    any other tool.
+    """
+    body = json.dumps(dict(entry), separators=(",", ":")).encode("utf-8")
+    return b'%s%s%08x"}\n' % (body[:-1], _CRC_PREFIX, zlib.crc32(body))
+
+
+def verified_body(line: bytes) -> bytes:
+    """Return the JSON of *line* without its checksum, checking it on the way.
+
+    Lines written before checksums were added are returned unchanged.
+
+    Raises:
+        ChecksumError: If the line carries a checksum that does not match
+    """
+    line = line.rstrip()
+    if line[-_CRC_SUFFIX_BYTES:-10] != _CRC_PREFIX or not line.endswith(b'"}'):
+        return line
+    body = line[:-_CRC_SUFFIX_BYTES] + b"}"
+    try:
+        expected = int(line[-10:-2], 16)
+    except ValueError:
+        raise ChecksumError("malformed checksum") from None
+    if zlib.crc32(body) != expected:
+        raise ChecksumError("checksum mismatch")
+    return body
@@ -0,0 +1,176 @@
+"""Columnar snapshot storage engine with a JSON Lines tail"""
+
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+from typing import Any, ClassVar, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .base import EventStore, Record, file_stamp
+from .cache import LOG_CACHE, tail_head_key
+from .durability import SyncPolicy, fsync_dir
+from .journal import DEFAULT_SEGMENT_MAX_BYTES, _append_lines, _encode_lines, _read_segment
+from .predicate import QueryFilters
+from .recovery import VerifiedTail
+from .table import EventTable
+
+logger = logging.getLogger(__name__)
+
+
+class ColumnarStore(EventStore):
+    """Keep folded records in a dictionary-encoded ``EventTable`` on disk.
+
+    New events are appended to ``packages.cols.wal`` one JSON line at a time, like
+    the journal's active segment. Once the tail reaches ``segment_max_bytes`` (or
+    on ``compact``) it is folded into the ``packages.cols`` snapshot, whose
+    columns load straight into arrays without parsing a record per event.
+
+    Checkpoints rename the tail to ``packages.cols.wal.old`` before folding it in,
+    and the snapshot header names the exact file it absorbed, so a crash at any
+    point neither loses nor replays events.
+    """
+
+    name: ClassVar[str] = "columnar"
+
+    def __init__(
+        self,
+        data_dir: Path,
+        file_mode: int = 0o600,
+        checkpoint_bytes: int = DEFAULT_SEGMENT_MAX_BYTES,
+        durability: Optional[SyncPolicy] = None,
+    ) -> None:
+        super().__init__(data_dir, file_mode, durability)
+        self.checkpoint_bytes = checkpoint_bytes
+        self.wal = self.path.with_name(self.path.name + ".wal")
+        self.sealed_wal = self.path.with_name(self.path.name + ".wal.old")
+        self.cache = LOG_CACHE
+
+    @classmethod
+    def filename(cls) -> str:
+        return "packages.cols"
+
+    @classmethod
+    def from_settings(
+        cls, data_dir: Path, file_mode: int, settings: Mapping[str, Any]
+    ) -> "ColumnarStore":
+        return cls(
+            data_dir,
+            file_mode,
+            int(settings.get("segment_max_bytes", DEFAULT_SEGMENT_MAX_BYTES)),
+            SyncPolicy.from_settings(settings),
+        )
+
+    def ensure(self) -> None:
+        if not self.path.exists():
+            self._save(EventTable())
+        self.path.chmod(self.file_mode)
+
+    def append_many(self, entries: Sequence[Mapping[str, Any]]) -> int:
+        """Append *entries* to the tail, folding it into the snapshot once it is large."""
+        if not entries:
+            return 0
+        payload = _encode_lines(entries)
+        with self.committing(entries) as fresh:
+            if not fresh:
+                return 0
+            if len(fresh) != len(entries):
+                payload = _encode_lines(fresh)
+            created = _append_lines(self.wal, payload)
+            if created:
+                self.wal.chmod(self.file_mode)
+            self.durability.committed(
+                files=[self.wal], dirs=[self.data_dir] if created else [], events=len(fresh)
+            )
+            if self.wal.stat().st_size >= self.checkpoint_bytes > 0:
+                self._checkpoint()
+        return len(fresh)
+
+    def recover(self) -> int:
+        """Check lines appended to the tail since the last run; cut a torn end"""
+        super().recover()
+        tail = VerifiedTail(self.wal, self.file_mode)
+        if not tail.pending():
+            return 0
+        with self.writing():
+            return tail.recover()[0]
+
+    def compact(self) -> int:
+        """Fold the tail into the snapshot; returns the number of tail files absorbed"""
+        # Folding the tail changes no counters, so the sidecar stays valid.
+        with self.writing(), self.tracking_summary(()):
+            return 1 if self._checkpoint() else 0
+
+    def _checkpoint(self) -> bool:
+        if not self.sealed_wal.exists():
+            if not self.wal.exists() or self.wal.stat().st_size == 0:
+                return False
+            # Pending batched syncs name the tail path, which is about to move.
+            self.durability.flush()
+            os.replace(self.wal, self.sealed_wal)
+            fsync_dir(self.data_dir)
+
+        table = self.load_table()
+        self._save(table, {"sealed_wal": list(file_stamp(self.sealed_wal))})
+        self.sealed_wal.unlink()
+        fsync_dir(self.data_dir)
+        logger.debug("Folded journal tail into %s (%d rows)", self.path, len(table))
+        return True
+
+    def _save(self, table: EventTable, header: Optional[Dict[str, Any]] = None) -> None:
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        table.save(tmp_path, header)
+        tmp_path.chmod(self.file_mode)
+        os.replace(tmp_path, self.path)
+        fsync_dir(self.data_dir)
+
+    def load_table(self) -> EventTable:
+        """Load the snapshot and fold in whatever tail it has not absorbed yet.
+
+        The result is cached per process; while only the tail grows, later calls
+        fold just the lines appended since.
+        """
+        head = tail_head_key([self.path, self.sealed_wal])
+        return self.cache.lookup_tail(str(self.path), head, self.wal, self._load_snapshot)
+
+    def _load_snapshot(self) -> EventTable:
+        table, header = EventTable.load(self.path) if self.path.exists() else (EventTable(), {})
+        table.extend(self._sealed_tail(header))
+        return table
+
+    def _sealed_tail(self, header: Mapping[str, Any]) -> Iterator[Record]:
+        if self.sealed_wal.exists() and list(file_stamp(self.sealed_wal)) != header.get(
+            "sealed_wal"
+        ):
+            yield from _read_segment(self.sealed_wal)
+
+    def load(self) -> List[Record]:
+        return list(self.load_table())
+
+    def iter_records(self) -> Iterator[Record]:
+        return iter(self.load_table())
+
+    def generation(self) -> str:
+        parts = [super().generation()]
+        for path in (self.sealed_wal, self.wal):
+            if path.exists():
+                parts.append("-".join(str(part) for part in file_stamp(path)))
+        return ":".join(parts)
+
+    def iter_matching(
+        self, filters: QueryFilters, after: Optional[int] = None
+    ) -> Iterator[Tuple[int, Record]]:
+        table = self.load_table()
+        return table.stream(table.matching(filters, self._table_names(filters, table)), after)
+
+    def stream_matching(
+        self, filters: QueryFilters, after: Optional[int] = None
+    ) -> Iterator[Tuple[int, Record]]:
+        # The table and its matching rows stay valid once the lock is released.
+        with self.reading():
+            return self.iter_matching(filters, after)
+
+    def explain(self, filters: QueryFilters) -> List[str]:
+        table = self.load_table()
+        plan = table.plan(filters, self._table_names(filters, table))
+        return [f"table of {self.path.name}: {len(table)} record(s)", *plan.describe()]
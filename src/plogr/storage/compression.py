@@ -0,0 +1,66 @@
+"""Stdlib codecs for compressed journal segments"""
+
+from __future__ import annotations
+
+import bz2
+import gzip
+import logging
+import lzma
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMPRESSION = "none"
+
+# codec name -> (file suffix, opener); every opener streams and accepts text modes.
+CODECS: Dict[str, Tuple[str, Callable[..., IO[Any]]]] = {
+    "gzip": (".gz", gzip.open),
+    "bz2": (".bz2", bz2.open),
+    "lzma": (".xz", lzma.open),
+}
+
+_BY_SUFFIX = {suffix: name for name, (suffix, _) in CODECS.items()}
+
+
+def resolve_codec(name: Optional[str]) -> Optional[str]:
+    """Return the codec for a ``compression`` setting, or None for uncompressed.
+
+    Unknown values are logged and treated as ``"none"`` so a typo in the config
+    never stops events from being recorded.
+    """
+    if not name or name == DEFAULT_COMPRESSION:
+        return None
+    if name not in CODECS:
+        logger.warning("Unknown compression '%s'; storing segments uncompressed", name)
+        return None
+    return name
+
+
+def codec_for(path: Path) -> Optional[str]:
+    """Return the codec a segment file was written with, judging by its suffix"""
+    return _BY_SUFFIX.get(path.suffix)
+
+
+def suffix_for(codec: Optional[str]) -> str:
+    return CODECS[codec][0] if codec else ""
+
+
+def open_segment(path: Path, mode: str = "rt") -> IO[Any]:
+    """Open a possibly compressed segment; text modes decode UTF-8 incrementally"""
+    codec = codec_for(path)
+    kwargs: Dict[str, Any] = {"encoding": "utf-8"} if "t" in mode else {}
+    if codec is None:
+        return path.open(mode.replace("t", ""), **kwargs)
+    return CODECS[codec][1](path, mode, **kwargs)
+
+
+def raw_size(path: Path) -> int:
+    """Return the uncompressed size of a segment, streaming through it if needed"""
+    if codec_for(path) is None:
+        return path.stat().st_size
+    total = 0
+    with open_segment(path, "rb") as fp:
+        while chunk := fp.read(1024 * 1024):
+            total += len(chunk)
+    return total
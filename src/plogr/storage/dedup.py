@@ -0,0 +1,225 @@
+"""Rejection of events submitted twice, keyed by their idempotency key"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import mmap
+import os
+import sqlite3
+import struct
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+KEY_FIELD = "idempotency_key"
+
+DEFAULT_CAPACITY = 16 * 1024
+# About 1% false positives with 7 hashes at 9.6 bits per key.
+_BITS_PER_KEY = 9.6
+_HASHES = 7
+
+_BLOOM_MAGIC = b"PLOGRBLM"
+_BLOOM_HEADER = struct.Struct("<8sQQI")  # magic, capacity, keys added, hash count
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS keys (key TEXT PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+class BloomFilter:
+    """Bloom filter kept in a memory-mapped file and updated in place.
+
+    Adding a key only touches the pages holding its bits and the header, so the
+    cost of a write does not grow with the number of keys. The header counts the
+    keys added, which tells when the filter is full and must be rebuilt larger.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._fp = path.open("r+b")
+        try:
+            self._mm = mmap.mmap(self._fp.fileno(), 0)
+            magic, self.capacity, self.count, self.hashes = _BLOOM_HEADER.unpack_from(self._mm)
+            if magic != _BLOOM_MAGIC:
+                raise ValueError(f"{path} is not a plogr Bloom filter")
+        except (ValueError, struct.error):
+            self._fp.close()
+            raise
+        self.bits = (len(self._mm) - _BLOOM_HEADER.size) * 8
+
+    @classmethod
+    def create(
+        cls, path: Path, capacity: int, keys: Iterable[str], file_mode: int
+    ) -> "BloomFilter":
+        """Write a filter sized for *capacity* keys holding *keys*, replacing *path*"""
+        size = math.ceil(capacity * _BITS_PER_KEY / 8)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with tmp_path.open("wb") as fp:
+            fp.write(_BLOOM_HEADER.pack(_BLOOM_MAGIC, capacity, 0, _HASHES))
+            fp.truncate(_BLOOM_HEADER.size + size)
+        tmp_path.chmod(file_mode)
+        bloom = cls(tmp_path)
+        bloom.add(keys)
+        bloom.flush()
+        os.replace(tmp_path, path)
+        bloom.path = path
+        return bloom
+
+    def __contains__(self, key: str) -> bool:
+        mm = self._mm
+        return all(
+            mm[_BLOOM_HEADER.size + bit // 8] & (1 << (bit % 8)) for bit in self._positions(key)
+        )
+
+    def add(self, keys: Iterable[str]) -> None:
+        mm = self._mm
+        added = 0
+        for key in keys:
+            for bit in self._positions(key):
+                mm[_BLOOM_HEADER.size + bit // 8] |= 1 << (bit % 8)
+            added += 1
+        if added:
+            self.count += added
+            _BLOOM_HEADER.pack_into(mm, 0, _BLOOM_MAGIC, self.capacity, self.count, self.hashes)
+
+    def flush(self) -> None:
+        self._mm.flush()
+
+    def close(self) -> None:
+        self._mm.close()
+        self._fp.close()
+
+    def _positions(self, key: str) -> Iterable[int]:
+        # Two 64-bit halves of one digest stand in for independent hashes.
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+
+class DuplicateFilter:
+    """Idempotency keys already written to a store.
+
+    The exact set lives in ``<data file>.keys``, a small SQLite database that
+    also counts rejected submissions. A Bloom filter in ``<data file>.keys.bloom``
+    answers most lookups without touching it: a key the filter has never seen
+    is new, and only keys it may have seen are looked up in the database. Bits
+    are set before a key is stored, so the filter never misses a stored key; if
+    it knows of fewer keys than the database (it was deleted, or a crash lost
+    its pages), it is rebuilt from the database.
+
+    Entries without a key are always accepted. Callers hold the store's writer
+    lock around ``screen``, the write, and ``record``.
+    """
+
+    def __init__(self, data_path: Path, file_mode: int = 0o600, sync: bool = True) -> None:
+        self.path = data_path.with_name(data_path.name + ".keys")
+        self.bloom_path = data_path.with_name(data_path.name + ".keys.bloom")
+        self.file_mode = file_mode
+        self.sync = sync
+
+    def screen(
+        self, entries: Sequence[Mapping[str, Any]]
+    ) -> Tuple[List[Mapping[str, Any]], List[str], int]:
+        """Split *entries* into those to write and the duplicates to drop.
+
+        Returns:
+            (entries to write, their keys, number of duplicates rejected)
+        """
+        if not any(entry.get(KEY_FIELD) for entry in entries):
+            return list(entries), [], 0
+        fresh: List[Mapping[str, Any]] = []
+        keys: List[str] = []
+        batch: Set[str] = set()
+        rejected = 0
+        with self._connect() as conn:
+            bloom = self._bloom(conn)
+            try:
+                for entry in entries:
+                    key = entry.get(KEY_FIELD)
+                    if key:
+                        key = str(key)
+                        if key in batch or (key in bloom and _stored(conn, key)):
+                            rejected += 1
+                            continue
+                        batch.add(key)
+                        keys.append(key)
+                    fresh.append(entry)
+            finally:
+                bloom.close()
+        if rejected:
+            logger.info("Rejected %d duplicate event(s)", rejected)
+        return fresh, keys, rejected
+
+    def record(self, keys: Sequence[str], rejected: int) -> None:
+        """Remember *keys* as written and count *rejected* duplicates"""
+        if not keys and not rejected:
+            return
+        with self._connect() as conn:
+            if keys:
+                bloom = self._bloom(conn, len(keys))
+                try:
+                    bloom.add(keys)
+                    if self.sync:
+                        bloom.flush()
+                finally:
+                    bloom.close()
+            with conn:
+                conn.executemany("INSERT OR IGNORE INTO keys VALUES (?)", ((k,) for k in keys))
+                for name, amount in (("keys", len(keys)), ("rejected", rejected)):
+                    if amount:
+                        conn.execute(
+                            "INSERT INTO counters VALUES (?, ?) "
+                            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                            (name, amount),
+                        )
+
+    def rejected(self) -> int:
+        """Return how many duplicate submissions were rejected so far"""
+        if not self.path.exists():
+            return 0
+        try:
+            with self._connect() as conn:
+                return _counter(conn, "rejected")
+        except sqlite3.Error as err:
+            logger.debug("Could not read duplicate counter from %s: %s", self.path, err)
+            return 0
+
+    def _connect(self) -> Any:
+        created = not self.path.exists()
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.executescript(_SCHEMA)
+        if created:
+            self.path.chmod(self.file_mode)
+        conn.execute(f"PRAGMA synchronous={'NORMAL' if self.sync else 'OFF'}")
+        return closing(conn)
+
+    def _bloom(self, conn: sqlite3.Connection, adding: int = 0) -> BloomFilter:
+        """Open the filter, rebuilding it if it lags the database or would overflow"""
+        stored = _counter(conn, "keys")
+        bloom: Optional[BloomFilter] = None
+        try:
+            bloom = BloomFilter(self.bloom_path)
+        except (OSError, ValueError) as err:
+            if not isinstance(err, FileNotFoundError):
+                logger.warning("Rebuilding unreadable Bloom filter %s: %s", self.bloom_path, err)
+        if bloom is not None and bloom.count >= stored and bloom.count + adding <= bloom.capacity:
+            return bloom
+        if bloom is not None:
+            bloom.close()
+        capacity = max(DEFAULT_CAPACITY, 2 * (stored + adding))
+        keys = (row[0] for row in conn.execute("SELECT key FROM keys"))
+        return BloomFilter.create(self.bloom_path, capacity, keys, self.file_mode)
+
+
+def _stored(conn: sqlite3.Connection, key: str) -> bool:
+    return conn.execute("SELECT 1 FROM keys WHERE key = ?", (key,)).fetchone() is not None
+
+
+def _counter(conn: sqlite3.Connection, name: str) -> int:
+    row = conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+    return int(row[0]) if row else 0
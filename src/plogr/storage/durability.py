@@ -0,0 +1,150 @@
+"""fsync policy shared by the storage engines"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Iterable, Mapping, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ("none", "batch", "always")
+DEFAULT_DURABILITY = "batch"
+DEFAULT_BATCH_EVENTS = 64
+DEFAULT_BATCH_DELAY = 1.0
+
+# Batch-mode policies with writes not synced yet. Only these are kept alive
+# for the flush at interpreter exit; a policy leaves the set when it flushes.
+_pending: Set["SyncPolicy"] = set()
+
+
+def fsync_file(path: Path) -> None:
+    """Flush a closed file's contents to disk."""
+    # Windows only flushes handles opened for writing.
+    fd = os.open(path, os.O_RDONLY if os.name == "posix" else os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_dir(path: Path) -> None:
+    """Persist directory entries (new or renamed files) where the platform allows it."""
+    if os.name != "posix":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SyncPolicy:
+    """Decide when written files and their directories are flushed to disk.
+
+    ``always`` syncs before every commit returns. ``none`` leaves write-back to
+    the kernel. ``batch`` never syncs more than once per ``batch_events`` events
+    or ``batch_delay`` seconds: pending files and directories are collected and
+    flushed together, by the commit that crosses a bound, by a timer once the
+    delay runs out, or at interpreter exit. A crash in ``batch`` mode can lose the
+    events of the last window, but never the ones synced before it.
+    """
+
+    def __init__(
+        self,
+        mode: str = DEFAULT_DURABILITY,
+        batch_events: int = DEFAULT_BATCH_EVENTS,
+        batch_delay: float = DEFAULT_BATCH_DELAY,
+    ) -> None:
+        if mode not in DURABILITY_MODES:
+            logger.warning(
+                "Unknown durability '%s'; falling back to '%s'", mode, DEFAULT_DURABILITY
+            )
+            mode = DEFAULT_DURABILITY
+        self.mode = mode
+        self.batch_events = batch_events
+        self.batch_delay = batch_delay
+        self._lock = threading.Lock()
+        self._files: Set[Path] = set()
+        self._dirs: Set[Path] = set()
+        self._events = 0
+        self._timer: Optional[threading.Timer] = None
+
+    @classmethod
+    def from_settings(cls, settings: Mapping[str, Any]) -> "SyncPolicy":
+        return cls(
+            str(settings.get("durability", DEFAULT_DURABILITY)),
+            int(settings.get("durability_batch_events", DEFAULT_BATCH_EVENTS)),
+            float(settings.get("durability_batch_delay", DEFAULT_BATCH_DELAY)),
+        )
+
+    @property
+    def syncs_data(self) -> bool:
+        """Whether file contents must reach disk before a rename publishes them.
+
+        Rewrite-style stores rely on this in ``batch`` mode too: deferring that
+        sync is what leaves a zero-length file behind after a crash.
+        """
+        return self.mode != "none"
+
+    def sync_fd(self, fd: int) -> None:
+        """Sync an open file ahead of a rename, unless durability is off."""
+        if self.syncs_data:
+            os.fsync(fd)
+
+    def committed(
+        self,
+        files: Iterable[Path] = (),
+        dirs: Iterable[Path] = (),
+        events: int = 1,
+    ) -> None:
+        """Note that *events* were written to *files* and entries changed in *dirs*."""
+        if self.mode == "none":
+            return
+        if self.mode == "always":
+            _sync_all(files, dirs)
+            return
+
+        with self._lock:
+            self._files.update(files)
+            self._dirs.update(dirs)
+            self._events += events
+            _pending.add(self)
+            due = self._events >= self.batch_events
+            if not due and self._timer is None:
+                self._timer = threading.Timer(self.batch_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Sync everything still pending from ``batch`` mode."""
+        with self._lock:
+            files, dirs = self._files, self._dirs
+            self._files, self._dirs, self._events = set(), set(), 0
+            _pending.discard(self)
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        _sync_all(files, dirs)
+
+
+@atexit.register
+def _flush_pending() -> None:
+    for policy in list(_pending):
+        policy.flush()
+
+
+def _sync_all(files: Iterable[Path], dirs: Iterable[Path]) -> None:
+    for path in files:
+        try:
+            fsync_file(path)
+        except FileNotFoundError:
+            # Renamed or removed since the write; whoever moved it synced it first.
+            continue
+    for path in dirs:
+        fsync_dir(path)
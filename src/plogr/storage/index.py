@@ -0,0 +1,256 @@
+"""Persistent removal state of an event log: open installs and closed ones"""
+
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+from .base import Record, Stamp
+from .sidecar import (
+    OPEN_INSTALLS_SCHEMA,
+    MemoryOpenInstalls,
+    OpenInstalls,
+    Sidecar,
+    StoredOpenInstalls,
+)
+
+logger = logging.getLogger(__name__)
+
+# Closed install position -> (removal position, removal date)
+Closures = Dict[int, Tuple[int, Any]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS closures (
+    install INTEGER PRIMARY KEY,
+    removal INTEGER NOT NULL,
+    date
+);
+"""
+
+
+class OpenInstallIndex(Sidecar):
+    """State map deriving the removed flag of each install from the raw events.
+
+    ``open_installs`` holds the position of every install nobody has removed
+    yet, keyed by ``(manager, name)``; the highest position of a key is its
+    most recent install, which is the one the next removal closes.
+    ``closures`` maps the position of every closed install to the position
+    and date of the removal that closed it; readers use it to present the
+    install as removed and to skip the removal event. Positions count events
+    in the data file.
+
+    The state is stored in ``<data file>.idx``, a SQLite sidecar tagged with
+    the data file's stamp rather than the store generation, so a write looks
+    up and changes only the rows of the packages it installs or removes. If
+    the stamp does not match on load (missing index, crash between the two
+    writes, manual edit) the caller rebuilds it from the events; a damaged
+    index is discarded and rebuilt the same way.
+    """
+
+    suffix = ".idx"
+    version = "1"
+    schema = OPEN_INSTALLS_SCHEMA + _SCHEMA
+    label = "open-install index"
+
+    def __init__(self, data_path: Path, file_mode: int = 0o600) -> None:
+        super().__init__(data_path, file_mode)
+        self.count = 0
+        self.stamp: Optional[Stamp] = None
+        self._closed: Optional[Closures] = None
+
+    def load(self, data_stamp: Stamp) -> bool:
+        """Check that the sidecar describes the given data revision
+
+        Only the stamp and event count are read; see ``closed`` for the rest.
+
+        Args:
+            data_stamp: Current stamp of the data file
+
+        Returns:
+            True if the index is valid, False if it must be rebuilt
+        """
+        if self.stamp == data_stamp:
+            return True
+        self._closed = None
+        if not self.path.exists():
+            return False
+        try:
+            with self.connect() as conn:
+                meta = self.meta(conn)
+        except sqlite3.Error as err:
+            self._discard(err)
+            return False
+
+        if meta.get("stamp") != _encode(data_stamp):
+            logger.debug("Open-install index %s is stale; rebuilding", self.path)
+            return False
+        self.count = int(meta.get("count", 0))
+        self.stamp = data_stamp
+        return True
+
+    @property
+    def closed(self) -> Closures:
+        """Every closure of the loaded revision, read once and kept until the next write
+
+        Raises:
+            sqlite3.Error: If the index cannot be read
+        """
+        if self._closed is None:
+            with self.connect() as conn:
+                self._closed = {
+                    install: (removal, date)
+                    for install, removal, date in conn.execute(
+                        "SELECT install, removal, date FROM closures"
+                    )
+                }
+        return self._closed
+
+    def rebuild(self, entries: Iterable[Mapping[str, Any]], data_stamp: Stamp) -> None:
+        """Recompute the state from every event in the data file and store it.
+
+        Args:
+            entries: Events of the data file in order
+            data_stamp: Stamp of the data file *entries* were read from
+
+        Raises:
+            sqlite3.Error: If the index cannot be written
+        """
+        open_installs = MemoryOpenInstalls()
+        closed: Closures = {}
+        count = _advance(entries, 0, open_installs, closed)
+        self.stamp = None
+        with self.connect() as conn:
+            with conn:
+                StoredOpenInstalls(conn).replace(open_installs)
+                conn.execute("DELETE FROM closures")
+                conn.executemany(
+                    "INSERT INTO closures VALUES (?, ?, ?)",
+                    ((install, *closure) for install, closure in closed.items()),
+                )
+                self.tag(conn, stamp=_encode(data_stamp), count=str(count))
+        self.count, self.stamp, self._closed = count, data_stamp, closed
+
+    def apply(self, entries: Iterable[Mapping[str, Any]], start: int, data_stamp: Stamp) -> None:
+        """Advance the state past *entries*, written from position *start* on.
+
+        Only the rows of the packages *entries* name are read or changed, in
+        one transaction that also tags the index with *data_stamp*, the stamp
+        of the data file after the write. An index that cannot be updated is
+        left stale, to be rebuilt by the next writer.
+        """
+        self.stamp = None
+        closed: Closures = {}
+        try:
+            with self.connect() as conn:
+                with conn:
+                    count = _advance(entries, start, StoredOpenInstalls(conn), closed)
+                    conn.executemany(
+                        "INSERT INTO closures VALUES (?, ?, ?)",
+                        ((install, *closure) for install, closure in closed.items()),
+                    )
+                    self.tag(conn, stamp=_encode(data_stamp), count=str(count))
+        except sqlite3.Error as err:
+            self._closed = None
+            self._discard(err)
+            return
+        if self._closed is not None:
+            self._closed.update(closed)
+        self.count, self.stamp = count, data_stamp
+
+    def open_positions(self, manager: str, name: str) -> List[int]:
+        """Return the positions of the open installs of a package, oldest first"""
+        with self.connect() as conn:
+            return StoredOpenInstalls(conn).values(manager, name)
+
+    def _discard(self, err: sqlite3.Error) -> None:
+        if isinstance(err, sqlite3.DatabaseError) and not isinstance(err, sqlite3.OperationalError):
+            logger.warning("Discarding unreadable open-install index %s: %s", self.path, err)
+            self.path.unlink(missing_ok=True)
+        else:
+            logger.warning("Could not use open-install index %s: %s", self.path, err)
+
+
+def find_closures(
+    entries: Iterable[Mapping[str, Any]], only: Optional[Set[Tuple[str, str]]] = None
+) -> Closures:
+    """Derive the closures of *entries* in memory, without an index
+
+    Args:
+        entries: Events of the data file in order
+        only: Track just these ``(manager, name)`` keys (see ``removed_keys``)
+    """
+    closed: Closures = {}
+    _advance(entries, 0, MemoryOpenInstalls(), closed, only)
+    return closed
+
+
+def scan_closures(read: Callable[[], Iterable[Mapping[str, Any]]]) -> Closures:
+    """Derive the closures of the events *read* produces, without an index
+
+    The first pass collects the packages that were ever removed, so the second
+    only tracks installs of those instead of every open install.
+
+    Args:
+        read: Produces the events of the data file in order, once per pass
+    """
+    keys = removed_keys(read())
+    if not keys:
+        return {}
+    return find_closures(read(), only=keys)
+
+
+def apply_closures(entries: Iterable[Record], closed: Closures) -> Iterator[Record]:
+    """Yield *entries* as folded records: closed installs removed, their removals skipped"""
+    consumed = {removal for removal, _ in closed.values()}
+    for position, entry in enumerate(entries):
+        if position in consumed:
+            continue
+        closure = closed.get(position)
+        if closure is not None:
+            entry = dict(entry, removed=True, action="remove", date_removed=closure[1])
+        yield entry
+
+
+def removed_keys(entries: Iterable[Mapping[str, Any]]) -> Set[Tuple[str, str]]:
+    """Return the ``(manager, name)`` keys that removal events in *entries* name"""
+    return {
+        (str(entry.get("manager")), str(entry.get("name")))
+        for entry in entries
+        if entry.get("removed") and not entry.get("date_removed")
+    }
+
+
+def _advance(
+    entries: Iterable[Mapping[str, Any]],
+    start: int,
+    open_installs: OpenInstalls,
+    closed: Closures,
+    only: Optional[Set[Tuple[str, str]]] = None,
+) -> int:
+    """Pair the removals in *entries* with open installs; return the new event count
+
+    Records that already carry ``date_removed`` were closed in place by an
+    older release and neither open nor close anything.
+    """
+    count = start
+    for position, entry in enumerate(entries, start):
+        count = position + 1
+        if entry.get("date_removed"):
+            continue
+        manager, name = str(entry.get("manager")), str(entry.get("name"))
+        if only is not None and (manager, name) not in only:
+            continue
+        if entry.get("removed"):
+            install = open_installs.pop(manager, name)
+            if install is not None:
+                closed[install] = (position, entry.get("date"))
+        else:
+            open_installs.push(manager, name, position)
+    return count
+
+
+def _encode(stamp: Stamp) -> str:
+    return json.dumps(list(stamp))
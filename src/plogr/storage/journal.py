@@ -0,0 +1,537 @@
+"""Append-only JSON Lines journal storage engine"""
+
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import lzma
+import os
+import re
+from pathlib import Path
+from typing import Any, ClassVar, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .base import EventStore, OpenCounts, Record, fold_events, folded_rows, track_open
+from .index import apply_closures, scan_closures
+from .cache import LOG_CACHE, tail_head_key
+from .checksum import encode_record
+from .compression import codec_for, open_segment, raw_size, resolve_codec, suffix_for
+from .durability import SyncPolicy, fsync_dir, fsync_file
+from .manifest import SegmentInfo, SegmentManifest, describe_segment
+from .predicate import QueryFilters
+from .reader import decode_lines, iter_lines
+from .recovery import VerifiedTail
+from .table import EventTable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+
+# Sealed pieces are "<YYYY-MM>.<NNNN>.jsonl"; compaction merges them into "<YYYY-MM>.jsonl",
+# followed by the codec suffix (".gz", ".bz2", ".xz") when compression is enabled.
+_SEGMENT_RE = re.compile(
+    r"^(?P<month>\d{4}-\d{2})(?:\.(?P<piece>\d{4}))?\.jsonl(?P<codec>\.gz|\.bz2|\.xz)?$"
+)
+
+
+class JournalStore(EventStore):
+    """Append one JSON line per event; removals are appended as their own records.
+
+    Only the active segment (``packages.jsonl``) is ever written. It is sealed into
+    ``segments/`` when an event from a later month arrives or when it grows past
+    ``segment_max_bytes``, so write cost depends on the active segment alone and
+    sealed segments never change until compaction merges a finished month into a
+    single file. Readers replay sealed segments in order followed by the active one,
+    folding removals with ``fold_events`` to obtain the same view the JSON array
+    store keeps on disk. A ``SegmentManifest`` records each sealed segment's date
+    range so date-filtered queries skip segments that cannot match. With a
+    ``compression`` codec configured, compaction writes merged months through it;
+    readers decompress them line by line.
+    """
+
+    name: ClassVar[str] = "journal"
+
+    def __init__(
+        self,
+        data_dir: Path,
+        file_mode: int = 0o600,
+        segment_max_bytes: int = DEFAULT_SEGMENT_MAX_BYTES,
+        compression: Optional[str] = None,
+        durability: Optional[SyncPolicy] = None,
+    ) -> None:
+        super().__init__(data_dir, file_mode, durability)
+        self.segments_dir = data_dir / "segments"
+        self.segment_max_bytes = segment_max_bytes
+        self.compression = resolve_codec(compression)
+        self.manifest = SegmentManifest(self.segments_dir, file_mode)
+        self.cache = LOG_CACHE
+
+    @classmethod
+    def filename(cls) -> str:
+        return "packages.jsonl"
+
+    @classmethod
+    def from_settings(
+        cls, data_dir: Path, file_mode: int, settings: Mapping[str, Any]
+    ) -> "JournalStore":
+        return cls(
+            data_dir,
+            file_mode,
+            int(settings.get("segment_max_bytes", DEFAULT_SEGMENT_MAX_BYTES)),
+            settings.get("compression"),
+            SyncPolicy.from_settings(settings),
+        )
+
+    def ensure(self) -> None:
+        if not self.path.exists():
+            self.path.touch()
+            fsync_dir(self.data_dir)
+        self.path.chmod(self.file_mode)
+
+    def append_many(self, entries: Sequence[Mapping[str, Any]]) -> int:
+        """Append one line per entry, sealing the active segment when it rolls over."""
+        if not entries:
+            return 0
+        # Encode before locking so the exclusive section only does file I/O.
+        runs = _encoded_runs(entries)
+        with self.committing(entries) as fresh:
+            if len(fresh) != len(entries):
+                runs = _encoded_runs(fresh)
+            for month, run, payload in runs:
+                active_month = self._active_month()
+                if active_month is not None and (
+                    (month is not None and month > active_month)
+                    or self._active_size() >= self.segment_max_bytes > 0
+                ):
+                    self._seal_active(active_month)
+                self._write_active(run, payload)
+        return len(fresh)
+
+    def recover(self) -> int:
+        """Check lines appended to the active segment since the last run; cut a torn end"""
+        super().recover()
+        tail = VerifiedTail(self.path, self.file_mode)
+        if not tail.pending():
+            return 0
+        with self.writing():
+            return tail.recover()[0]
+
+    def _write_active(self, entries: Sequence[Mapping[str, Any]], payload: bytes) -> None:
+        created = _append_lines(self.path, payload)
+        if created:
+            self.path.chmod(self.file_mode)
+        self.durability.committed(
+            files=[self.path], dirs=[self.data_dir] if created else [], events=len(entries)
+        )
+
+    def _active_size(self) -> int:
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _active_month(self) -> Optional[str]:
+        """Return the month of the first event in the active segment, if any."""
+        for entry in _read_segment(self.path):
+            return _entry_month(entry)
+        return None
+
+    def _seal_active(self, month: Optional[str]) -> None:
+        """Move the active segment into ``segments/`` as the next piece of *month*."""
+        if month is None:
+            return
+        self.segments_dir.mkdir(mode=0o700 if self.file_mode == 0o600 else 0o755, exist_ok=True)
+        pieces = [
+            int(m.group("piece"))
+            for m in map(_SEGMENT_RE.match, os.listdir(self.segments_dir))
+            if m and m.group("month") == month and m.group("piece")
+        ]
+        target = self.segments_dir / f"{month}.{max(pieces, default=0) + 1:04d}.jsonl"
+        # Pending batched syncs name the active path, which is about to move.
+        self.durability.flush()
+        os.replace(self.path, target)
+        self.durability.committed(dirs=[self.segments_dir, self.data_dir], events=0)
+        logger.debug("Sealed journal segment %s", target)
+        self._record_segment(target)
+
+    def _record_segment(self, segment: Path) -> None:
+        """Add a freshly sealed *segment* to the manifest and checkpoint open installs."""
+        segments = self.manifest.load()
+        ordered = self.segment_files()
+        position = ordered.index(segment)
+        previous = ordered[:position]
+        state: Optional[OpenCounts] = {}
+        if previous:
+            state = self.manifest.read_state(previous[-1].name)
+        if state is None or any(p.name not in segments for p in previous):
+            self.rebuild_manifest()
+            return
+
+        entries = list(_read_segment(segment))
+        segments[segment.name] = describe_segment(entries)
+        segments[segment.name]["raw_bytes"] = segment.stat().st_size
+        segments[segment.name]["rows"] = folded_rows(entries, state)
+        self.manifest.write_state(segment.name, track_open(entries, state))
+        self.manifest.save(segments)
+
+    def rebuild_manifest(self) -> None:
+        """Recompute every manifest entry and checkpoint by replaying sealed segments."""
+        segments: Dict[str, SegmentInfo] = {}
+        counts: OpenCounts = {}
+        for segment in self.segment_files():
+            entries = list(_read_segment(segment))
+            segments[segment.name] = describe_segment(entries)
+            segments[segment.name]["raw_bytes"] = raw_size(segment)
+            segments[segment.name]["rows"] = folded_rows(entries, counts)
+            self.manifest.write_state(segment.name, track_open(entries, counts))
+        self.manifest.save(segments)
+
+    def segment_files(self) -> List[Path]:
+        """Return sealed segment files in replay order.
+
+        A merged month file supersedes any pieces of the same month that a crash
+        during compaction may have left behind.
+        """
+        pieces_by_month, merged_by_month = self._scan_segments()
+        ordered: List[Path] = []
+        for month in sorted(set(pieces_by_month) | set(merged_by_month)):
+            merged = self._preferred(merged_by_month.get(month, []))
+            ordered.extend([merged] if merged is not None else sorted(pieces_by_month[month]))
+        return ordered
+
+    def _scan_segments(self) -> Tuple[Dict[str, List[Path]], Dict[str, List[Path]]]:
+        """Group sealed segment files by month into (pieces, merged files)."""
+        pieces: Dict[str, List[Path]] = {}
+        merged: Dict[str, List[Path]] = {}
+        if not self.segments_dir.is_dir():
+            return pieces, merged
+        for filename in os.listdir(self.segments_dir):
+            m = _SEGMENT_RE.match(filename)
+            if not m:
+                continue
+            target = pieces if m.group("piece") else merged
+            target.setdefault(m.group("month"), []).append(self.segments_dir / filename)
+        return pieces, merged
+
+    def _preferred(self, candidates: List[Path]) -> Optional[Path]:
+        """Pick one merged file of a month; a crash while recompressing can leave two."""
+        if not candidates:
+            return None
+        matching = [p for p in candidates if codec_for(p) == self.compression]
+        return sorted(matching or candidates)[0]
+
+    def compact(self) -> int:
+        """Merge the pieces of every finished month into one segment file.
+
+        Merged files are written with the configured ``compression`` codec, and
+        finished months stored with a different codec are rewritten so that
+        changing the setting also applies to existing history. Corrupt or torn lines
+        are dropped from the merged file. The active month is left alone since it
+        may still gain pieces.
+
+        Finished months never change, so merged files are written without holding
+        the lock; the exclusive lock is only taken to publish them, and a month
+        whose files changed meanwhile (another compaction got there first) is
+        left for the next run.
+
+        Returns:
+            Number of segment files folded into merged segments or recompressed
+        """
+        if not self.segments_dir.is_dir():
+            return 0
+        with self.reading():
+            plan = self._compaction_plan()
+
+        written: Dict[str, Tuple[Path, SegmentInfo]] = {}
+        try:
+            for month, (files, sources) in plan.items():
+                if sources:
+                    written[month] = self._write_merged(month, sources)
+            with self.writing():
+                return self._publish_merged(plan, written)
+        finally:
+            for tmp_path, _ in written.values():
+                tmp_path.unlink(missing_ok=True)
+
+    def _compaction_plan(self) -> Dict[str, Tuple[List[Path], List[Path]]]:
+        """Map each finished month to (its segment files, the sources to merge if any)."""
+        active_month = self._active_month()
+        pieces_by_month, merged_by_month = self._scan_segments()
+        plan: Dict[str, Tuple[List[Path], List[Path]]] = {}
+        for month in sorted(set(pieces_by_month) | set(merged_by_month)):
+            if active_month is not None and month >= active_month:
+                continue
+            pieces = sorted(pieces_by_month.get(month, []))
+            candidates = merged_by_month.get(month, [])
+            merged = self._preferred(candidates)
+            sources: List[Path] = []
+            if merged is None:
+                sources = pieces
+            elif codec_for(merged) != self.compression:
+                sources = [merged]
+            files = sorted([*pieces, *candidates])
+            if sources or len(files) > 1:
+                plan[month] = (files, sources)
+        return plan
+
+    def _publish_merged(
+        self,
+        plan: Dict[str, Tuple[List[Path], List[Path]]],
+        written: Dict[str, Tuple[Path, SegmentInfo]],
+    ) -> int:
+        """Swap merged files in for their sources; call with the writer lock held."""
+        rewritten = 0
+        pieces_by_month, merged_by_month = self._scan_segments()
+        segments = self.manifest.load()
+        for month, (files, sources) in plan.items():
+            current = sorted([*pieces_by_month.get(month, []), *merged_by_month.get(month, [])])
+            if current != files:
+                continue
+            if month in written:
+                tmp_path, info = written.pop(month)
+                merged = self.segments_dir / f"{month}.jsonl{suffix_for(self.compression)}"
+                os.replace(tmp_path, merged)
+                fsync_dir(self.segments_dir)
+                logger.debug("Compacted %d journal segment file(s) into %s", len(sources), merged)
+                rows = [segments.get(source.name, {}).get("rows") for source in sources]
+                if None not in rows:
+                    info["rows"] = sum(rows)
+                segments[merged.name] = info
+                state = self.manifest.read_state(sources[-1].name)
+                if state is not None:
+                    self.manifest.write_state(merged.name, state)
+            else:
+                merged = self._preferred(merged_by_month.get(month, [])) or files[-1]
+
+            # Everything else is redundant once the merged file is durable.
+            stale = [p for p in files if p != merged]
+            for path in stale:
+                path.unlink()
+                segments.pop(path.name, None)
+                if path in pieces_by_month.get(month, []):
+                    self.manifest.drop_state(path.name)
+            if stale:
+                fsync_dir(self.segments_dir)
+            rewritten += len(stale)
+
+        if rewritten:
+            self.manifest.save(segments)
+            if any(
+                seg.name not in segments or not self.manifest.state_path(seg.name).exists()
+                for seg in self.segment_files()
+            ):
+                self.rebuild_manifest()
+        return rewritten
+
+    def _write_merged(self, month: str, sources: List[Path]) -> Tuple[Path, SegmentInfo]:
+        """Write *sources* into a temporary merged file of *month* and describe it."""
+        # Keep the codec suffix so the temporary file is written through the same codec.
+        suffix = suffix_for(self.compression)
+        tmp_path = self.segments_dir / f"{month}.tmp-{os.getpid()}.jsonl{suffix}"
+        merged: List[Record] = []
+        raw_bytes = 0
+        with open_segment(tmp_path, "wb") as out:
+            for source in sources:
+                for entry in _read_segment(source):
+                    line = encode_record(entry)
+                    merged.append(entry)
+                    raw_bytes += len(line)
+                    out.write(line)
+        # Compressed streams only write their trailer on close, so sync afterwards.
+        fsync_file(tmp_path)
+        tmp_path.chmod(self.file_mode)
+        info = describe_segment(merged)
+        info["raw_bytes"] = raw_bytes
+        return tmp_path, info
+
+    def space_usage(self) -> Dict[str, int]:
+        """Report on-disk and uncompressed sizes of the active and sealed segments."""
+        usage = super().space_usage()
+        manifest = self.manifest.load()
+        for segment in self.segment_files():
+            stored = segment.stat().st_size
+            raw = stored
+            if codec_for(segment) is not None:
+                usage["compressed_segments"] += 1
+                info = manifest.get(segment.name) or {}
+                raw = info.get("raw_bytes") or raw_size(segment)
+            usage["stored_bytes"] += stored
+            usage["raw_bytes"] += raw
+        return usage
+
+    def load(self) -> List[Record]:
+        return fold_events(self.iter_raw())
+
+    def iter_records(self) -> Iterator[Record]:
+        """Stream the folded journal one segment line at a time.
+
+        Which installs the removals close is worked out in earlier passes over
+        the segments (see ``scan_closures``), so memory grows with the removed
+        packages rather than with the history, as it would for ``load_table``.
+        """
+        paths = [*self.segment_files(), self.path]
+        closed = scan_closures(lambda: _iter_segments(paths))
+        return apply_closures(_iter_segments(paths), closed)
+
+    def load_table(self) -> EventTable:
+        """Fold the journal into an ``EventTable``, cached per process.
+
+        Sealed segments only change through sealing and compaction, so while
+        they stay the same, appends to the active segment are folded onto the
+        cached table without replaying the rest of the journal.
+        """
+        segments = self.segment_files()
+        return self.cache.lookup_tail(
+            str(self.path),
+            tail_head_key(segments),
+            self.path,
+            lambda: EventTable.fold(_iter_segments(segments)),
+        )
+
+    def iter_matching(
+        self, filters: QueryFilters, after: Optional[int] = None
+    ) -> Iterator[Tuple[int, Record]]:
+        """Filter an ``EventTable`` of the journal, skipping segments that end before *since*.
+
+        Later segments are always read, since their removals may close installs
+        in range. Rows of the pruned table are offset by the records of the
+        skipped segments, so positions match those of the whole journal.
+        """
+        table, offset = self._table_since(filters.since)
+        names = self.matching_names(filters.name) if filters.name else None
+        return table.stream(table.matching(filters, names), after, offset)
+
+    def stream_matching(
+        self, filters: QueryFilters, after: Optional[int] = None
+    ) -> Iterator[Tuple[int, Record]]:
+        # The table and its matching rows stay valid once the lock is released.
+        with self.reading():
+            return self.iter_matching(filters, after)
+
+    def explain(self, filters: QueryFilters) -> List[str]:
+        table, offset = self._table_since(filters.since)
+        names = self.matching_names(filters.name) if filters.name else None
+        plan = table.plan(filters, names).describe()
+        if filters.since is None:
+            return [f"table of the journal: {len(table)} record(s)", *plan]
+        return [
+            f"segments: skipped {offset} record(s) sealed before the range",
+            f"table of the rest: {len(table)} record(s)",
+            *plan,
+        ]
+
+    def _table_since(self, since: Optional[dt.date]) -> Tuple[EventTable, int]:
+        """Return the table of the journal from *since* on, and the records skipped before it
+
+        Without a segment to skip this is the cached table of the whole journal.
+        """
+        if since is None:
+            return self.load_table(), 0
+        segments, initial_open, offset = self._segments_since(since)
+        if initial_open is None:
+            return self.load_table(), 0
+        return EventTable.fold(_iter_segments([*segments, self.path]), initial_open), offset
+
+    def _segments_since(self, since: dt.date) -> Tuple[List[Path], Optional[OpenCounts], int]:
+        """Return the sealed segments that may hold events on or after *since*.
+
+        Only a leading run of segments is pruned, and only when the checkpoint of
+        the last pruned segment is available to seed removal matching.
+
+        Returns:
+            (segments to read, open installs before them, records in the skipped segments)
+        """
+        segments = self.segment_files()
+        manifest = self.manifest.load()
+        # A datetime cuts off within its day, which the dates compared here do not resolve.
+        cutoff = since.isoformat()[:10]
+
+        skip = 0
+        for segment in segments:
+            info = manifest.get(segment.name) or {}
+            max_date = info.get("max_date")
+            if not max_date or max_date[:10] >= cutoff or "rows" not in info:
+                break
+            skip += 1
+
+        if skip == 0:
+            return segments, None, 0
+        state = self.manifest.read_state(segments[skip - 1].name)
+        if state is None:
+            return segments, None, 0
+        skipped = sum(manifest[segment.name]["rows"] for segment in segments[:skip])
+        return segments[skip:], state, skipped
+
+    def iter_raw(self) -> Iterator[Record]:
+        """Yield journal entries in write order, skipping torn or corrupt lines."""
+        return _iter_segments([*self.segment_files(), self.path])
+
+
+def _iter_segments(paths: Iterable[Path]) -> Iterator[Record]:
+    for path in paths:
+        yield from _read_segment(path)
+
+
+def _encoded_runs(
+    entries: Sequence[Mapping[str, Any]],
+) -> List[Tuple[Optional[str], List[Mapping[str, Any]], bytes]]:
+    """Split *entries* into runs of one month, each with its encoded lines"""
+    return [(month, run, _encode_lines(run)) for month, run in _runs_by_month(entries)]
+
+
+def _encode_lines(entries: Sequence[Mapping[str, Any]]) -> bytes:
+    """Serialize *entries* as checksummed JSON Lines"""
+    return b"".join(encode_record(entry) for entry in entries)
+
+
+def _append_lines(path: Path, payload: bytes) -> bool:
+    """Append encoded lines to *path* in a single write; return True if *path* was new."""
+    created = not path.exists()
+    with path.open("a+b") as fp:
+        if fp.seek(0, os.SEEK_END) > 0:
+            fp.seek(-1, os.SEEK_END)
+            if fp.read(1) != b"\n":
+                # A previous writer died mid-line; keep our record on its own line.
+                payload = b"\n" + payload
+        fp.write(payload)
+    return created
+
+
+def _read_segment(path: Path) -> Iterator[Record]:
+    """Decode a segment one line at a time, memory-mapping it unless it is compressed."""
+    if not path.exists():
+        return
+    lines = iter_lines(path) if codec_for(path) is None else _decompressed_lines(path)
+    try:
+        yield from decode_lines(lines, path)
+    except (OSError, EOFError, lzma.LZMAError) as err:
+        # Truncated or damaged compressed stream: keep what decoded cleanly.
+        logger.warning("Stopped reading damaged journal segment %s: %s", path, err)
+
+
+def _decompressed_lines(path: Path) -> Iterator[bytes]:
+    with open_segment(path, "rb") as fp:
+        yield from fp
+
+
+def _entry_month(entry: Mapping[str, Any]) -> Optional[str]:
+    date = entry.get("date")
+    if isinstance(date, str) and len(date) >= 7:
+        return date[:7]
+    return None
+
+
+def _runs_by_month(
+    entries: Sequence[Mapping[str, Any]],
+) -> Iterator[Tuple[Optional[str], List[Mapping[str, Any]]]]:
+    """Split a batch into consecutive runs of entries from the same month."""
+    run: List[Mapping[str, Any]] = []
+    run_month: Optional[str] = None
+    for entry in entries:
+        month = _entry_month(entry)
+        if run and month != run_month:
+            yield run_month, run
+            run = []
+        run_month = month
+        run.append(entry)
+    if run:
+        yield run_month, run
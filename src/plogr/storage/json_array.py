@@ -0,0 +1,268 @@
+"""Single JSON array storage engine (the original ``packages.json`` layout)"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import textwrap
+from pathlib import Path
+from typing import IO, Any, ClassVar, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .base import EventStore, Record, file_stamp
+from .cache import LOG_CACHE, stat_key
+from .durability import SyncPolicy
+from .index import Closures, OpenInstallIndex, apply_closures, scan_closures
+from .predicate import QueryFilters
+from .reader import iter_json_array
+from .table import EventTable
+
+logger = logging.getLogger(__name__)
+
+_TAIL_BYTES = 4096
+
+
+class _TornArray(ValueError):
+    """The data file does not end with the array's closing bracket"""
+
+
+class JsonArrayStore(EventStore):
+    """Keep every event in one JSON array, appended to in place.
+
+    Removals are stored as events of their own, like installs, and no element
+    is ever changed once written. Which installs are removed, and when, is
+    derived at read time from the state map in ``packages.json.idx`` (see
+    ``OpenInstallIndex``), which each write advances by the events it appends.
+    The file stays the pretty-printed array earlier releases wrote; elements
+    that those releases closed in place still carry ``date_removed`` and are
+    read as they are.
+    """
+
+    name: ClassVar[str] = "json"
+
+    @classmethod
+    def filename(cls) -> str:
+        return "packages.json"
+
+    def ensure(self) -> None:
+        if not self.path.exists():
+            self.path.write_text("[]")
+        self.path.chmod(self.file_mode)
+
+    def __init__(
+        self,
+        data_dir: Path,
+        file_mode: int = 0o600,
+        durability: Optional[SyncPolicy] = None,
+    ) -> None:
+        super().__init__(data_dir, file_mode, durability)
+        self.open_index = OpenInstallIndex(self.path, file_mode)
+        self.cache = LOG_CACHE
+
+    def append_many(self, entries: Sequence[Mapping[str, Any]]) -> int:
+        """Append *entries* to the array and advance the removal state past them."""
+        if not entries:
+            return 0
+        with self.committing(entries) as fresh:
+            if not fresh:
+                return 0
+            records = [dict(entry) for entry in fresh]
+            if not self._intact():
+                self._repair()
+            indexed = self._state()
+            start = self.open_index.count
+
+            with self.path.open("r+b") as fp:
+                end, empty = _array_end(fp)
+                body = ",\n".join(_element(record) for record in records).encode("utf-8")
+                fp.seek(end)
+                fp.write((b"\n" if empty else b",\n") + body + b"\n]")
+                fp.truncate()
+            self.durability.committed(files=[self.path], events=len(records))
+
+            if indexed:
+                self.open_index.apply(records, start, file_stamp(self.path))
+        return len(records)
+
+    def load(self) -> List[Record]:
+        return list(self.iter_records())
+
+    def iter_records(self) -> Iterator[Record]:
+        """Stream the array from a memory map, presenting closed installs as removed.
+
+        Removal events that closed an install are folded into it and skipped.
+        """
+        return apply_closures(iter_json_array(self.path), self._closed())
+
+    def load_table(self) -> EventTable:
+        """Return the folded records as an ``EventTable``, parsed once per version of the file.
+
+        Every write changes the size and mtime of ``packages.json``, so the
+        cached table is reused until the next write and then rebuilt.
+        """
+        return self.cache.lookup(
+            str(self.path),
+            stat_key(self.path),
+            lambda: EventTable.from_records(self.iter_records()),
+        )
+
+    def iter_matching(
+        self, filters: QueryFilters, after: Optional[int] = None
+    ) -> Iterator[Tuple[int, Record]]:
+        if not self.cache.enabled:
+            # Stream the array without holding a table of it.
+            return super().iter_matching(filters, after)
+        table = self.load_table()
+        return table.stream(table.matching(filters, self._table_names(filters, table)), after)
+
+    def stream_matching(
+        self, filters: QueryFilters, after: Optional[int] = None
+    ) -> Iterator[Tuple[int, Record]]:
+        with self.reading():
+            if not self.cache.enabled:
+                # Resuming would parse the array from the start again for each chunk.
+                return iter(list(self.iter_matching(filters, after)))
+            # The table and its matching rows stay valid once the lock is released.
+            return self.iter_matching(filters, after)
+
+    def explain(self, filters: QueryFilters) -> List[str]:
+        if not self.cache.enabled:
+            return super().explain(filters)
+        table = self.load_table()
+        plan = table.plan(filters, self._table_names(filters, table))
+        return [f"table of {self.path.name}: {len(table)} record(s)", *plan.describe()]
+
+    def recover(self) -> int:
+        """Also cut off an append that was interrupted before it closed the array"""
+        dropped = super().recover()
+        if self.path.exists() and not self._intact():
+            with self.writing():
+                if not self._intact():
+                    dropped += self._repair()
+        return dropped
+
+    def _state(self) -> bool:
+        """Make the removal state current for the file, rebuilding it when stale
+
+        Returns:
+            False if the index cannot be rebuilt here; the write then leaves it
+            stale and readers derive the closures themselves
+        """
+        stamp = file_stamp(self.path)
+        if self.open_index.load(stamp):
+            return True
+        try:
+            self.open_index.rebuild(iter_json_array(self.path), stamp)
+        except sqlite3.Error as err:
+            logger.warning("Could not rebuild open-install index %s: %s", self.open_index.path, err)
+            return False
+        return True
+
+    def _closed(self) -> Closures:
+        """Return closed install position -> (removal position, date) for reading.
+
+        Without a current index the closures are derived in two passes over the
+        file (see ``scan_closures``). Writers rebuild and store the full index on
+        their next append.
+        """
+        try:
+            if self.open_index.load(file_stamp(self.path)):
+                return self.open_index.closed
+        except sqlite3.Error as err:
+            logger.debug("Open-install index %s unavailable: %s", self.open_index.path, err)
+        return scan_closures(lambda: iter_json_array(self.path))
+
+    def _intact(self) -> bool:
+        """Whether the file ends the way a completed write leaves it (cheap: reads the tail)"""
+        with self.path.open("rb") as fp:
+            size = fp.seek(0, os.SEEK_END)
+            fp.seek(max(0, size - _TAIL_BYTES))
+            tail = fp.read().rstrip()
+        # Nested arrays close indented; only the top-level bracket follows a bare newline.
+        return tail.endswith(b"\n]") or tail.lstrip() == b"[]"
+
+    def _repair(self) -> int:
+        """Truncate the array after its last complete element and close it again.
+
+        Returns:
+            Number of bytes dropped
+        """
+        data = self.path.read_bytes()
+        # Undecodable bytes map to one character each, so offsets convert back exactly.
+        text = data.decode("utf-8", "surrogateescape")
+        decoder = json.JSONDecoder()
+        pos = _skip_space(text, 0)
+        if not text.startswith("[", pos):
+            logger.error("%s is not a JSON array; leaving it for manual repair", self.path)
+            return 0
+        good = pos = pos + 1
+        closing = b"\n]"
+        first = True
+        while True:
+            pos = _skip_space(text, pos)
+            if text.startswith("]", pos):
+                if _skip_space(text, pos + 1) == len(text):
+                    # A complete array in another layout, e.g. edited by hand.
+                    return 0
+                good, closing = pos + 1, b""
+                break
+            if not first:
+                if not text.startswith(",", pos):
+                    break
+                pos = _skip_space(text, pos + 1)
+            try:
+                _, pos = decoder.raw_decode(text, pos)
+            except ValueError:
+                break
+            good = pos
+            first = False
+
+        keep = len(text[:good].encode("utf-8", "surrogateescape"))
+        with self.path.open("r+b") as fp:
+            fp.seek(keep)
+            fp.write(closing)
+            fp.truncate()
+            fp.flush()
+            os.fsync(fp.fileno())
+        dropped = len(data) - keep
+        logger.warning(
+            "Dropped %d byte(s) of an interrupted write from the end of %s", dropped, self.path
+        )
+        return dropped
+
+
+def _element(record: Mapping[str, Any]) -> str:
+    """Encode *record* the way ``json.dumps(array, indent=2)`` lays out an element"""
+    return textwrap.indent(json.dumps(record, indent=2), "  ")
+
+
+def _skip_space(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos] in " \t\r\n":
+        pos += 1
+    return pos
+
+
+def _array_end(fp: IO[bytes]) -> Tuple[int, bool]:
+    """Locate where to append in an array file.
+
+    Returns:
+        (offset just past the last element, or past ``[`` for an empty array,
+        whether the array is empty)
+
+    Raises:
+        _TornArray: If the file does not end with ``]``
+    """
+    size = fp.seek(0, os.SEEK_END)
+    chunk = _TAIL_BYTES
+    while True:
+        start = max(0, size - chunk)
+        fp.seek(start)
+        tail = fp.read().rstrip()
+        if not tail.endswith(b"]"):
+            raise _TornArray(f"{fp.name} does not end with ']'")
+        head = tail[:-1].rstrip()
+        if head or start == 0:
+            # An element never ends with '[', so one right before ']' opens the array.
+            return start + len(head), head.endswith(b"[")
+        chunk *= 2
@@ -0,0 +1,40 @@
+"""Format version manifest of a data directory"""
+
+from __future__ import annotations
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .base import atomic_write
+
+logger = logging.getLogger(__name__)
+
+FORMAT_FILE = "format.json"
+# Bumped whenever a change to an engine's files needs ``plogr migrate``.
+FORMAT_VERSION = 1
+
+
+def read_format(data_dir: Path) -> Optional[Dict[str, Any]]:
+    """Return the manifest of *data_dir*, or None if it has none yet
+
+    The manifest names the storage engine whose files hold the log
+    (``log_format``) and the ``version`` of the layout they were written with.
+    """
+    try:
+        raw = json.loads((data_dir / FORMAT_FILE).read_text())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as err:
+        logger.warning("Ignoring unreadable format manifest in %s: %s", data_dir, err)
+        return None
+    return raw if isinstance(raw, dict) else None
+
+
+def write_format(data_dir: Path, log_format: str, file_mode: int = 0o600, **extra: Any) -> None:
+    """Record that *data_dir* holds a *log_format* log in the current layout"""
+    path = data_dir / FORMAT_FILE
+    payload = {"version": FORMAT_VERSION, "log_format": log_format, **extra}
+    atomic_write(path, json.dumps(payload, indent=2) + "\n")
+    path.chmod(file_mode)
@@ -0,0 +1,88 @@
+"""Advisory file locking shared by the storage engines
+
+Locks are taken on a dedicated lock file that is never replaced. Locking the
+data file itself does not work for engines that publish a new version by
+renaming a temporary file over it: the next writer would lock the new inode
+while the previous one still holds the old, and both would proceed.
+"""
+
+from __future__ import annotations
+
+import os
+import pathlib
+from contextlib import contextmanager
+from typing import IO, Iterator, Optional
+
+if os.name == "posix":
+    import fcntl  # type: ignore
+
+    @contextmanager
+    def file_lock(
+        path: pathlib.Path, shared: bool = False, file_mode: Optional[int] = None
+    ) -> Iterator[None]:
+        """Context manager holding an advisory lock on *path*.
+
+        Writers take an exclusive lock, creating the file if needed, with
+        *file_mode* rather than whatever the umask leaves. Readers take a shared
+        lock, so they never wait for each other, only for a writer in progress;
+        they open the file read-only, which lets users who may read but not
+        write the log (system scope) lock it too. A reader that cannot open the
+        lock file proceeds without it.
+        """
+        lock_fp = _open_lock(path, shared, file_mode)
+        if lock_fp is None:
+            yield
+            return
+        with lock_fp:
+            try:
+                fcntl.flock(lock_fp, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                yield
+            finally:
+                fcntl.flock(lock_fp, fcntl.LOCK_UN)
+
+else:
+    try:  # pragma: no cover - exercised via patched os.name in tests
+        import msvcrt  # type: ignore
+
+        @contextmanager
+        def file_lock(
+            path: pathlib.Path, shared: bool = False, file_mode: Optional[int] = None
+        ) -> Iterator[None]:
+            # msvcrt has no shared mode; readers rely on writers replacing files atomically.
+            lock_fp = _open_lock(path, shared, file_mode)
+            if lock_fp is None or shared:
+                if lock_fp is not None:
+                    lock_fp.close()
+                yield
+                return
+            with lock_fp:
+                try:
+                    msvcrt.locking(lock_fp.fileno(), msvcrt.LK_LOCK, 1)  # type: ignore[attr-defined]
+                    yield
+                finally:
+                    lock_fp.seek(0)
+                    msvcrt.locking(lock_fp.fileno(), msvcrt.LK_UNLCK, 1)  # type: ignore[attr-defined]
+
+    except ImportError:
+        # Non-Windows environment with os.name patched to 'nt' (tests); use a no-op lock.
+        @contextmanager
+        def file_lock(
+            path: pathlib.Path, shared: bool = False, file_mode: Optional[int] = None
+        ) -> Iterator[None]:  # pragma: no cover
+            with path.open("a"):
+                yield
+
+
+def _open_lock(
+    path: pathlib.Path, shared: bool, file_mode: Optional[int] = None
+) -> Optional[IO[bytes]]:
+    if not shared:
+        created = not path.exists()
+        lock_fp = path.open("ab")
+        if created and file_mode is not None:
+            path.chmod(file_mode)
+        return lock_fp
+    try:
+        return path.open("rb")
+    except (FileNotFoundError, PermissionError):
+        return None
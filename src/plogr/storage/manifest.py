@@ -0,0 +1,90 @@
+"""Manifest of sealed journal segments"""
+
+from __future__ import annotations
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+from .base import OpenCounts, atomic_write
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+SegmentInfo = Dict[str, Any]
+
+
+def describe_segment(entries: Iterable[Mapping[str, Any]]) -> SegmentInfo:
+    """Return the ``min_date``/``max_date``/``count`` summary of a segment's events."""
+    min_date: Optional[str] = None
+    max_date: Optional[str] = None
+    count = 0
+    for entry in entries:
+        count += 1
+        date = entry.get("date")
+        if not isinstance(date, str):
+            continue
+        if min_date is None or date < min_date:
+            min_date = date
+        if max_date is None or date > max_date:
+            max_date = date
+    return {"min_date": min_date, "max_date": max_date, "count": count}
+
+
+class SegmentManifest:
+    """Per-segment date ranges plus open-install checkpoints for sealed segments.
+
+    ``manifest.json`` maps each sealed segment file name to the range of event
+    dates it holds, which lets date-filtered readers skip whole segments without
+    opening them, and to the number of records it folds into, which keeps the
+    positions of the records after them the same as in a full replay. Next to
+    it, ``<segment>.open.json`` records which installs were still open after
+    replaying the log up to and including that segment, so a reader starting
+    mid-log still attributes later removals correctly.
+    """
+
+    def __init__(self, segments_dir: Path, file_mode: int = 0o600) -> None:
+        self.segments_dir = segments_dir
+        self.file_mode = file_mode
+        self.path = segments_dir / "manifest.json"
+
+    def load(self) -> Dict[str, SegmentInfo]:
+        """Return the manifest entries, or an empty mapping if it is missing or unreadable"""
+        try:
+            raw = json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as err:
+            logger.warning("Ignoring unreadable segment manifest %s: %s", self.path, err)
+            return {}
+        if not isinstance(raw, dict) or raw.get("version") != MANIFEST_VERSION:
+            return {}
+        return raw.get("segments", {})
+
+    def save(self, segments: Mapping[str, SegmentInfo]) -> None:
+        payload = {"version": MANIFEST_VERSION, "segments": dict(segments)}
+        atomic_write(self.path, json.dumps(payload, indent=2, sort_keys=True))
+        self.path.chmod(self.file_mode)
+
+    def state_path(self, segment_name: str) -> Path:
+        return self.segments_dir / (segment_name.rsplit(".jsonl", 1)[0] + ".open.json")
+
+    def read_state(self, segment_name: str) -> Optional[OpenCounts]:
+        """Return the open installs checkpointed after *segment_name*, if recorded"""
+        try:
+            return json.loads(self.state_path(segment_name).read_text())
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as err:
+            logger.warning("Ignoring unreadable segment checkpoint for %s: %s", segment_name, err)
+            return None
+
+    def write_state(self, segment_name: str, counts: OpenCounts) -> None:
+        path = self.state_path(segment_name)
+        atomic_write(path, json.dumps(counts, separators=(",", ":")))
+        path.chmod(self.file_mode)
+
+    def drop_state(self, segment_name: str) -> None:
+        self.state_path(segment_name).unlink(missing_ok=True)
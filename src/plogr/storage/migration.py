@@ -0,0 +1,261 @@
+"""Streaming, resumable migration of the event log between storage engines"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from . import open_store
+from .base import EventStore, Record, atomic_write
+from .durability import fsync_dir
+from .layout import write_format
+from .stats import LogSummary
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = "migrate.checkpoint.json"
+DEFAULT_BATCH_SIZE = 1000
+
+
+class MigrationError(Exception):
+    """Migration could not start, or its result did not match the source"""
+
+
+@dataclass
+class MigrationReport:
+    """Progress and throughput of a migration run"""
+
+    source: str
+    target: str
+    records: int = 0
+    events: int = 0
+    resumed_events: int = 0
+    seconds: float = 0.0
+
+    @property
+    def events_per_second(self) -> float:
+        written = self.events - self.resumed_events
+        return written / self.seconds if self.seconds > 0 else 0.0
+
+
+def unfold(records: Iterable[Mapping[str, Any]]) -> Iterator[Record]:
+    """Turn folded records back into the raw events that produce them.
+
+    A closed install yields its install event and, at its ``date_removed``, the
+    removal that closed it. Removals are held back and emitted in time order
+    among the following records, so append-only engines receive a mostly
+    chronological stream, but a removal always comes out before any later
+    record of the same package; replaying the events with ``fold_events``
+    therefore closes exactly the installs that were closed in *records*.
+    Memory grows with the removals pending at any one time, not with the log.
+    """
+    # (date_removed, sequence, removal event)
+    pending: List[Tuple[str, int, Record]] = []
+    # (name, manager) -> removals of that package still in ``pending``
+    pending_keys: Dict[Tuple[Any, Any], int] = {}
+    sequence = 0
+
+    def due(upto: Optional[str], key: Optional[Tuple[Any, Any]]) -> Iterator[Record]:
+        """Emit removals dated up to *upto*, and every one queued before *key*'s."""
+        while pending:
+            date, _, removal = pending[0]
+            if upto is not None and date > upto and not (key and pending_keys.get(key)):
+                return
+            # Emitting another package's removal early is harmless: its install
+            # is already out, and any later install of it would have flushed it.
+            heapq.heappop(pending)
+            pending_keys[(removal.get("name"), removal.get("manager"))] -= 1
+            yield removal
+
+    for rec in records:
+        key = (rec.get("name"), rec.get("manager"))
+        date = rec.get("date")
+        yield from due(date if isinstance(date, str) else None, key)
+
+        date_removed = rec.get("date_removed")
+        if rec.get("removed") and date_removed:
+            install = {k: v for k, v in rec.items() if k != "date_removed"}
+            install["removed"] = False
+            install["action"] = "install"
+            yield install
+            removal = {
+                "name": rec.get("name"),
+                "manager": rec.get("manager"),
+                "action": "remove",
+                "scope": rec.get("scope"),
+                "date": date_removed,
+                "removed": True,
+            }
+            heapq.heappush(pending, (str(date_removed), sequence, removal))
+            pending_keys[key] = pending_keys.get(key, 0) + 1
+            sequence += 1
+        else:
+            yield dict(rec)
+    yield from due(None, None)
+
+
+class Migration:
+    """Copy a log into another storage engine without loading it into memory.
+
+    Events are written in batches to a staging directory inside the data
+    directory. After every batch ``migrate.checkpoint.json`` records how many
+    events the target holds and the target's generation, so an interrupted run
+    picks up after the last completed batch; if the source changed in the
+    meantime, or the target does not match the checkpoint, the migration starts
+    over. Once every record is copied, the target's statistics are recomputed
+    from its own files and compared with the source's before the staged files
+    are moved into the data directory.
+    """
+
+    def __init__(
+        self,
+        source: EventStore,
+        target_format: str,
+        settings: Optional[Mapping[str, Any]] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        progress: Optional[Callable[[MigrationReport], None]] = None,
+    ) -> None:
+        self.source = source
+        self.target_format = target_format
+        # Batched syncs; the checkpoint's generation check catches anything a crash loses.
+        self.settings = {**(settings or {}), "durability": "batch"}
+        self.batch_size = max(1, batch_size)
+        self.progress = progress
+        self.data_dir = source.data_dir
+        self.staging_dir = self.data_dir / f".migrate-{target_format}"
+        self.checkpoint_path = self.data_dir / CHECKPOINT_FILE
+
+    def run(self) -> MigrationReport:
+        """Migrate, resuming from the checkpoint when possible, and publish the result.
+
+        Raises:
+            MigrationError: If the target already holds data, the source changed
+                during the run, or the migrated log does not match the source
+        """
+        target = self._open_target()
+        final = open_store(self.target_format, self.data_dir, self.source.file_mode, self.settings)
+        if final.name == self.source.name:
+            raise MigrationError(f"The log is already stored as {final.name!r}")
+        # The logger may already have created empty files for the new engine.
+        if final.path.exists() and next(iter(final.iter_records()), None) is not None:
+            raise MigrationError(f"{final.path} already holds events; move it away first")
+
+        report = MigrationReport(self.source.name, target.name)
+        source_generation = self.source.generation()
+        skip = self._resume_point(target, source_generation)
+        if skip == 0:
+            target = self._reset_target()
+        report.resumed_events = skip
+
+        started = time.monotonic()
+        summary = LogSummary()
+        batch: List[Record] = []
+        for event in unfold(self._source_records(summary, report)):
+            report.events += 1
+            if report.events <= skip:
+                continue
+            batch.append(event)
+            if len(batch) >= self.batch_size:
+                self._write_batch(target, batch, report, source_generation)
+                report.seconds = time.monotonic() - started
+                if self.progress is not None:
+                    self.progress(report)
+        if batch:
+            self._write_batch(target, batch, report, source_generation)
+        target.sync()
+
+        if self.source.generation() != source_generation:
+            self.checkpoint_path.unlink(missing_ok=True)
+            raise MigrationError("The log changed during the migration; run it again")
+        expected = summary.statistics()
+        migrated = target.summary(recompute=True).statistics()
+        if migrated != expected:
+            raise MigrationError(
+                f"Migrated log does not match the source: {migrated} != {expected}"
+            )
+
+        self._publish(target)
+        report.seconds = time.monotonic() - started
+        return report
+
+    def _open_target(self) -> EventStore:
+        return open_store(
+            self.target_format, self.staging_dir, self.source.file_mode, self.settings
+        )
+
+    def _reset_target(self) -> EventStore:
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+        self.staging_dir.mkdir(mode=0o700)
+        target = self._open_target()
+        target.ensure()
+        return target
+
+    def _resume_point(self, target: EventStore, source_generation: str) -> int:
+        """Return how many events the staged target already holds, or 0 to start over."""
+        try:
+            checkpoint = json.loads(self.checkpoint_path.read_text())
+        except (OSError, ValueError):
+            return 0
+        if (
+            not self.staging_dir.is_dir()
+            or checkpoint.get("target") != self.target_format
+            or checkpoint.get("source_generation") != source_generation
+            or checkpoint.get("target_generation") != target.generation()
+        ):
+            logger.info("Migration checkpoint does not match; starting over")
+            return 0
+        return int(checkpoint.get("events", 0))
+
+    def _source_records(self, summary: LogSummary, report: MigrationReport) -> Iterator[Record]:
+        for rec in self.source.iter_records():
+            summary.add_record(rec)
+            report.records += 1
+            yield rec
+
+    def _write_batch(
+        self,
+        target: EventStore,
+        batch: List[Record],
+        report: MigrationReport,
+        source_generation: str,
+    ) -> None:
+        target.append_many(batch)
+        batch.clear()
+        checkpoint = {
+            "target": self.target_format,
+            "source_generation": source_generation,
+            "target_generation": target.generation(),
+            "events": report.events,
+        }
+        atomic_write(self.checkpoint_path, json.dumps(checkpoint))
+
+    def _publish(self, target: EventStore) -> None:
+        """Move the staged files into the data directory and record the new format."""
+        # Writers may hold the data directory's lock file, which must keep its inode.
+        names = sorted(set(os.listdir(self.staging_dir)) - {target.lock_file.name})
+        for name in names:
+            existing = self.data_dir / name
+            if existing.is_dir() and any(existing.iterdir()):
+                raise MigrationError(f"{existing} already exists; move it away first")
+        for name in names:
+            # SQLite would replay a leftover WAL of the empty database onto the new one.
+            for suffix in ("-wal", "-shm"):
+                if name + suffix not in names:
+                    (self.data_dir / (name + suffix)).unlink(missing_ok=True)
+            os.replace(self.staging_dir / name, self.data_dir / name)
+        shutil.rmtree(self.staging_dir)
+        fsync_dir(self.data_dir)
+        write_format(
+            self.data_dir,
+            self.target_format,
+            self.source.file_mode,
+            migrated_from=self.source.name,
+        )
+        self.checkpoint_path.unlink(missing_ok=True)
+        logger.info("Migrated %s log to %s", self.source.name, self.target_format)
@@ -0,0 +1,119 @@
+"""Persistent trigram index over package names for substring queries"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+from typing import Any, Callable, Iterable, Iterator, List, Mapping, Set
+
+from .sidecar import Sidecar
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS names (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS grams (
+    gram TEXT NOT NULL,
+    name_id INTEGER NOT NULL,
+    PRIMARY KEY (gram, name_id)
+) WITHOUT ROWID;
+"""
+
+
+def trigrams(text: str) -> Set[str]:
+    """Return the three-character substrings of lowercased *text*"""
+    text = text.lower()
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class NameIndex(Sidecar):
+    """Distinct package names and a trigram posting list for each of them.
+
+    Stored in ``<data file>.names``, a SQLite database tagged with the store
+    generation it describes. A substring query looks up the posting list of
+    each trigram of the lowercased needle, intersects them starting with the
+    shortest, and checks only the names left; needles shorter than three
+    characters check the distinct names, which are far fewer than events.
+
+    Writers add the names of each commit under the store's write lock; an
+    index whose generation does not match the store is rebuilt from the log
+    by the next query.
+    """
+
+    suffix = ".names"
+    version = "1"
+    schema = _SCHEMA
+    label = "name index"
+
+    def update(self, entries: Iterable[Mapping[str, Any]], before: str, after: str) -> None:
+        """Add the names of *entries*, written since *before*, and tag the index *after*
+
+        An index that did not describe *before* is left stale.
+        """
+        names = {str(e.get("name")) for e in entries if e.get("name")}
+        self.advance(before, after, lambda conn: _add(conn, names))
+
+    def matching(
+        self, needle: str, generation: str, names: Callable[[], Iterable[Any]]
+    ) -> Set[str]:
+        """Return the stored names containing *needle*, ignoring case
+
+        Args:
+            needle: Substring to look for
+            generation: Current store generation
+            names: Produces every name in the log, for rebuilding a stale index
+
+        Raises:
+            OSError, sqlite3.Error: If a stale index cannot be rebuilt
+        """
+        return self.recovering(lambda: self._matching(needle, generation, names))
+
+    def _matching(
+        self, needle: str, generation: str, names: Callable[[], Iterable[Any]]
+    ) -> Set[str]:
+        with self.connect() as conn:
+            if self.generation(conn) != generation:
+                logger.debug("Name index %s is stale; rebuilding", self.path)
+                with conn:
+                    conn.execute("DELETE FROM grams")
+                    conn.execute("DELETE FROM names")
+                    _add(conn, {str(name) for name in names() if name})
+                    self.tag(conn, generation=generation)
+            lowered = needle.lower()
+            return {name for name in self._candidates(conn, lowered) if lowered in name.lower()}
+
+    def _candidates(self, conn: sqlite3.Connection, needle: str) -> Iterator[str]:
+        grams = trigrams(needle)
+        if not grams:
+            return (row[0] for row in conn.execute("SELECT name FROM names"))
+        postings: List[Set[int]] = []
+        for gram in grams:
+            ids = {
+                row[0] for row in conn.execute("SELECT name_id FROM grams WHERE gram = ?", (gram,))
+            }
+            if not ids:
+                return iter(())
+            postings.append(ids)
+        postings.sort(key=len)
+        candidates = postings[0]
+        for ids in postings[1:]:
+            candidates &= ids
+            if not candidates:
+                return iter(())
+        rows = conn.execute(
+            "SELECT name FROM names WHERE id IN (SELECT value FROM json_each(?))",
+            (f"[{','.join(map(str, candidates))}]",),
+        )
+        return (row[0] for row in rows)
+
+
+def _add(conn: sqlite3.Connection, names: Set[str]) -> None:
+    """Insert the names not stored yet, with their trigrams"""
+    for name in names:
+        cursor = conn.execute("INSERT OR IGNORE INTO names (name) VALUES (?)", (name,))
+        if cursor.rowcount:
+            name_id = cursor.lastrowid
+            conn.executemany(
+                "INSERT OR IGNORE INTO grams VALUES (?, ?)",
+                ((gram, name_id) for gram in trigrams(name)),
+            )
@@ -0,0 +1,199 @@
+"""Query filters compiled into a single fused test, cheapest checks first"""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Set
+
+from .timeindex import Bounds, epoch_key, in_bounds, time_bounds
+
+# Relative cost of one check, lowest first: comparing a field or column,
+# looking a value up in a set, reading a metadata pair, searching a name for a
+# substring, and parsing a timestamp.
+EQUALS = 1
+MEMBER = 2
+METADATA = 3
+SUBSTRING = 4
+TIMESTAMP = 5
+
+
+@dataclass(frozen=True)
+class QueryFilters:
+    """The ``query`` filters; a record matches when it passes every one given"""
+
+    name: Optional[str] = None
+    manager: Optional[str] = None
+    since: Optional[dt.date] = None
+    until: Optional[dt.date] = None
+    action: Optional[str] = None
+    removed: Optional[bool] = None
+    metadata: Mapping[str, Any] = field(default_factory=dict)
+
+    @property
+    def bounds(self) -> Optional[Bounds]:
+        """The epoch-key range of *since*/*until*, or None when neither is given"""
+        if self.since is None and self.until is None:
+            return None
+        return time_bounds(self.since, self.until)
+
+    def describe_range(self) -> str:
+        since = self.since.isoformat() if self.since else "the first event"
+        until = self.until.isoformat() if self.until else "the last event"
+        return f"{since} to {until}"
+
+
+class Check(NamedTuple):
+    cost: int
+    label: str
+    expression: str
+
+
+class Plan:
+    """Lookups answered from an index, then one fused test of what is left.
+
+    Each filter adds a ``Check``: an expression over the argument *arg* (a
+    record, or a row number of an ``EventTable``) with a cost rank. ``test``
+    joins the expressions with ``and``, cheapest first, and compiles them into
+    one function, so every candidate is tested in a single pass that stops at
+    its first failing check. Values reach the expressions as names bound in
+    the function's namespace, never as source text.
+    """
+
+    def __init__(self, arg: str = "r") -> None:
+        self.arg = arg
+        self.steps: List[str] = []
+        self.checks: List[Check] = []
+        self.namespace: Dict[str, Any] = {}
+        # Why no candidate can match, when a lookup already proved it.
+        self.empty: Optional[str] = None
+        self._test: Optional[Callable[[Any], bool]] = None
+
+    def step(self, text: str) -> None:
+        """Note a lookup done before the scan, for ``describe``"""
+        self.steps.append(text)
+
+    def add(self, cost: int, label: str, expression: str, **bound: Any) -> None:
+        """Add a check; *bound* names the values *expression* refers to"""
+        self.checks.append(Check(cost, label, expression))
+        self.namespace.update(bound)
+        self._test = None
+
+    def nothing(self, reason: str) -> None:
+        """Record that no candidate can match, so the scan is skipped"""
+        if self.empty is None:
+            self.empty = reason
+
+    def ordered(self) -> List[Check]:
+        # A stable sort keeps checks of equal cost in the order they were added.
+        return sorted(self.checks, key=lambda check: check.cost)
+
+    @property
+    def test(self) -> Callable[[Any], bool]:
+        """The compiled test; passes everything when there are no checks"""
+        if self._test is None:
+            body = " and ".join(f"({check.expression})" for check in self.ordered())
+            source = f"lambda {self.arg}: {body or 'True'}"
+            self._test = eval(source, {"__builtins__": {}, **self.namespace})
+        return self._test
+
+    def describe(self) -> List[str]:
+        """Return the plan as lines of text, for ``plogr query --explain``"""
+        lines = list(self.steps)
+        if self.empty is not None:
+            lines.append(f"no scan: {self.empty}")
+        elif self.checks:
+            lines.append("scan: " + ", then ".join(check.label for check in self.ordered()))
+        else:
+            lines.append("scan: every candidate matches")
+        return lines
+
+
+def record_plan(filters: QueryFilters, names: Optional[Set[str]] = None) -> Plan:
+    """Compile *filters* into a test of folded record dicts
+
+    Args:
+        names: The names ``filters.name`` matches, if known (see ``NameIndex``);
+            records are then checked against the set instead of by substring
+    """
+    plan = Plan("r")
+    if filters.name:
+        if names is not None:
+            if not names:
+                plan.nothing(f"no logged name contains {filters.name!r}")
+            plan.add(
+                MEMBER,
+                f"name is one of {len(names)} indexed name(s)",
+                "r.get('name') in names",
+                names=frozenset(names),
+            )
+        else:
+            plan.add(
+                SUBSTRING,
+                f"name contains {filters.name!r}",
+                "needle in (r.get('name') or '').lower()",
+                needle=filters.name.lower(),
+            )
+    if filters.manager:
+        plan.add(
+            EQUALS,
+            f"manager is {filters.manager!r}",
+            "r.get('manager') == manager",
+            manager=filters.manager,
+        )
+    if filters.action:
+        plan.add(
+            EQUALS,
+            f"action is {filters.action!r}",
+            "r.get('action') == action",
+            action=filters.action,
+        )
+    if filters.removed is not None:
+        if filters.removed:
+            plan.add(EQUALS, "removed", "r.get('removed')")
+        else:
+            plan.add(EQUALS, "installed", "not r.get('removed')")
+    for n, (key, wanted) in enumerate(filters.metadata.items()):
+        plan.add(
+            METADATA,
+            f"metadata.{key} is {wanted!r}",
+            f"meta_matches(r.get('metadata'), meta_key{n}, meta_values{n})",
+            meta_matches=meta_matches,
+            **{f"meta_key{n}": key, f"meta_values{n}": meta_encodings(wanted)},
+        )
+    bounds = filters.bounds
+    if bounds is not None:
+        plan.add(
+            TIMESTAMP,
+            f"date from {filters.describe_range()}",
+            "in_bounds(epoch_key(r.get('date')), bounds)",
+            in_bounds=in_bounds,
+            epoch_key=epoch_key,
+            bounds=bounds,
+        )
+    return plan
+
+
+def meta_encodings(wanted: Any) -> Set[str]:
+    """Return the JSON encodings of the metadata values equal to *wanted*
+
+    A text *wanted*, as given on the command line, also stands for the number,
+    boolean or nested value it spells in JSON (``--meta size=42``).
+    """
+    encodings = {json.dumps(wanted, sort_keys=True)}
+    if isinstance(wanted, str):
+        try:
+            parsed = json.loads(wanted)
+        except ValueError:
+            return encodings
+        if not isinstance(parsed, str):
+            encodings.add(json.dumps(parsed, sort_keys=True))
+    return encodings
+
+
+def meta_matches(metadata: Any, key: str, encodings: Set[str]) -> bool:
+    """Tell whether *metadata* holds a value under *key* with one of the *encodings*"""
+    if not isinstance(metadata, Mapping) or key not in metadata:
+        return False
+    return json.dumps(metadata[key], sort_keys=True) in encodings
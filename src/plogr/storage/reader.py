@@ -0,0 +1,138 @@
+"""Memory-mapped, streaming readers for the on-disk log formats"""
+
+from __future__ import annotations
+
+import codecs
+import json
+import logging
+import mmap
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from .checksum import verified_body
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = " \t\n\r"
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+@contextmanager
+def mapped(path: Path) -> Iterator[Optional[mmap.mmap]]:
+    """Map *path* read-only; yields None for an empty file, which cannot be mapped."""
+    with path.open("rb") as fp:
+        try:
+            mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield None
+            return
+        with mm:
+            yield mm
+
+
+def iter_lines(path: Path) -> Iterator[bytes]:
+    """Yield the lines of *path* from a memory map, without reading it into memory."""
+    with mapped(path) as mm:
+        if mm is not None:
+            yield from iter(mm.readline, b"")
+
+
+def decode_lines(lines: Iterable[bytes], path: Path) -> Iterator[Dict[str, Any]]:
+    """Decode JSON Lines, skipping blank lines and warning about corrupt ones.
+
+    Lines carrying a checksum are only decoded if it matches.
+    """
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(verified_body(line))
+        except ValueError:
+            logger.warning("Skipping corrupt journal line %d in %s", lineno, path)
+
+
+def iter_json_array(path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Any]:
+    """Yield the elements of the top-level JSON array in *path* one at a time.
+
+    The file is memory-mapped and decoded in ``chunk_size`` windows, and each
+    element is parsed with ``JSONDecoder.raw_decode`` as soon as it is complete,
+    so only the current window and element are held in memory rather than the
+    whole text plus the whole object graph.
+
+    Raises:
+        json.JSONDecodeError: If the file is not a well-formed JSON array
+    """
+    decoder = json.JSONDecoder()
+    with mapped(path) as mm:
+        if mm is None:
+            raise json.JSONDecodeError("Expecting value", "", 0)
+        window = _TextWindow(mm, chunk_size)
+        if window.peek() != "[":
+            raise json.JSONDecodeError("Expecting '['", window.buf, window.pos)
+        window.pos += 1
+
+        first = True
+        while True:
+            char = window.peek()
+            if char == "]":
+                return
+            if char is None:
+                raise json.JSONDecodeError("Unterminated array", window.buf, window.pos)
+            if not first:
+                if char != ",":
+                    raise json.JSONDecodeError("Expecting ',' delimiter", window.buf, window.pos)
+                window.pos += 1
+                window.peek()
+            yield window.decode(decoder)
+            first = False
+
+
+class _TextWindow:
+    """Sliding window of decoded text over a memory-mapped UTF-8 file"""
+
+    def __init__(self, mm: mmap.mmap, chunk_size: int) -> None:
+        self.mm = mm
+        self.chunk_size = chunk_size
+        self.offset = 0
+        self.buf = ""
+        self.pos = 0
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+
+    def fill(self) -> bool:
+        """Drop consumed text and decode the next chunk; False at end of file."""
+        if self.offset >= len(self.mm):
+            return False
+        chunk = self.mm[self.offset : self.offset + self.chunk_size]
+        self.offset += len(chunk)
+        self.buf = self.buf[self.pos :] + self._utf8.decode(chunk, self.offset >= len(self.mm))
+        self.pos = 0
+        return True
+
+    def peek(self) -> Optional[str]:
+        """Skip whitespace and return the next character, or None at end of file."""
+        while True:
+            buf, pos = self.buf, self.pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self.fill():
+                return None
+
+    def decode(self, decoder: json.JSONDecoder) -> Any:
+        """Decode the value starting at the current position, reading on as needed."""
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # A number or literal ending the window may continue in the next chunk.
+            if end == len(self.buf) and self.fill():
+                continue
+            self.pos = end
+            return value
@@ -0,0 +1,144 @@
+"""Startup recovery of torn writes at the end of append-only logs"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from .base import atomic_write
+from .checksum import verified_body
+from .reader import mapped
+
+logger = logging.getLogger(__name__)
+
+VERIFIED_SUFFIX = ".verified"
+_FINGERPRINT_BYTES = 64
+
+
+class VerifiedTail:
+    """Check an append-only JSON Lines file once per byte, across restarts.
+
+    ``<file>.verified`` remembers which file (device and inode) was checked, up
+    to which offset, and the bytes just before that offset. ``recover`` only
+    reads what was appended since; a file that was replaced, truncated or
+    rewritten in place is checked again from the start.
+    """
+
+    def __init__(self, path: Path, file_mode: int = 0o600) -> None:
+        self.path = path
+        self.file_mode = file_mode
+        self.marker = path.with_name(path.name + VERIFIED_SUFFIX)
+
+    def pending(self) -> bool:
+        """Whether the file has bytes that were not checked yet (cheap: one stat)"""
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return False
+        checked = self._load()
+        return not (
+            checked is not None
+            and checked.get("file") == [st.st_dev, st.st_ino]
+            and checked.get("offset") == st.st_size
+        )
+
+    def recover(self) -> Tuple[int, int]:
+        """Check the unverified tail and truncate a torn end; hold the writer lock.
+
+        Complete lines that fail to decode or whose checksum does not match are
+        left in place, since readers skip them, and only reported. Anything
+        invalid after the last good line is what an interrupted append leaves
+        behind and is cut off.
+
+        Returns:
+            (bytes dropped from the end, corrupt lines left in place)
+        """
+        if not self.path.exists():
+            return 0, 0
+        size = good_end = corrupt = 0
+        fingerprint = b""
+        with mapped(self.path) as mm:
+            if mm is not None:
+                size = len(mm)
+                good_end, corrupt = _scan(mm, self._resume_offset(mm))
+                fingerprint = mm[max(0, good_end - _FINGERPRINT_BYTES) : good_end]
+
+        dropped = size - good_end
+        if dropped:
+            with self.path.open("r+b") as fp:
+                fp.truncate(good_end)
+                fp.flush()
+                os.fsync(fp.fileno())
+            logger.warning(
+                "Dropped %d byte(s) of an interrupted write from the end of %s",
+                dropped,
+                self.path,
+            )
+        if corrupt:
+            logger.warning("%s has %d corrupt line(s); readers skip them", self.path, corrupt)
+
+        st = self.path.stat()
+        checked = {
+            "file": [st.st_dev, st.st_ino],
+            "offset": good_end,
+            "fingerprint": fingerprint.hex(),
+        }
+        try:
+            atomic_write(self.marker, json.dumps(checked))
+            self.marker.chmod(self.file_mode)
+        except OSError as err:
+            logger.debug("Could not record verified offset of %s: %s", self.path, err)
+        return dropped, corrupt
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        try:
+            raw = json.loads(self.marker.read_text())
+        except (OSError, ValueError):
+            return None
+        return raw if isinstance(raw, dict) else None
+
+    def _resume_offset(self, mm: Any) -> int:
+        """Return the checked offset if it still describes this file, else 0"""
+        checked = self._load()
+        st = self.path.stat()
+        if checked is None or checked.get("file") != [st.st_dev, st.st_ino]:
+            return 0
+        try:
+            offset = int(checked["offset"])
+            fingerprint = bytes.fromhex(checked["fingerprint"])
+        except (KeyError, TypeError, ValueError):
+            return 0
+        if offset > len(mm) or mm[offset - len(fingerprint) : offset] != fingerprint:
+            return 0
+        return offset
+
+
+def _scan(mm: Any, start: int) -> Tuple[int, int]:
+    """Return where the last good line from *start* ends and how many bad lines precede it"""
+    good_end, corrupt, bad = start, 0, 0
+    pos, size = start, len(mm)
+    while pos < size:
+        newline = mm.find(b"\n", pos)
+        end = newline + 1 if newline >= 0 else size
+        if _valid(mm[pos:end]):
+            # Bad lines followed by good ones were not the last write.
+            corrupt += bad
+            bad = 0
+            good_end = end
+        else:
+            bad += 1
+        pos = end
+    return good_end, corrupt
+
+
+def _valid(line: bytes) -> bool:
+    if not line.strip():
+        return True
+    try:
+        json.loads(verified_body(line))
+    except ValueError:
+        return False
+    return True
@@ -0,0 +1,241 @@
+"""Event counts per time bucket, manager, action and repo for ``plogr stats``"""
+
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import sqlite3
+from itertools import repeat
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .sidecar import OpenInstalls, Sidecar, repo_of
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = ("day", "week", "month")
+GROUPS = ("manager", "action", "repo")
+
+# (day, manager, action, repo); repo is "" when the metadata names none.
+Key = Tuple[str, str, str, str]
+Counts = Dict[Key, int]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counts (
+    day TEXT NOT NULL,
+    manager TEXT NOT NULL,
+    action TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    events INTEGER NOT NULL,
+    PRIMARY KEY (day, manager, action, repo)
+) WITHOUT ROWID;
+"""
+
+
+def tally(
+    entries: Iterable[Mapping[str, Any]],
+    closed: Optional[Sequence[Optional[str]]] = None,
+    open_installs: Optional[OpenInstalls] = None,
+) -> Counts:
+    """Count *entries* per day, manager, action and repo
+
+    A record closed by a removal counts as an install on its date and a
+    removal on its ``date_removed``. A removal event that closes an install
+    counts under the repo of that install, which is where the package came
+    from, so counting raw events as they are written gives the same numbers
+    as counting the folded records later. Events without a readable
+    timestamp fall in no bucket and are left out.
+
+    Args:
+        closed: For raw events, the repo of the install each one closes, or
+            None (see ``sidecar.closed_repos``); folded records close nothing
+        open_installs: Collect the installs the folded *entries* leave open here
+    """
+    counts: Counts = {}
+
+    def count(date: Any, manager: str, action: Any, repo: str) -> None:
+        day = _day(date)
+        if day is not None:
+            key = (day, manager, str(action), repo)
+            counts[key] = counts.get(key, 0) + 1
+
+    for entry, opened in zip(entries, repeat(None) if closed is None else closed):
+        manager = str(entry.get("manager"))
+        repo = repo_of(entry) if opened is None else opened
+        date_removed = entry.get("date_removed")
+        if date_removed:
+            count(entry.get("date"), manager, "install", repo)
+            count(date_removed, manager, "remove", repo)
+            continue
+        count(entry.get("date"), manager, entry.get("action"), repo)
+        if open_installs is not None and not entry.get("removed"):
+            open_installs.push(manager, str(entry.get("name")), repo)
+    return counts
+
+
+def bucket(day: str, by: str) -> str:
+    """Return the bucket of an ISO *day*: the day itself, its ISO week or its month"""
+    if by == "month":
+        return day[:7]
+    if by == "week":
+        year, week, _ = dt.date.fromisoformat(day).isocalendar()
+        return f"{year}-W{week:02d}"
+    return day
+
+
+def summarize(
+    counts: Iterable[Tuple[Key, int]],
+    by: str = "month",
+    group_by: Sequence[str] = ("manager", "action"),
+) -> List[Dict[str, Any]]:
+    """Add daily *counts* up into rows per bucket and *group_by* values
+
+    Returns:
+        Rows like ``{"bucket": "2025-01", "manager": "dnf", "action": "install",
+        "events": 12}`` sorted by bucket, then group; a missing repo is None
+    """
+    columns = [GROUPS.index(group) + 1 for group in group_by]
+    totals: Dict[Tuple[str, ...], int] = {}
+    for key, events in counts:
+        row = (bucket(key[0], by), *(key[column] for column in columns))
+        totals[row] = totals.get(row, 0) + events
+    rows = []
+    for row, events in sorted(totals.items()):
+        values: Dict[str, Any] = dict(zip(group_by, row[1:]))
+        if "repo" in values:
+            values["repo"] = values["repo"] or None
+        rows.append({"bucket": row[0], **values, "events": events})
+    return rows
+
+
+def in_range(
+    counts: Iterable[Tuple[Key, int]],
+    since: Optional[dt.date] = None,
+    until: Optional[dt.date] = None,
+    manager: Optional[str] = None,
+) -> Iterator[Tuple[Key, int]]:
+    """Keep the daily *counts* between the days of *since* and *until*, inclusive"""
+    low = _as_date(since).isoformat() if since else None
+    high = _as_date(until).isoformat() if until else None
+    for key, events in counts:
+        if low and key[0] < low or high and key[0] > high:
+            continue
+        if manager and key[1] != manager:
+            continue
+        yield key, events
+
+
+class Rollups(Sidecar):
+    """Daily event counts per manager, action and repo, summed into buckets on read.
+
+    Stored in ``<data file>.rollups``, a SQLite sidecar like the ``NameIndex``.
+    Writers add the counts of each commit under the store's write lock, so
+    ``plogr stats`` reads a few rows per day instead of the events. Weeks and
+    months are summed from the day rows when asked for. A removal counts
+    under the repo of the install it closes, as the store's
+    ``OpenInstallFile`` reports it.
+
+    The first ``plogr stats`` builds the file from the log, as does any query
+    that finds it stale.
+    """
+
+    suffix = ".rollups"
+    version = "1"
+    schema = _SCHEMA
+    label = "rollups"
+
+    def update(
+        self,
+        entries: Iterable[Mapping[str, Any]],
+        closed: Sequence[Optional[str]],
+        before: str,
+        after: str,
+    ) -> None:
+        """Count *entries*, written since *before*, and tag the rollups *after*
+
+        Rollups that did not describe *before* are left stale.
+
+        Args:
+            closed: What each entry closes, see ``tally``
+        """
+        counts = tally(entries, closed)
+        self.advance(before, after, lambda conn: _add(conn, counts))
+
+    def counts(
+        self,
+        generation: str,
+        records: Callable[[], Iterable[Mapping[str, Any]]],
+        since: Optional[dt.date] = None,
+        until: Optional[dt.date] = None,
+        manager: Optional[str] = None,
+        rebuild: bool = False,
+        open_installs: Optional[OpenInstalls] = None,
+    ) -> List[Tuple[Key, int]]:
+        """Return the daily counts in range, rebuilding stale rollups first
+
+        Args:
+            generation: Current store generation
+            records: Produces the folded records of the log, for rebuilding
+            rebuild: Rebuild even if the rollups are current
+            open_installs: Collect the open installs here when rebuilding
+
+        Raises:
+            OSError, sqlite3.Error: If stale rollups cannot be rebuilt
+        """
+        return self.recovering(
+            lambda: self._counts(generation, records, since, until, manager, rebuild, open_installs)
+        )
+
+    def _counts(
+        self,
+        generation: str,
+        records: Callable[[], Iterable[Mapping[str, Any]]],
+        since: Optional[dt.date],
+        until: Optional[dt.date],
+        manager: Optional[str],
+        rebuild: bool,
+        open_installs: Optional[OpenInstalls],
+    ) -> List[Tuple[Key, int]]:
+        with self.connect() as conn:
+            if rebuild or self.generation(conn) != generation:
+                logger.debug("Rollups %s are stale; rebuilding", self.path)
+                counts = tally(records(), open_installs=open_installs)
+                with conn:
+                    conn.execute("DELETE FROM counts")
+                    _add(conn, counts)
+                    self.tag(conn, generation=generation)
+            clauses, params = [], []
+            if since:
+                clauses.append("day >= ?")
+                params.append(_as_date(since).isoformat())
+            if until:
+                clauses.append("day <= ?")
+                params.append(_as_date(until).isoformat())
+            if manager:
+                clauses.append("manager = ?")
+                params.append(manager)
+            where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+            rows = conn.execute(
+                f"SELECT day, manager, action, repo, events FROM counts{where}", params
+            )
+            return [((row[0], row[1], row[2], row[3]), row[4]) for row in rows]
+
+
+def _add(conn: sqlite3.Connection, counts: Counts) -> None:
+    conn.executemany(
+        "INSERT INTO counts VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (day, manager, action, repo) DO UPDATE SET events = events + excluded.events",
+        ((*key, events) for key, events in counts.items()),
+    )
+
+
+def _day(value: Any) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    try:
+        return dt.datetime.fromisoformat(value).date().isoformat()
+    except ValueError:
+        return None
+
+
+def _as_date(value: dt.date) -> dt.date:
+    return value.date() if isinstance(value, dt.datetime) else value
@@ -0,0 +1,284 @@
+"""SQLite sidecar files kept next to a store's data file"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Protocol,
+    Tuple,
+    TypeVar,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# The installs of each (manager, name) no removal has closed yet, newest last,
+# with a value the owner picks: a position in the data file, a repo.
+OPEN_INSTALLS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS open_installs (
+    seq INTEGER PRIMARY KEY,
+    manager TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value
+);
+CREATE INDEX IF NOT EXISTS idx_open_installs ON open_installs (manager, name, seq);
+"""
+
+_META = "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+
+
+class OpenInstalls(Protocol):
+    """Installs no removal has closed yet; a removal closes the newest of its package"""
+
+    def push(self, manager: str, name: str, value: Any) -> None: ...
+
+    def pop(self, manager: str, name: str) -> Any:
+        """Forget the newest open install of a package; return its value, or None"""
+        ...
+
+
+class MemoryOpenInstalls:
+    def __init__(self) -> None:
+        self.stacks: Dict[Tuple[str, str], List[Any]] = {}
+
+    def push(self, manager: str, name: str, value: Any) -> None:
+        self.stacks.setdefault((manager, name), []).append(value)
+
+    def pop(self, manager: str, name: str) -> Any:
+        stack = self.stacks.get((manager, name))
+        if not stack:
+            return None
+        value = stack.pop()
+        if not stack:
+            del self.stacks[(manager, name)]
+        return value
+
+    def rows(self) -> Iterator[Tuple[str, str, Any]]:
+        """Yield ``(manager, name, value)`` of every open install, oldest first per package"""
+        for (manager, name), stack in self.stacks.items():
+            for value in stack:
+                yield manager, name, value
+
+
+class StoredOpenInstalls:
+    """``OpenInstalls`` in the ``open_installs`` table of a sidecar"""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+    def push(self, manager: str, name: str, value: Any) -> None:
+        self.conn.execute(
+            "INSERT INTO open_installs (manager, name, value) VALUES (?, ?, ?)",
+            (manager, name, value),
+        )
+
+    def pop(self, manager: str, name: str) -> Any:
+        row = self.conn.execute(
+            "SELECT seq, value FROM open_installs WHERE manager = ? AND name = ? "
+            "ORDER BY seq DESC LIMIT 1",
+            (manager, name),
+        ).fetchone()
+        if row is None:
+            return None
+        self.conn.execute("DELETE FROM open_installs WHERE seq = ?", (row[0],))
+        return row[1]
+
+    def replace(self, open_installs: MemoryOpenInstalls) -> None:
+        self.conn.execute("DELETE FROM open_installs")
+        self.conn.executemany(
+            "INSERT INTO open_installs (manager, name, value) VALUES (?, ?, ?)",
+            open_installs.rows(),
+        )
+
+    def values(self, manager: str, name: str) -> List[Any]:
+        """Return the values of the open installs of a package, oldest first"""
+        rows = self.conn.execute(
+            "SELECT value FROM open_installs WHERE manager = ? AND name = ? ORDER BY seq",
+            (manager, name),
+        )
+        return [row[0] for row in rows]
+
+
+class Sidecar:
+    """A SQLite file next to the data file, holding state derived from the log.
+
+    Subclasses name the file's ``suffix`` and format ``version`` and create
+    their tables in ``schema``; the ``meta`` table tags the file with the
+    version and with the revision of the log it describes, usually the store
+    generation. Writers advance the file under the store's write lock right
+    after each commit, and a reader that finds it stale rebuilds it from the
+    log, so it is never synced to disk. A crash can still damage it; since it
+    holds nothing the log does not, a damaged file is deleted and rebuilt.
+    """
+
+    suffix: ClassVar[str]
+    version: ClassVar[str]
+    schema: ClassVar[str]
+    # What the file holds, for log messages
+    label: ClassVar[str]
+
+    def __init__(self, data_path: Path, file_mode: int = 0o600) -> None:
+        self.path = data_path.with_name(data_path.name + self.suffix)
+        self.file_mode = file_mode
+
+    def advance(
+        self, before: str, after: str, step: Callable[[sqlite3.Connection], T]
+    ) -> Optional[T]:
+        """Run *step* and tag the file *after* in one transaction, if it describes *before*
+
+        Returns:
+            What *step* returned, or None if the file was stale or could not
+            be updated; it is then left stale
+        """
+        if not self.path.exists():
+            return None
+        try:
+            with self.connect() as conn:
+                if self.generation(conn) != before:
+                    return None
+                with conn:
+                    result = step(conn)
+                    self.tag(conn, generation=after)
+        except sqlite3.Error as err:
+            logger.debug("Could not update %s %s: %s", self.label, self.path, err)
+            return None
+        return result
+
+    def describes(self, generation: str) -> bool:
+        """Return whether the file exists and is tagged with *generation*"""
+        if not self.path.exists():
+            return False
+        try:
+            with self.connect() as conn:
+                return self.generation(conn) == generation
+        except sqlite3.Error:
+            return False
+
+    def recovering(self, action: Callable[[], T]) -> T:
+        """Run *action*; if it finds the file damaged, delete the file and run it once more
+
+        Raises:
+            OSError, sqlite3.Error: If *action* fails for another reason
+        """
+        try:
+            return action()
+        except sqlite3.DatabaseError as err:
+            if isinstance(err, sqlite3.OperationalError):
+                raise
+            logger.warning("Rebuilding damaged %s %s: %s", self.label, self.path, err)
+            self.path.unlink(missing_ok=True)
+            return action()
+
+    def connect(self) -> "closing[sqlite3.Connection]":
+        """Open the file, creating it and its tables if needed"""
+        created = not self.path.exists()
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.executescript(self.schema + _META)
+            conn.execute("PRAGMA synchronous=OFF")
+            if created:
+                self.path.chmod(self.file_mode)
+        except BaseException:
+            conn.close()
+            raise
+        return closing(conn)
+
+    def meta(self, conn: sqlite3.Connection) -> Dict[str, str]:
+        """Return the tag of the file, or an empty mapping if it has another version"""
+        rows = dict(conn.execute("SELECT key, value FROM meta"))
+        return rows if rows.get("version") == self.version else {}
+
+    def generation(self, conn: sqlite3.Connection) -> Optional[str]:
+        return self.meta(conn).get("generation")
+
+    def tag(self, conn: sqlite3.Connection, **values: str) -> None:
+        conn.executemany(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+            (("version", self.version), *values.items()),
+        )
+
+
+class OpenInstallFile(Sidecar):
+    """The installs of the log no removal has closed yet, with the repo of each.
+
+    Stored in ``<data file>.open`` and tagged with the store generation. It
+    is the one place a store tracks open installs across commits: the stats
+    and rollups sidecars both advance from what ``track`` reports, so a write
+    looks up only the packages it removes. Whichever of them rebuilds from
+    the log first stores the open installs it collected on the way.
+    """
+
+    suffix = ".open"
+    version = "1"
+    schema = OPEN_INSTALLS_SCHEMA
+    label = "open installs"
+
+    def track(
+        self, entries: Iterable[Mapping[str, Any]], before: str, after: str
+    ) -> Optional[List[Optional[str]]]:
+        """Advance past *entries*, written since *before*, and tag the file *after*
+
+        Returns:
+            What each entry closes (see ``closed_repos``), or None if the file
+            did not describe *before*; it is then left stale
+        """
+        return self.advance(
+            before, after, lambda conn: closed_repos(entries, StoredOpenInstalls(conn))
+        )
+
+    def replace(self, open_installs: MemoryOpenInstalls, generation: str) -> None:
+        """Store the open installs of *generation*; failures only leave the file stale"""
+
+        def fill() -> None:
+            with self.connect() as conn:
+                with conn:
+                    StoredOpenInstalls(conn).replace(open_installs)
+                    self.tag(conn, generation=generation)
+
+        try:
+            self.recovering(fill)
+        except (OSError, sqlite3.Error) as err:
+            logger.debug("Could not update %s %s: %s", self.label, self.path, err)
+
+
+def closed_repos(
+    entries: Iterable[Mapping[str, Any]], open_installs: OpenInstalls
+) -> List[Optional[str]]:
+    """Advance *open_installs* past raw *entries*; return the repo each entry closes
+
+    A removal closes the newest open install of its package, whose repo
+    (``""`` if it named none) is returned for it. Installs, removals of
+    nothing open and records an older release closed in place get None.
+    """
+    closed: List[Optional[str]] = []
+    for entry in entries:
+        repo = None
+        manager, name = str(entry.get("manager")), str(entry.get("name"))
+        if entry.get("date_removed"):
+            pass
+        elif entry.get("removed"):
+            repo = open_installs.pop(manager, name)
+        else:
+            open_installs.push(manager, name, repo_of(entry))
+        closed.append(repo)
+    return closed
+
+
+def repo_of(entry: Mapping[str, Any]) -> str:
+    """Return the repo an event's metadata names, or ``""``"""
+    metadata = entry.get("metadata")
+    repo = metadata.get("repo") if isinstance(metadata, Mapping) else None
+    return repo if isinstance(repo, str) else ""
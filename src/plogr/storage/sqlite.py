@@ -0,0 +1,264 @@
+"""SQLite storage engine with indexed lookups"""
+
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+from contextlib import closing, contextmanager
+from typing import Any, ClassVar, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .base import EventStore, Record, file_stamp
+from .predicate import QueryFilters, record_plan
+from .timeindex import epoch_key
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    manager TEXT NOT NULL,
+    action TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    date TEXT NOT NULL,
+    removed INTEGER NOT NULL DEFAULT 0,
+    version TEXT,
+    metadata TEXT,
+    date_removed TEXT,
+    epoch INTEGER,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_manager_name ON events (manager, name);
+CREATE INDEX IF NOT EXISTS idx_events_name ON events (name);
+CREATE INDEX IF NOT EXISTS idx_events_removed ON events (removed);
+CREATE INDEX IF NOT EXISTS idx_events_epoch ON events (epoch);
+CREATE TABLE IF NOT EXISTS open_installs (
+    id INTEGER PRIMARY KEY,
+    manager TEXT NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_open_installs ON open_installs (manager, name);
+CREATE TABLE IF NOT EXISTS closures (
+    install_id INTEGER PRIMARY KEY,
+    removal_id INTEGER NOT NULL UNIQUE
+);
+"""
+
+# Installs a removal closed read as removed on the removal's date, and the
+# removal itself is folded into them.
+_ACTION = "CASE WHEN c.install_id IS NULL THEN e.action ELSE 'remove' END"
+_REMOVED = "CASE WHEN c.install_id IS NULL THEN e.removed ELSE 1 END"
+_RECORDS = f"""
+SELECT e.id, e.name, e.manager, {_ACTION}, e.scope, e.date, {_REMOVED},
+    e.version, e.metadata,
+    COALESCE(r.date, e.date_removed), e.extra
+FROM events e
+LEFT JOIN closures c ON c.install_id = e.id
+LEFT JOIN events r ON r.id = c.removal_id
+WHERE NOT EXISTS (SELECT 1 FROM closures k WHERE k.removal_id = e.id)
+"""
+
+# Durability mode -> PRAGMA synchronous. In WAL mode NORMAL only syncs at
+# checkpoints, so many commits share one fsync.
+_SYNCHRONOUS = {"none": "OFF", "batch": "NORMAL", "always": "FULL"}
+
+_COLUMNS = (
+    "name, manager, action, scope, date, removed, version, metadata, date_removed, epoch, extra"
+)
+# Entry fields with a column of their own; any others are kept as JSON in ``extra``.
+_FIELDS = frozenset(
+    ("name", "manager", "action", "scope", "date", "removed", "version", "metadata", "date_removed")
+)
+
+
+class SqliteStore(EventStore):
+    """Keep events in a local SQLite database.
+
+    Rows of ``events`` are only ever inserted; a removal is a row of its own.
+    ``open_installs`` holds the installs nobody removed yet, so matching a
+    removal is a single seek, and ``closures`` pairs each closed install with
+    the removal that closed it, from which queries derive ``removed`` and
+    ``date_removed``. The ``(manager, name)`` index serves ``--manager``
+    filters, ``epoch`` (the timestamp as whole seconds) serves ``since`` and
+    ``until`` ranges and ``removed`` backs the status counters, so none of them
+    needs to decode the whole history. Entry fields without a column of their
+    own, such as ``idempotency_key``, are kept as JSON in ``extra``.
+    """
+
+    name: ClassVar[str] = "sqlite"
+
+    @classmethod
+    def filename(cls) -> str:
+        return "packages.db"
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+            conn.execute(f"PRAGMA synchronous={_SYNCHRONOUS[self.durability.mode]}")
+            with conn:
+                yield conn
+
+    def ensure(self) -> None:
+        with self._connect() as conn:
+            # WAL lets readers run alongside the single writer.
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        self.path.chmod(self.file_mode)
+
+    def append_many(self, entries: Sequence[Mapping[str, Any]]) -> int:
+        """Insert *entries* in one transaction, pairing each removal with the install it closes."""
+        if not entries:
+            return 0
+        # SQLite serializes the transactions; the lock also covers the sidecars.
+        with self.committing(entries) as fresh:
+            if fresh:
+                with self._connect() as conn:
+                    for entry in fresh:
+                        _apply(conn, entry)
+        return len(fresh)
+
+    def load(self) -> List[Record]:
+        return self.query()
+
+    def generation(self) -> str:
+        # Committed WAL frames change the -wal file before the main database.
+        parts = [super().generation()]
+        wal = self.path.with_name(self.path.name + "-wal")
+        if wal.exists():
+            parts.append("-".join(str(part) for part in file_stamp(wal)))
+        return ":".join(parts)
+
+    def iter_matching(
+        self, filters: QueryFilters, after: Optional[int] = None
+    ) -> Iterator[Tuple[int, Record]]:
+        """Step a cursor over the matching rows; positions are row ids
+
+        Metadata values are narrowed down in SQL and confirmed on each decoded
+        record, since ``--meta size=42`` must also match the number 42.
+        """
+        sql, params = self._select(filters, after)
+        verify = record_plan(QueryFilters(metadata=filters.metadata)).test
+        with self._connect() as conn:
+            for row in conn.execute(sql, params):
+                record = _row_to_record(row[1:])
+                if verify(record):
+                    yield row[0], record
+
+    def explain(self, filters: QueryFilters) -> List[str]:
+        sql, params = self._select(filters)
+        with self._connect() as conn:
+            steps = [
+                f"sqlite: {row[-1]}" for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)
+            ]
+        verify = record_plan(QueryFilters(metadata=filters.metadata))
+        if verify.checks:
+            steps.extend(verify.describe())
+        return steps
+
+    def _select(self, filters: QueryFilters, after: Optional[int] = None) -> Tuple[str, List[Any]]:
+        """Return the statement and parameters selecting the rows matching *filters*"""
+        clauses: List[str] = []
+        params: List[Any] = []
+
+        if after is not None:
+            clauses.append("e.id > ?")
+            params.append(after)
+        if filters.manager:
+            clauses.append("e.manager = ?")
+            params.append(filters.manager)
+        if filters.action:
+            clauses.append(f"{_ACTION} = ?")
+            params.append(filters.action)
+        if filters.removed is not None:
+            clauses.append(f"{_REMOVED} = ?")
+            params.append(1 if filters.removed else 0)
+        bounds = filters.bounds
+        if bounds is not None:
+            # A range scan of idx_events_epoch.
+            low, high = bounds
+            if low is not None:
+                clauses.append("e.epoch >= ?")
+                params.append(low)
+            if high is not None:
+                clauses.append("e.epoch < ?")
+                params.append(high)
+        name = filters.name
+        names = self.matching_names(name) if name else None
+        if names is not None:
+            # The trigram index found the names; each is one seek on idx_events_name.
+            clauses.append("e.name IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(sorted(names)))
+        elif name:
+            # LIKE is case-insensitive for ASCII, matching the lower() comparison elsewhere.
+            escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses.append("e.name LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        for key, wanted in filters.metadata.items():
+            # Text values compare here; numbers and the like are left to the check.
+            clauses.append(
+                "EXISTS (SELECT 1 FROM json_each(e.metadata) j "
+                "WHERE j.key = ? AND (j.type != 'text' OR j.value = ?))"
+            )
+            params.extend((str(key), str(wanted)))
+
+        sql = _RECORDS + "".join(f" AND {clause}" for clause in clauses) + " ORDER BY e.id"
+        return sql, params
+
+
+def _apply(conn: sqlite3.Connection, entry: Mapping[str, Any]) -> None:
+    """Insert *entry* and advance the open-install and closure state past it"""
+    metadata = entry.get("metadata")
+    extra = {key: value for key, value in entry.items() if key not in _FIELDS}
+    row_id = conn.execute(
+        f"INSERT INTO events ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            entry.get("name"),
+            entry.get("manager"),
+            entry.get("action"),
+            entry.get("scope"),
+            entry.get("date"),
+            1 if entry.get("removed") else 0,
+            entry.get("version"),
+            json.dumps(metadata) if metadata else None,
+            entry.get("date_removed"),
+            epoch_key(entry.get("date")),
+            json.dumps(extra) if extra else None,
+        ),
+    ).lastrowid
+    if entry.get("date_removed"):
+        # Closed before it was written; opens and closes nothing.
+        return
+    key = (entry.get("manager"), entry.get("name"))
+    if not entry.get("removed"):
+        conn.execute("INSERT INTO open_installs VALUES (?, ?, ?)", (row_id, *key))
+        return
+    row = conn.execute(
+        "SELECT id FROM open_installs WHERE manager = ? AND name = ? ORDER BY id DESC LIMIT 1",
+        key,
+    ).fetchone()
+    if row is not None:
+        conn.execute("DELETE FROM open_installs WHERE id = ?", (row[0],))
+        conn.execute("INSERT INTO closures VALUES (?, ?)", (row[0], row_id))
+
+
+def _row_to_record(row: tuple) -> Record:
+    """Rebuild the ``PkgEvent.to_dict`` shape from a database row."""
+    name, manager, action, scope, date, removed, version, metadata, date_removed, extra = row
+    rec: Record = {
+        "name": name,
+        "manager": manager,
+        "action": action,
+        "scope": scope,
+        "date": date,
+        "removed": bool(removed),
+    }
+    if version:
+        rec["version"] = version
+    if metadata:
+        rec["metadata"] = json.loads(metadata)
+    if date_removed:
+        rec["date_removed"] = date_removed
+    if extra:
+        rec.update(json.loads(extra))
+    return rec
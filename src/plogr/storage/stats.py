@@ -0,0 +1,175 @@
+"""Incrementally maintained statistics sidecar for ``plogr status``"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence
+
+from .sidecar import OpenInstalls, repo_of
+
+logger = logging.getLogger(__name__)
+
+STATS_VERSION = 1
+
+Counters = Dict[str, int]
+
+
+def _counters() -> Counters:
+    return {"total": 0, "installed": 0, "removed": 0}
+
+
+class LogSummary:
+    """Status counters of a folded log, with per-manager and per-scope breakdowns.
+
+    To advance the counters past new events, the summary is told which of
+    them close an open install (``installed`` moves to ``removed``); every
+    other event is a record of its own (``total`` grows), exactly as
+    ``fold_events`` decides.
+    """
+
+    def __init__(self) -> None:
+        self.totals = _counters()
+        self.downloads = 0
+        self.by_manager: Dict[str, Counters] = {}
+        self.by_scope: Dict[str, Counters] = {}
+
+    @classmethod
+    def from_records(
+        cls,
+        records: Iterable[Mapping[str, Any]],
+        open_installs: Optional[OpenInstalls] = None,
+    ) -> "LogSummary":
+        """Count already folded records
+
+        Args:
+            open_installs: Also collect the installs left open here
+        """
+        summary = cls()
+        for rec in records:
+            summary.add_record(rec, open_installs)
+        return summary
+
+    def add_record(
+        self, rec: Mapping[str, Any], open_installs: Optional[OpenInstalls] = None
+    ) -> None:
+        """Count one more folded record"""
+        manager = str(rec.get("manager"))
+        removed = bool(rec.get("removed", False))
+        self._add(manager, str(rec.get("scope")), removed)
+        if not removed and open_installs is not None:
+            open_installs.push(manager, str(rec.get("name")), repo_of(rec))
+
+    def apply(
+        self, entries: Iterable[Mapping[str, Any]], closed: Sequence[Optional[str]]
+    ) -> None:
+        """Advance the counters past newly written raw *entries*
+
+        Args:
+            closed: For each entry, the repo of the install it closes, or None
+                (see ``sidecar.closed_repos``)
+        """
+        for entry, repo in zip(entries, closed):
+            manager, scope = str(entry.get("manager")), str(entry.get("scope"))
+            if repo is not None:
+                for counters in self._buckets(manager, scope):
+                    counters["installed"] -= 1
+                    counters["removed"] += 1
+            else:
+                self._add(manager, scope, bool(entry.get("removed")))
+
+    def statistics(self) -> Dict[str, Any]:
+        """Return the counters in the ``get_statistics`` shape"""
+        return {
+            **self.totals,
+            "downloads": self.downloads,
+            "by_manager": {k: dict(v) for k, v in sorted(self.by_manager.items())},
+            "by_scope": {k: dict(v) for k, v in sorted(self.by_scope.items())},
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.statistics()
+
+    @classmethod
+    def from_dict(cls, raw: Mapping[str, Any]) -> "LogSummary":
+        summary = cls()
+        summary.totals = {key: int(raw[key]) for key in summary.totals}
+        summary.downloads = int(raw["downloads"])
+        summary.by_manager = {k: dict(v) for k, v in raw["by_manager"].items()}
+        summary.by_scope = {k: dict(v) for k, v in raw["by_scope"].items()}
+        return summary
+
+    def _add(self, manager: str, scope: str, removed: bool) -> None:
+        for counters in self._buckets(manager, scope):
+            counters["total"] += 1
+            counters["removed" if removed else "installed"] += 1
+        if manager == "download":
+            self.downloads += 1
+
+    def _buckets(self, manager: str, scope: str) -> Iterable[Counters]:
+        yield self.totals
+        yield self.by_manager.setdefault(manager, _counters())
+        yield self.by_scope.setdefault(scope, _counters())
+
+
+class StatsFile:
+    """``LogSummary`` stored next to the data file, tagged with the store generation.
+
+    The counters are kept in ``<data file>.stats``, a small JSON file that
+    ``plogr status`` reads alone. Writers advance it under the store's write
+    lock right after each commit, from the removals the store's
+    ``OpenInstallFile`` found to close an install. A summary whose generation
+    does not match the store (missing file, crash between the writes, an edit
+    made by hand, a writer without permission to update it) is ignored and
+    recomputed from the log, so the file never needs to be synced to disk.
+    """
+
+    def __init__(self, path: Path, file_mode: int = 0o600) -> None:
+        self.path = path
+        self.file_mode = file_mode
+
+    def load(self, generation: str) -> Optional[LogSummary]:
+        """Return the stored summary if it describes *generation*, else None"""
+        try:
+            raw = json.loads(self.path.read_text())
+            if raw.get("version") != STATS_VERSION or raw.get("generation") != generation:
+                return None
+            return LogSummary.from_dict(raw)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as err:
+            logger.warning("Discarding unreadable statistics file %s: %s", self.path, err)
+            return None
+
+    def update(
+        self,
+        entries: Iterable[Mapping[str, Any]],
+        closed: Sequence[Optional[str]],
+        before: str,
+        after: str,
+    ) -> None:
+        """Count *entries*, written since *before*, and tag the summary *after*
+
+        A summary that did not describe *before* is left stale.
+
+        Args:
+            closed: What each entry closes, see ``LogSummary.apply``
+        """
+        summary = self.load(before)
+        if summary is not None:
+            summary.apply(entries, closed)
+            self.save(summary, after)
+
+    def save(self, summary: LogSummary, generation: str) -> None:
+        """Replace the stored summary; failures only cost a recompute later"""
+        payload = {"version": STATS_VERSION, "generation": generation, **summary.to_dict()}
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            tmp_path.write_text(json.dumps(payload, separators=(",", ":")))
+            tmp_path.chmod(self.file_mode)
+            os.replace(tmp_path, self.path)
+        except OSError as err:
+            logger.debug("Could not update statistics file %s: %s", self.path, err)
+            tmp_path.unlink(missing_ok=True)
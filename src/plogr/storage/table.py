@@ -0,0 +1,433 @@
+"""Dictionary-encoded columnar representation of folded event records"""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
+
+from .base import OpenCounts, OpenPositions, Record, fold_into
+from .predicate import EQUALS, MEMBER, METADATA, Plan, QueryFilters, meta_encodings
+from .timeindex import TimeIndex, epoch_key
+
+MAGIC = b"PLOGRCOL"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sII")  # magic, format version, header length
+
+_EPOCH = dt.datetime(1970, 1, 1)
+_SECOND = dt.timedelta(seconds=1)
+# Column value for a missing timestamp.
+NO_DATE = -(2**63)
+
+# Fields with a column of their own, in ``PkgEvent.to_dict`` order.
+_STRING_FIELDS = ("name", "manager", "action", "scope")
+_KNOWN_FIELDS = frozenset(
+    (*_STRING_FIELDS, "date", "removed", "version", "metadata", "date_removed")
+)
+
+
+class StringPool:
+    """Intern table mapping each distinct string to a small integer id.
+
+    Id 0 is reserved for ``None`` so that absent values need no separate mask.
+    """
+
+    __slots__ = ("values", "ids")
+
+    def __init__(self, values: Sequence[str] = ()) -> None:
+        self.values: List[Optional[str]] = [None, *values]
+        self.ids: Dict[str, int] = {value: i for i, value in enumerate(values, 1)}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        found = self.ids.get(value)
+        if found is None:
+            found = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return found
+
+    def lookup(self, ident: int) -> Optional[str]:
+        return self.values[ident]
+
+    def copy(self) -> "StringPool":
+        clone = StringPool.__new__(StringPool)
+        clone.values = list(self.values)
+        clone.ids = dict(self.ids)
+        return clone
+
+
+def to_epoch(value: Any) -> Optional[int]:
+    """Return whole seconds since 1970 for a naive ISO timestamp, else None"""
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = dt.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None or parsed.microsecond:
+        return None
+    return (parsed - _EPOCH) // _SECOND
+
+
+def from_epoch(seconds: int) -> str:
+    return (_EPOCH + dt.timedelta(seconds=seconds)).isoformat()
+
+
+class EventTable:
+    """Folded event records kept as parallel ``array`` columns.
+
+    Repeated strings (package names, managers, actions, scopes, versions and the
+    keys and JSON-encoded values of ``metadata``) are stored once in a
+    ``StringPool`` and referenced by id, timestamps are stored as integer epoch
+    seconds, and each row costs a few dozen bytes instead of a dict of strings.
+    Rows are turned back into record dicts or ``PkgEvent`` objects only when
+    asked for, so filtering and counting never materialize the whole history.
+
+    Timestamps that would not survive the integer round trip unchanged (time zone
+    offsets, fractions of a second, unusual spellings) are kept verbatim in a
+    small side table, as are record keys outside the ``PkgEvent`` shape.
+    """
+
+    def __init__(self) -> None:
+        self.pool = StringPool()
+        self.columns: Dict[str, array] = {
+            **{field: array("I") for field in _STRING_FIELDS},
+            "version": array("I"),
+            "date": array("q"),
+            "date_removed": array("q"),
+            "removed": array("B"),
+            # Row i's metadata pairs are meta_pairs[meta_offsets[i]:meta_offsets[i + 1]].
+            "meta_offsets": array("I", [0]),
+            "meta_pairs": array("I"),
+            "extra_offsets": array("I", [0]),
+            "extra_pairs": array("I"),
+        }
+        # Row -> original text for timestamps without an exact epoch form.
+        self.date_text: Dict[int, str] = {}
+        self.date_removed_text: Dict[int, str] = {}
+        # Built by the first range query, then kept up to date by ``append``.
+        self.timeline: Optional[TimeIndex] = None
+
+    @classmethod
+    def fold(
+        cls,
+        entries: Iterable[Mapping[str, Any]],
+        initial_open: Optional[OpenCounts] = None,
+    ) -> "EventTable":
+        """Replay raw events into a new table, like ``fold_events``"""
+        table = cls()
+        open_installs: OpenPositions = {}
+        for manager, names in (initial_open or {}).items():
+            for name, count in names.items():
+                open_installs[(name, manager)] = [-1] * count
+        fold_into(table, entries, open_installs)
+        return table
+
+    @classmethod
+    def from_records(cls, records: Iterable[Mapping[str, Any]]) -> "EventTable":
+        """Encode already folded records"""
+        table = cls()
+        for record in records:
+            table.append(record)
+        return table
+
+    def copy(self) -> "EventTable":
+        """Return an independent table with the same rows"""
+        clone = EventTable.__new__(EventTable)
+        clone.pool = self.pool.copy()
+        clone.columns = {name: col[:] for name, col in self.columns.items()}
+        clone.date_text = dict(self.date_text)
+        clone.date_removed_text = dict(self.date_removed_text)
+        clone.timeline = self.timeline.copy() if self.timeline is not None else None
+        return clone
+
+    def extend(self, entries: Iterable[Mapping[str, Any]]) -> None:
+        """Fold further raw events onto the end of the table"""
+        fold_into(self, entries, self.open_positions())
+
+    def __len__(self) -> int:
+        return len(self.columns["date"])
+
+    def __iter__(self) -> Iterator[Record]:
+        for row in range(len(self)):
+            yield self.record(row)
+
+    def append(self, entry: Mapping[str, Any]) -> None:
+        """Encode one record as a new row"""
+        row = len(self)
+        cols, pool = self.columns, self.pool
+        for field in _STRING_FIELDS:
+            cols[field].append(pool.intern(_as_text(entry.get(field))))
+        cols["version"].append(pool.intern(_as_text(entry.get("version")) or None))
+        cols["removed"].append(1 if entry.get("removed") else 0)
+        cols["date"].append(self._encode_date(entry.get("date"), row, self.date_text))
+        cols["date_removed"].append(
+            self._encode_date(entry.get("date_removed"), row, self.date_removed_text)
+        )
+        metadata = entry.get("metadata")
+        extra = {k: v for k, v in entry.items() if k not in _KNOWN_FIELDS}
+        if metadata is not None and not isinstance(metadata, Mapping):
+            # Not a key/value mapping; keep it verbatim alongside unknown keys.
+            extra["metadata"], metadata = metadata, None
+        self._append_pairs("meta", metadata or {})
+        self._append_pairs("extra", extra)
+        if self.timeline is not None:
+            self.timeline.add(row, self._date_key(row))
+
+    def close(self, position: int, date: Any) -> None:
+        """Mark the install at *position* as removed on *date*"""
+        cols = self.columns
+        cols["removed"][position] = 1
+        cols["action"][position] = self.pool.intern("remove")
+        self.date_removed_text.pop(position, None)
+        cols["date_removed"][position] = self._encode_date(date, position, self.date_removed_text)
+
+    def record(self, row: int) -> Record:
+        """Materialize *row* in the ``PkgEvent.to_dict`` shape"""
+        cols, lookup = self.columns, self.pool.lookup
+        rec: Record = {field: lookup(cols[field][row]) for field in _STRING_FIELDS}
+        rec["date"] = self._decode_date(cols["date"][row], row, self.date_text)
+        rec["removed"] = bool(cols["removed"][row])
+        version = lookup(cols["version"][row])
+        if version:
+            rec["version"] = version
+        metadata = self._pairs("meta", row)
+        if metadata:
+            rec["metadata"] = metadata
+        date_removed = self._decode_date(cols["date_removed"][row], row, self.date_removed_text)
+        if date_removed:
+            rec["date_removed"] = date_removed
+        rec.update(self._pairs("extra", row))
+        return rec
+
+    def stream(
+        self, rows: Sequence[int], after: Optional[int] = None, offset: int = 0
+    ) -> Iterator[Tuple[int, Record]]:
+        """Yield ``(position, record)`` for ascending *rows* past position *after*
+
+        Records are built one at a time. Positions are rows plus *offset*, the
+        number of records that precede the table in the log.
+        """
+        start = 0 if after is None else bisect_right(rows, after - offset)
+        for index in range(start, len(rows)):
+            row = rows[index]
+            yield row + offset, self.record(row)
+
+    def matching(self, filters: QueryFilters, names: Optional[Set[str]] = None) -> List[int]:
+        """Return the rows matching *filters*, in one pass over the candidates
+
+        A date range is looked up in the ``TimeIndex`` first; the rows inside
+        it are tested by the compiled ``plan``.
+        """
+        plan = self.plan(filters, names)
+        if plan.empty is not None:
+            return []
+        bounds = filters.bounds
+        rows: Iterable[int] = range(len(self))
+        if bounds is not None:
+            rows = self.time_index().span(bounds)
+        if not plan.checks:
+            return list(rows)
+        test = plan.test
+        return [row for row in rows if test(row)]
+
+    def plan(self, filters: QueryFilters, names: Optional[Set[str]] = None) -> Plan:
+        """Compile *filters* into a test of row numbers that reads only interned ids
+
+        Every filter value is looked up in the string pool once, so the test
+        compares integers; a value that was never interned matches no row.
+
+        Args:
+            names: The names ``filters.name`` matches, if known (see ``NameIndex``);
+                only those are looked up instead of testing every interned string
+        """
+        cols, ids = self.columns, self.pool.ids
+        plan = Plan("i")
+        if filters.bounds is not None:
+            plan.step(f"time index: rows from {filters.describe_range()}")
+        if filters.name:
+            if names is not None:
+                name_ids = {ids[value] for value in names if value in ids}
+                plan.step(f"name index: {len(name_ids)} name(s) contain {filters.name!r}")
+            else:
+                needle = filters.name.lower()
+                name_ids = {
+                    ident
+                    for ident, value in enumerate(self.pool.values)
+                    if value is not None and needle in value.lower()
+                }
+                plan.step(f"string pool: {len(name_ids)} string(s) contain {filters.name!r}")
+            if not name_ids:
+                plan.nothing(f"no logged name contains {filters.name!r}")
+            plan.add(
+                MEMBER,
+                "name is one of them",
+                "name_col[i] in name_ids",
+                name_col=cols["name"],
+                name_ids=frozenset(name_ids),
+            )
+        for field, value in (("manager", filters.manager), ("action", filters.action)):
+            if not value:
+                continue
+            ident = ids.get(value)
+            if ident is None:
+                plan.nothing(f"no event has {field} {value!r}")
+            plan.add(
+                EQUALS,
+                f"{field} is {value!r}",
+                f"{field}_col[i] == {field}_id",
+                **{f"{field}_col": cols[field], f"{field}_id": ident},
+            )
+        if filters.removed is not None:
+            plan.add(
+                EQUALS,
+                "removed" if filters.removed else "installed",
+                "removed_col[i] == removed_flag",
+                removed_col=cols["removed"],
+                removed_flag=1 if filters.removed else 0,
+            )
+        for n, (key, wanted) in enumerate(filters.metadata.items()):
+            key_id = ids.get(str(key))
+            value_ids = frozenset(ids[text] for text in meta_encodings(wanted) if text in ids)
+            if key_id is None or not value_ids:
+                plan.nothing(f"no event has metadata.{key} {wanted!r}")
+            plan.add(
+                METADATA,
+                f"metadata.{key} is {wanted!r}",
+                f"has_pair(i, meta_key{n}, meta_values{n})",
+                has_pair=self._has_pair,
+                **{f"meta_key{n}": key_id, f"meta_values{n}": value_ids},
+            )
+        return plan
+
+    def time_index(self) -> TimeIndex:
+        """Return the rows sorted by timestamp, indexing them on first use"""
+        if self.timeline is None:
+            self.timeline = TimeIndex.build(self._date_key(row) for row in range(len(self)))
+        return self.timeline
+
+    def names(self) -> Set[Optional[str]]:
+        """Return the distinct package names"""
+        lookup = self.pool.lookup
+        return {lookup(ident) for ident in set(self.columns["name"])}
+
+    def open_positions(self) -> OpenPositions:
+        """Return the rows of installs not yet closed, for folding more events"""
+        open_installs: OpenPositions = {}
+        cols, lookup = self.columns, self.pool.lookup
+        for row, removed in enumerate(cols["removed"]):
+            if not removed:
+                key = (lookup(cols["name"][row]), lookup(cols["manager"][row]))
+                open_installs.setdefault(key, []).append(row)
+        return open_installs
+
+    def save(self, path: Path, extra_header: Optional[Mapping[str, Any]] = None) -> None:
+        """Write the table to *path*: a JSON header followed by the raw columns"""
+        header = {
+            **(extra_header or {}),
+            "rows": len(self),
+            "byteorder": sys.byteorder,
+            "strings": self.pool.values[1:],
+            "date_text": self.date_text,
+            "date_removed_text": self.date_removed_text,
+            # Each column carries the CRC32 of its bytes as written.
+            "columns": [
+                [name, col.typecode, len(col), zlib.crc32(col)]
+                for name, col in self.columns.items()
+            ],
+        }
+        encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        with path.open("wb") as fp:
+            fp.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(encoded)))
+            fp.write(encoded)
+            for col in self.columns.values():
+                col.tofile(fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+
+    @classmethod
+    def load(cls, path: Path) -> Tuple["EventTable", Dict[str, Any]]:
+        """Read a table written by ``save`` and return it with its header
+
+        Raises:
+            ValueError: If *path* is not a columnar file or a column is corrupt
+        """
+        with path.open("rb") as fp:
+            magic, version, size = _HEADER.unpack(fp.read(_HEADER.size))
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"{path} is not a plogr columnar file (version {version})")
+            header = json.loads(fp.read(size))
+            table = cls()
+            table.pool = StringPool(header["strings"])
+            table.date_text = {int(k): v for k, v in header["date_text"].items()}
+            table.date_removed_text = {int(k): v for k, v in header["date_removed_text"].items()}
+            for name, typecode, count, *crc in header["columns"]:
+                col = array(typecode)
+                col.fromfile(fp, count)
+                if crc and zlib.crc32(col) != crc[0]:
+                    raise ValueError(f"{path}: column {name!r} does not match its checksum")
+                if header["byteorder"] != sys.byteorder:
+                    col.byteswap()
+                table.columns[name] = col
+        return table, header
+
+    def _encode_date(self, value: Any, row: int, overrides: Dict[int, str]) -> int:
+        if value is None:
+            return NO_DATE
+        seconds = to_epoch(value)
+        if seconds is None or from_epoch(seconds) != value:
+            overrides[row] = str(value)
+            return NO_DATE
+        return seconds
+
+    def _decode_date(self, value: int, row: int, overrides: Dict[int, str]) -> Optional[str]:
+        if value == NO_DATE:
+            return overrides.get(row)
+        return from_epoch(value)
+
+    def _date_key(self, row: int) -> Optional[int]:
+        seconds = self.columns["date"][row]
+        if seconds == NO_DATE:
+            return epoch_key(self.date_text.get(row))
+        return seconds
+
+    def _append_pairs(self, prefix: str, mapping: Mapping[str, Any]) -> None:
+        pairs = self.columns[f"{prefix}_pairs"]
+        for key, value in mapping.items():
+            pairs.append(self.pool.intern(str(key)))
+            pairs.append(self.pool.intern(json.dumps(value, sort_keys=True)))
+        self.columns[f"{prefix}_offsets"].append(len(pairs))
+
+    def _has_pair(self, row: int, key_id: int, value_ids: Set[int]) -> bool:
+        """Tell whether *row*'s metadata maps *key_id* to one of *value_ids*"""
+        offsets, pairs = self.columns["meta_offsets"], self.columns["meta_pairs"]
+        for i in range(offsets[row], offsets[row + 1], 2):
+            if pairs[i] == key_id:
+                return pairs[i + 1] in value_ids
+        return False
+
+    def _pairs(self, prefix: str, row: int) -> Dict[str, Any]:
+        offsets = self.columns[f"{prefix}_offsets"]
+        start, end = offsets[row], offsets[row + 1]
+        if start == end:
+            return {}
+        pairs, lookup = self.columns[f"{prefix}_pairs"], self.pool.lookup
+        return {
+            str(lookup(pairs[i])): json.loads(lookup(pairs[i + 1]) or "null")
+            for i in range(start, end, 2)
+        }
+
+
+def _as_text(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
@@ -0,0 +1,128 @@
+"""Integer epoch keys and a sorted index for ``since``/``until`` range queries"""
+
+from __future__ import annotations
+
+import datetime as dt
+from array import array
+from bisect import bisect_left
+from typing import Any, Iterable, List, Optional, Tuple
+
+_EPOCH = dt.datetime(1970, 1, 1)
+_SECOND = dt.timedelta(seconds=1)
+
+Bounds = Tuple[Optional[int], Optional[int]]
+
+
+def epoch_key(value: Any) -> Optional[int]:
+    """Return the whole epoch seconds of an ISO timestamp's wall-clock time
+
+    A time zone offset is ignored and fractions of a second are dropped, so a
+    record falls on the day and second its own text names, as ``--days``
+    always judged it. Returns None for anything that is not a timestamp.
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        return _seconds(dt.datetime.fromisoformat(value))
+    except ValueError:
+        return None
+
+
+def time_bounds(since: Optional[dt.date] = None, until: Optional[dt.date] = None) -> Bounds:
+    """Turn ``query`` bounds into a half-open range of epoch keys
+
+    *since* and *until* are both inclusive. A date covers its whole day and a
+    datetime is taken to the second.
+
+    Returns:
+        (lowest key, first key past the range); None where unbounded
+    """
+    low = high = None
+    if since is not None:
+        low = _seconds(_as_datetime(since))
+    if isinstance(until, dt.datetime):
+        high = _seconds(until) + 1
+    elif until is not None:
+        high = _seconds(_as_datetime(until + dt.timedelta(days=1)))
+    return low, high
+
+
+def in_bounds(key: Optional[int], bounds: Bounds) -> bool:
+    """Tell whether *key* lies in *bounds*; a missing key never does"""
+    low, high = bounds
+    if key is None:
+        return False
+    return (low is None or key >= low) and (high is None or key < high)
+
+
+def _seconds(value: dt.datetime) -> int:
+    return (value.replace(tzinfo=None) - _EPOCH) // _SECOND
+
+
+def _as_datetime(value: dt.date) -> dt.datetime:
+    if isinstance(value, dt.datetime):
+        return value
+    return dt.datetime.combine(value, dt.time())
+
+
+class TimeIndex:
+    """Row numbers sorted by epoch key, searched with ``bisect``.
+
+    Two parallel ``array`` columns hold the keys in ascending order and the
+    rows they belong to. A range lookup bisects the keys for both ends and
+    returns the rows in between, so it costs O(log n + k) for k matches.
+
+    Events are nearly always logged in time order, so ``add`` usually just
+    appends; an event logged with an earlier timestamp marks the index for a
+    re-sort, which the next lookup performs once.
+    """
+
+    __slots__ = ("keys", "rows", "_sorted")
+
+    def __init__(self) -> None:
+        self.keys = array("q")
+        self.rows = array("I")
+        self._sorted = True
+
+    @classmethod
+    def build(cls, keys: Iterable[Optional[int]]) -> "TimeIndex":
+        """Index rows 0, 1, ... by *keys*, leaving out rows without a key"""
+        index = cls()
+        for row, key in enumerate(keys):
+            index.add(row, key)
+        return index
+
+    def copy(self) -> "TimeIndex":
+        clone = TimeIndex()
+        clone.keys = self.keys[:]
+        clone.rows = self.rows[:]
+        clone._sorted = self._sorted
+        return clone
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, row: int, key: Optional[int]) -> None:
+        if key is None:
+            return
+        if self.keys and key < self.keys[-1]:
+            self._sorted = False
+        self.keys.append(key)
+        self.rows.append(row)
+
+    def span(self, bounds: Bounds) -> List[int]:
+        """Return the rows whose key lies in *bounds*, in row order"""
+        if not self._sorted:
+            self._sort()
+        low, high = bounds
+        keys = self.keys
+        start = 0 if low is None else bisect_left(keys, low)
+        end = len(keys) if high is None else bisect_left(keys, high, start)
+        return sorted(self.rows[start:end])
+
+    def _sort(self) -> None:
+        # A stable sort keeps rows with equal keys in row order.
+        pairs = sorted(zip(self.keys, self.rows), key=lambda pair: pair[0])
+        self.keys = array("q", (key for key, _ in pairs))
+        self.rows = array("I", (row for _, row in pairs))
+        self._sorted = True
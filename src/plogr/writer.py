@@ -0,0 +1,166 @@
+"""Background writer thread that batches log writes off the caller's thread"""
+
+import atexit
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Mapping, Optional, Sequence, Union
+
+from .storage.dedup import KEY_FIELD
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 1024
+
+Entries = Sequence[Mapping[str, Any]]
+
+
+class _Write:
+    __slots__ = ("entries", "future")
+
+    def __init__(self, entries: Entries) -> None:
+        self.entries = entries
+        self.future: "Future[int]" = Future()
+
+    @property
+    def keyed(self) -> bool:
+        return any(entry.get(KEY_FIELD) for entry in self.entries)
+
+
+class _Flush:
+    __slots__ = ("future",)
+
+    def __init__(self) -> None:
+        self.future: "Future[None]" = Future()
+
+
+_STOP = object()
+
+_Item = Union[_Write, _Flush, object]
+
+
+class BackgroundWriter:
+    """Hand writes to a single thread that drains a bounded queue in batches.
+
+    ``submit`` returns a future at once; the writer thread takes everything
+    queued so far and writes consecutive submissions in one ``commit`` call,
+    so a burst of events costs one lock acquisition, one write and one sync.
+    Submissions that carry idempotency keys are committed on their own, so the
+    count their future reports leaves out exactly their own duplicates. When
+    the queue is full, ``submit`` blocks until the writer catches up.
+
+    ``flush`` waits until everything submitted before it is written and synced;
+    ``close`` does the same and stops the thread. Interpreter shutdown closes
+    a writer that is still running, so queued events are not lost.
+    """
+
+    def __init__(
+        self,
+        commit: Callable[[Entries], int],
+        sync: Callable[[], None],
+        max_queue: int = DEFAULT_QUEUE_SIZE,
+    ) -> None:
+        self._commit = commit
+        self._sync = sync
+        self._queue: "queue.Queue[_Item]" = queue.Queue(max(1, max_queue))
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="plogr-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def submit(self, entries: Entries) -> "Future[int]":
+        """Queue *entries* for one write; the future resolves to the number written
+
+        Raises:
+            RuntimeError: If the writer was closed
+        """
+        item = _Write(list(entries))
+        self._put(item)
+        return item.future
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Block until every event submitted so far is written and synced"""
+        item = _Flush()
+        self._put(item)
+        item.future.result(timeout)
+
+    def close(self) -> None:
+        """Drain the queue, sync, and stop the writer thread; later submits fail"""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_Flush())
+            self._queue.put(_STOP)
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def _put(self, item: _Item) -> None:
+        # Under the lock, nothing can be queued behind the stop marker.
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("background writer is closed")
+            self._queue.put(item)
+
+    def _run(self) -> None:
+        while True:
+            batch: List[_Item] = [self._queue.get()]
+            try:
+                while True:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not self._process(batch):
+                return
+
+    def _process(self, batch: List[_Item]) -> bool:
+        """Write *batch* in as few commits as possible; False once told to stop"""
+        pending: List[_Write] = []
+        running = True
+        for item in batch:
+            if isinstance(item, _Write) and not item.keyed:
+                pending.append(item)
+                continue
+            self._write(pending)
+            pending = []
+            if isinstance(item, _Write):
+                self._write([item])
+            elif isinstance(item, _Flush):
+                self._flush(item)
+            elif item is _STOP:
+                running = False
+        self._write(pending)
+        return running
+
+    def _write(self, writes: List[_Write]) -> None:
+        if not writes:
+            return
+        entries = [entry for write in writes for entry in write.entries]
+        try:
+            written = self._commit(entries)
+        except Exception as e:
+            logger.error(f"Error updating log files: {e}")
+            for write in writes:
+                write.future.set_exception(e)
+            return
+        if len(writes) == 1:
+            writes[0].future.set_result(written)
+            return
+        # Only keyless submissions share a commit, and those are never rejected.
+        for write in writes:
+            write.future.set_result(len(write.entries))
+
+    def _flush(self, item: _Flush) -> None:
+        try:
+            self._sync()
+        except Exception as e:
+            logger.error(f"Error syncing log files: {e}")
+            item.future.set_exception(e)
+            return
+        item.future.set_result(None)
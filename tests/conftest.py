@@ -6,6 +6,49 @@ from unittest.mock import MagicMock
 
 import pytest
 
+from src.plogr.storage import open_store
+
+# Storage engines the store tests run against; "both" is the JSON engine again.
+ENGINES = ["json", "journal", "sqlite", "columnar"]
+
+
+def make_event(
+    name,
+    action="install",
+    date="2025-01-01T00:00:00",
+    manager="dnf",
+    scope="user",
+    repo=None,
+    **extra,
+):
+    """Build a raw package event; *repo* adds metadata, *extra* adds fields."""
+    event = {
+        "name": name,
+        "manager": manager,
+        "action": action,
+        "scope": scope,
+        "date": date,
+        "removed": action == "remove",
+    }
+    if repo:
+        event["metadata"] = {"repo": repo, "arch": "x86_64"}
+    event.update(extra)
+    return event
+
+
+@pytest.fixture(params=ENGINES)
+def log_format(request):
+    """Fixture that runs a test once per storage engine."""
+    return request.param
+
+
+@pytest.fixture()
+def store(log_format, tmp_path):
+    """Empty store of each engine in turn, created under tmp_path."""
+    store = open_store(log_format, tmp_path)
+    store.ensure()
+    return store
+
 
 @pytest.fixture()
 def tmp_home(monkeypatch, tmp_path: Path):
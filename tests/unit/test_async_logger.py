@@ -0,0 +1,124 @@
+"""Unit tests for the asyncio front end"""
+
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+from src.plogr.async_logger import QUERY_CHUNK, AsyncPackageLogger
+from src.plogr.config import Config
+
+
+def _config(tmp_path, log_format="journal"):
+    config = Config()
+    config.set("scope", "user")
+    config.set("log_format", log_format)
+    return config
+
+
+def _run(tmp_path, scenario, log_format="journal"):
+    async def main():
+        async with await AsyncPackageLogger.open(_config(tmp_path, log_format)) as alogger:
+            return await scenario(alogger)
+
+    with patch("pathlib.Path.home", return_value=tmp_path):
+        return asyncio.run(main())
+
+
+class TestAsyncPackageLogger:
+    """Test the async methods against a real store."""
+
+    def test_concurrent_callers_are_batched(self, tmp_path):
+        """Events awaited together are written in fewer commits than callers."""
+
+        async def scenario(alogger):
+            store = alogger.logger.store
+            with patch.object(store, "append_many", wraps=store.append_many) as append:
+                results = await asyncio.gather(
+                    *(alogger.log_package(f"pkg{i}", "dnf", "install") for i in range(50))
+                )
+            return results, append.call_count, [r["name"] async for r in alogger.query()]
+
+        results, commits, names = _run(tmp_path, scenario)
+        assert results == [True] * 50
+        assert commits < 50
+        assert sorted(names) == sorted(f"pkg{i}" for i in range(50))
+
+    def test_query_filters_and_statistics(self, tmp_path):
+        """query() is an async iterator taking the sync filters; counters match."""
+
+        async def scenario(alogger):
+            await alogger.log_packages(
+                [
+                    {"name": "htop", "manager": "dnf", "action": "install"},
+                    {"name": "vim", "manager": "apt", "action": "install"},
+                    {"name": "htop", "manager": "dnf", "action": "remove"},
+                ]
+            )
+            records = [r async for r in alogger.query(manager="dnf")]
+            return records, await alogger.get_statistics()
+
+        records, stats = _run(tmp_path, scenario, "both")
+        assert [(r["name"], r["removed"]) for r in records] == [("htop", True)]
+        assert (stats["total"], stats["installed"], stats["removed"]) == (2, 1, 1)
+
+    def test_query_streams_in_chunks(self, tmp_path):
+        """query() reads ``PackageLogger.stream`` chunk by chunk, never the full list."""
+
+        async def scenario(alogger):
+            await alogger.log_packages(
+                [
+                    {"name": f"pkg{i}", "manager": "dnf", "action": "install"}
+                    for i in range(QUERY_CHUNK + 5)
+                ]
+            )
+            with patch.object(alogger.logger, "query", side_effect=AssertionError("list")):
+                return [r["name"] async for r in alogger.query(name="pkg")]
+
+        names = _run(tmp_path, scenario)
+        assert names == [f"pkg{i}" for i in range(QUERY_CHUNK + 5)]
+
+    def test_waiting_for_the_writer_does_not_block_loop(self, tmp_path):
+        """A submit that waits for room in the writer's queue runs off the loop."""
+
+        async def scenario(alogger):
+            room = threading.Event()
+            submit = alogger.logger.submit_package
+
+            def full_queue(*args):
+                room.wait(5)
+                return submit(*args)
+
+            with patch.object(alogger.logger, "submit_package", side_effect=full_queue):
+                task = asyncio.ensure_future(alogger.log_package("a", "dnf", "install"))
+                started = time.monotonic()
+                await asyncio.sleep(0.05)
+                waited = time.monotonic() - started
+                room.set()
+                return waited, await task
+
+        waited, logged = _run(tmp_path, scenario)
+        assert waited < 1
+        assert logged is True
+
+    def test_duplicates_and_invalid_events(self, tmp_path):
+        """Return values match the sync logger's."""
+
+        async def scenario(alogger):
+            first = await alogger.log_package("a", "dnf", "install", transaction_id="1")
+            again = await alogger.log_package("a", "dnf", "install", transaction_id="1")
+            invalid = await alogger.log_package(" ", "dnf", "install")
+            return first, again, invalid
+
+        assert _run(tmp_path, scenario) == (True, False, False)
+
+    def test_close_flushes_writer(self, tmp_path):
+        """Leaving the context drains the writer thread."""
+
+        async def scenario(alogger):
+            alogger.logger.submit_package("late", "dnf", "install")
+            return alogger.logger
+
+        logger = _run(tmp_path, scenario)
+        assert logger.writer is None
+        assert [r["name"] for r in logger.query()] == ["late"]
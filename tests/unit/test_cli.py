@@ -1,5 +1,6 @@
 """Unit tests for the CLI module"""
 
+import datetime as dt
 from unittest.mock import patch, MagicMock
 from click.testing import CliRunner
 
@@ -87,6 +88,52 @@ class TestCLI:
             assert "Removed: 2" in result.output
             assert "Downloads: 1" in result.output
 
+    def test_status_reports_compression_savings(self):
+        """Test status shows the space saved by compressed segments."""
+        with patch("src.plogr.logger.PackageLogger") as mock_logger_class:
+            mock_logger = MagicMock()
+            mock_logger.get_statistics.return_value = {
+                "total": 5,
+                "installed": 3,
+                "removed": 2,
+                "downloads": 1,
+                "scope": "user",
+                "stored_bytes": 1024,
+                "raw_bytes": 4 * 1024 * 1024,
+                "compressed_segments": 2,
+            }
+            mock_logger.data_dir = "/tmp/test"
+            mock_logger_class.return_value = mock_logger
+
+            result = self.runner.invoke(cli, ["status", "--scope", "user"])
+
+            assert result.exit_code == 0
+            assert "Compression: 2 segment(s), 1.0 KiB on disk for 4.0 MiB" in result.output
+            assert "99%" in result.output
+
+    def test_status_recompute_and_breakdowns(self):
+        """Test status --recompute rebuilds the counters and lists breakdowns."""
+        with patch("src.plogr.logger.PackageLogger") as mock_logger_class:
+            mock_logger = MagicMock()
+            mock_logger.get_statistics.return_value = {
+                "total": 3,
+                "installed": 2,
+                "removed": 1,
+                "downloads": 0,
+                "by_manager": {"dnf": {"total": 3, "installed": 2, "removed": 1}},
+                "by_scope": {"user": {"total": 3, "installed": 2, "removed": 1}},
+                "scope": "user",
+            }
+            mock_logger.data_dir = "/tmp/test"
+            mock_logger_class.return_value = mock_logger
+
+            result = self.runner.invoke(cli, ["status", "--scope", "user", "--recompute"])
+
+            assert result.exit_code == 0
+            mock_logger.get_statistics.assert_called_once_with(recompute=True)
+            assert "By manager:\n  dnf: 3 logged, 2 installed, 1 removed" in result.output
+            assert "By scope:\n  user: 3 logged" in result.output
+
     def test_status_system_scope(self):
         """Test status command with system scope."""
         with (
@@ -111,12 +158,48 @@ class TestCLI:
             assert "Installed: 8" in result.output
             assert "Removed: 2" in result.output
 
+    def test_stats_table_and_csv(self):
+        """Test stats prints rollup rows as aligned columns or CSV."""
+        rows = [
+            {"bucket": "2025-W05", "repo": "fedora", "events": 12},
+            {"bucket": "2025-W06", "repo": None, "events": 3},
+        ]
+        with (
+            patch("src.plogr.config.Config"),
+            patch("src.plogr.logger.PackageLogger") as mock_logger_class,
+        ):
+            mock_logger = MagicMock()
+            mock_logger.get_rollups.return_value = rows
+            mock_logger_class.return_value = mock_logger
+
+            result = self.runner.invoke(
+                cli, ["stats", "--by", "week", "--group-by", "repo", "--since", "2025-01-27"]
+            )
+
+            assert result.exit_code == 0
+            assert result.output.splitlines() == [
+                "BUCKET    REPO    EVENTS",
+                "2025-W05  fedora  12",
+                "2025-W06  -       3",
+            ]
+            mock_logger.get_rollups.assert_called_once_with(
+                by="week",
+                group_by=["repo"],
+                since=dt.date(2025, 1, 27),
+                until=None,
+                manager=None,
+                recompute=False,
+            )
+
+            result = self.runner.invoke(cli, ["stats", "--group-by", "repo", "--format", "csv"])
+            assert result.output == "bucket,repo,events\n2025-W05,fedora,12\n2025-W06,,3\n"
+            assert mock_logger.get_rollups.call_args.kwargs["by"] == "month"
+
     def test_export_json_format(self):
         """Test export command with JSON format."""
         with patch("src.plogr.logger.PackageLogger") as mock_logger_class:
             mock_logger = MagicMock()
-            mock_logger.json_file = MagicMock()
-            mock_logger.json_file.read_text.return_value = '[{"name": "test"}]'
+            mock_logger.export_json.return_value = '[{"name": "test"}]'
             mock_logger_class.return_value = mock_logger
 
             result = self.runner.invoke(cli, ["export", "--format", "json", "--scope", "user"])
@@ -137,6 +220,145 @@ class TestCLI:
             assert result.exit_code == 0
             assert "# Test package" in result.output
 
+    def test_compact(self):
+        """Test compact command reports merged segments."""
+        with patch("src.plogr.logger.PackageLogger") as mock_logger_class:
+            mock_logger = MagicMock()
+            mock_logger.compact.return_value = 3
+            mock_logger.data_dir = "/tmp/test"
+            mock_logger_class.return_value = mock_logger
+
+            result = self.runner.invoke(cli, ["compact", "--scope", "user"])
+
+            assert result.exit_code == 0
+            assert "Compacted 3 segment file(s)" in result.output
+            mock_logger.compact.assert_called_once()
+
+    def test_query_since_until(self):
+        """Test query passes --since/--until as dates or datetimes."""
+        with (
+            patch("src.plogr.config.Config"),
+            patch("src.plogr.logger.PackageLogger") as mock_logger_class,
+        ):
+            mock_logger = MagicMock()
+            mock_logger.stream.return_value = (r for r in [("c1", {"name": "htop"})])
+            mock_logger_class.return_value = mock_logger
+
+            result = self.runner.invoke(
+                cli, ["query", "--since", "2025-01-31", "--until", "2025-02-01T12:30"]
+            )
+
+            assert result.exit_code == 0
+            assert '"htop"' in result.output
+            mock_logger.stream.assert_called_once_with(
+                name=None,
+                manager=None,
+                since=dt.date(2025, 1, 31),
+                until=dt.datetime(2025, 2, 1, 12, 30),
+                action=None,
+                removed=None,
+                metadata={},
+                after=None,
+            )
+
+    def test_query_rejects_bad_dates(self):
+        """Test query rejects unparseable dates and --days combined with --since."""
+        with patch("src.plogr.config.Config"), patch("src.plogr.logger.PackageLogger"):
+            result = self.runner.invoke(cli, ["query", "--since", "last week"])
+            assert result.exit_code != 0
+            assert "Invalid value for '--since'" in result.output
+
+            result = self.runner.invoke(cli, ["query", "--days", "3", "--since", "2025-01-01"])
+            assert result.exit_code != 0
+            assert "cannot be combined" in result.output
+
+    def test_query_ndjson_limit_prints_cursor(self):
+        """Test query --limit stops early and reports where to resume."""
+        records = [(f"c{i}", {"name": f"pkg{i}", "version": "1"}) for i in range(5)]
+        with (
+            patch("src.plogr.config.Config"),
+            patch("src.plogr.logger.PackageLogger") as mock_logger_class,
+        ):
+            mock_logger = MagicMock()
+            mock_logger.stream.return_value = (r for r in records)
+            mock_logger_class.return_value = mock_logger
+
+            result = self.runner.invoke(
+                cli,
+                ["query", "--format", "ndjson", "--limit", "2", "--fields", "name", "--after", "x"],
+            )
+
+            assert result.exit_code == 0
+            assert result.stdout == '{"name":"pkg0"}\n{"name":"pkg1"}\n'
+            assert "continue with --after c1" in result.stderr
+            assert mock_logger.stream.call_args.kwargs["after"] == "x"
+
+    def test_query_rejects_foreign_cursor(self):
+        """Test query reports a cursor from another log as a bad --after value."""
+        from src.plogr.exceptions import CursorError
+
+        with (
+            patch("src.plogr.config.Config"),
+            patch("src.plogr.logger.PackageLogger") as mock_logger_class,
+        ):
+            mock_logger_class.return_value.stream.side_effect = CursorError("nope")
+
+            result = self.runner.invoke(cli, ["query", "--after", "abc"])
+
+            assert result.exit_code != 0
+            assert "Invalid value for '--after'" in result.output
+
+    def test_query_filters_and_explain(self):
+        """Test query passes --action/--removed/--meta and --explain prints the plan."""
+        with (
+            patch("src.plogr.config.Config"),
+            patch("src.plogr.logger.PackageLogger") as mock_logger_class,
+        ):
+            mock_logger = MagicMock()
+            mock_logger.explain.return_value = {
+                "engine": "journal",
+                "plan": ["scan: manager is 'dnf', then metadata.repo is 'fedora'"],
+                "matched": 3,
+                "seconds": 0.0125,
+            }
+            mock_logger_class.return_value = mock_logger
+
+            result = self.runner.invoke(
+                cli,
+                ["query", "--action", "remove", "--removed", "--meta", "repo=fedora", "--explain"],
+            )
+
+            assert result.exit_code == 0
+            assert "Engine: journal" in result.output
+            assert "  scan: manager is 'dnf'" in result.output
+            assert "Matched 3 record(s) in 12.50 ms" in result.output
+            kwargs = mock_logger.explain.call_args.kwargs
+            assert kwargs["action"] == "remove"
+            assert kwargs["removed"] is True
+            assert kwargs["metadata"] == {"repo": "fedora"}
+            mock_logger.stream.assert_not_called()
+
+            result = self.runner.invoke(cli, ["query", "--meta", "repo"])
+            assert result.exit_code != 0
+            assert "expected KEY=VALUE" in result.output
+
+    def test_export_csv_streams_records(self):
+        """Test export --format csv writes a header and one row per record."""
+        with patch("src.plogr.logger.PackageLogger") as mock_logger_class:
+            mock_logger = MagicMock()
+            mock_logger.stream.return_value = (
+                r for r in [("c0", {"name": "htop", "removed": False})]
+            )
+            mock_logger_class.return_value = mock_logger
+
+            result = self.runner.invoke(
+                cli, ["export", "--format", "csv", "--fields", "name,removed", "--scope", "user"]
+            )
+
+            assert result.exit_code == 0
+            assert result.output == "name,removed\nhtop,false\n"
+            mock_logger.export_json.assert_not_called()
+
     def test_export_invalid_format(self):
         """Test export command with invalid format."""
         result = self.runner.invoke(cli, ["export", "--format", "invalid", "--scope", "user"])
@@ -0,0 +1,132 @@
+"""Unit tests for the columnar event table and storage engine"""
+
+import datetime as dt
+import json
+import tracemalloc
+
+from src.plogr.storage import ColumnarStore, EventTable, fold_events, open_store
+from src.plogr.storage.predicate import QueryFilters, record_plan
+from tests.conftest import make_event
+
+
+def _history():
+    return [
+        make_event(
+            "bash", date="2025-01-01T10:00:00", version="5.2-1.fc42", metadata={"arch": "x86_64"}
+        ),
+        make_event("vim", date="2025-01-02T10:00:00", metadata={"repo": "fedora", "epoch": 2}),
+        make_event("bash", "remove", date="2025-01-03T10:00:00"),
+        make_event("setup.rpm", date="2025-01-04T10:00:00+02:00", manager="download"),
+        make_event("orphan", "remove", date="2025-01-05T10:00:00.5", note="kept"),
+    ]
+
+
+class TestEventTable:
+    """Test encoding, filtering and materialization of the columnar table."""
+
+    def test_round_trips_folded_records(self):
+        """Rows decode to exactly what fold_events produces."""
+        table = EventTable.fold(_history())
+        assert list(table) == fold_events(_history())
+        assert len(table.pool) < 5 * len(table)
+
+    def test_matching_agrees_with_record_plan(self):
+        """Column filters agree with the dict-based query filters."""
+        records = fold_events(_history())
+        table = EventTable.fold(_history())
+        for filters in (
+            {"name": "BA"},
+            {"manager": "download"},
+            {"manager": "apt"},
+            {"since": dt.date(2025, 1, 3)},
+            {"name": "o", "since": dt.date(2025, 1, 4)},
+        ):
+            test = record_plan(QueryFilters(**filters)).test
+            rows = table.matching(QueryFilters(**filters))
+            assert [table.record(row) for row in rows] == [r for r in records if test(r)]
+
+    def test_save_and_load(self, tmp_path):
+        """The on-disk form restores the same rows and string pool."""
+        table = EventTable.fold(_history())
+        table.save(tmp_path / "t.cols", {"note": 1})
+        loaded, header = EventTable.load(tmp_path / "t.cols")
+        assert list(loaded) == list(table)
+        assert header["note"] == 1
+
+    def test_memory_is_an_order_of_magnitude_smaller(self):
+        """A typical history takes a tenth of the memory of a list of dicts."""
+        events = [
+            make_event(
+                f"pkg{i % 1500}",
+                date=f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}T{i % 24:02d}:00:00",
+                version=f"1.{i % 30}-1.fc42",
+                metadata={"arch": "x86_64", "repo": "fedora"},
+            )
+            for i in range(10000)
+        ]
+        # Measure what a reader holds after parsing the log from disk.
+        lines = [json.dumps(e) for e in events]
+
+        tracemalloc.start()
+        records = fold_events(json.loads(line) for line in lines)
+        as_dicts = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del records
+
+        tracemalloc.start()
+        table = EventTable.fold(json.loads(line) for line in lines)
+        as_columns = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        assert len(table) == 10000
+        assert as_columns * 10 < as_dicts
+
+
+class TestColumnarStore:
+    """Test the columnar snapshot engine."""
+
+    def test_open_store_selects_columnar(self, tmp_path):
+        """The engine is picked from the log_format setting."""
+        store = open_store("columnar", tmp_path)
+        assert isinstance(store, ColumnarStore)
+        assert store.path == tmp_path / "packages.cols"
+
+    def test_reads_span_snapshot_and_tail(self, tmp_path):
+        """Removals in the tail close installs already folded into the snapshot."""
+        store = ColumnarStore(tmp_path)
+        store.ensure()
+        store.append_many(_history()[:2])
+        assert store.compact() == 1
+        assert not store.wal.exists()
+        store.append_many(_history()[2:])
+
+        assert store.load() == fold_events(_history())
+        assert store.summary(recompute=True).totals["removed"] == 2
+        assert [r["name"] for r in store.query(manager="download")] == ["setup.rpm"]
+
+    def test_tail_is_folded_when_large(self, tmp_path):
+        """The tail is checkpointed automatically once it reaches the size limit."""
+        store = ColumnarStore(tmp_path, checkpoint_bytes=1)
+        store.ensure()
+        for entry in _history():
+            store.append(entry)
+        assert not store.wal.exists()
+        assert store.load() == fold_events(_history())
+
+    def test_interrupted_checkpoint_is_not_replayed(self, tmp_path):
+        """A tail the snapshot already absorbed is skipped, then cleaned up."""
+        store = ColumnarStore(tmp_path)
+        store.ensure()
+        store.append_many(_history())
+        store.wal.rename(store.sealed_wal)
+        store._save(store.load_table(), {"sealed_wal": list(_stamp(store.sealed_wal))})
+
+        assert store.load() == fold_events(_history())
+        assert store.compact() == 1
+        assert not store.sealed_wal.exists()
+        assert store.load() == fold_events(_history())
+
+
+def _stamp(path):
+    st = path.stat()
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
@@ -0,0 +1,165 @@
+"""Unit tests for idempotency keys and duplicate rejection"""
+
+from unittest.mock import MagicMock, patch
+
+from click.testing import CliRunner
+
+from src.plogr.cli import cli
+from src.plogr.models import idempotency_key, nevra
+from src.plogr.storage import dedup
+from src.plogr.storage.dedup import BloomFilter, DuplicateFilter
+from tests.conftest import make_event
+
+
+class TestKeys:
+    """Test key derivation."""
+
+    def test_nevra(self):
+        """Epoch 0 is left out like rpm does."""
+        assert nevra("bash", "5.2-1.fc42", 0, "x86_64") == "bash-5.2-1.fc42.x86_64"
+        assert nevra("perl", "5.40-1", "4", "noarch") == "perl-4:5.40-1.noarch"
+        assert nevra("tool") == "tool"
+
+    def test_key_covers_every_part(self):
+        """Transaction, package, action and timestamp all distinguish keys."""
+        base = idempotency_key("42", "bash-5.2-1.x86_64", "install", "1700000000")
+        assert base == idempotency_key("42", "bash-5.2-1.x86_64", "install", "1700000000")
+        assert base != idempotency_key("43", "bash-5.2-1.x86_64", "install", "1700000000")
+        assert base != idempotency_key("42", "bash-5.3-1.x86_64", "install", "1700000000")
+        assert base != idempotency_key("42", "bash-5.2-1.x86_64", "remove", "1700000000")
+        assert base != idempotency_key("42", "bash-5.2-1.x86_64", "install", "1700000001")
+
+
+class TestBloomFilter:
+    """Test the memory-mapped Bloom filter."""
+
+    def test_membership_survives_reopen(self, tmp_path):
+        """Keys added in place are found by the next process."""
+        path = tmp_path / "keys.bloom"
+        BloomFilter.create(path, 1000, ["a", "b"], 0o600).close()
+        bloom = BloomFilter(path)
+        bloom.add(["c"])
+        bloom.close()
+
+        bloom = BloomFilter(path)
+        assert all(key in bloom for key in "abc")
+        assert bloom.count == 3
+        bloom.close()
+
+    def test_false_positive_rate(self, tmp_path):
+        """A filter at capacity stays near its design rate of 1%."""
+        bloom = BloomFilter.create(
+            tmp_path / "keys.bloom", 2000, (f"in-{i}" for i in range(2000)), 0o600
+        )
+        false_positives = sum(f"out-{i}" in bloom for i in range(2000))
+        bloom.close()
+        assert false_positives < 60
+
+
+class TestDuplicateFilter:
+    """Test the Bloom filter and exact set together."""
+
+    def _accept(self, keys_filter, entries):
+        fresh, keys, rejected = keys_filter.screen(entries)
+        keys_filter.record(keys, rejected)
+        return fresh
+
+    def test_rejects_across_processes_and_within_batch(self, tmp_path):
+        """A key is accepted once, whoever submits it."""
+        first = DuplicateFilter(tmp_path / "packages.json")
+        assert (
+            len(
+                self._accept(
+                    first,
+                    [make_event("a", idempotency_key="k1"), make_event("a", idempotency_key="k1")],
+                )
+            )
+            == 1
+        )
+        second = DuplicateFilter(tmp_path / "packages.json")
+        assert self._accept(
+            second, [make_event("a", idempotency_key="k1"), make_event("b", idempotency_key="k2")]
+        ) == [make_event("b", idempotency_key="k2")]
+        assert second.rejected() == 2
+
+    def test_unkeyed_entries_touch_nothing(self, tmp_path):
+        """Events without a key are always written and create no files."""
+        keys_filter = DuplicateFilter(tmp_path / "packages.json")
+        assert len(self._accept(keys_filter, [make_event("a"), make_event("a")])) == 2
+        assert not keys_filter.path.exists()
+
+    def test_false_positive_falls_back_to_exact_set(self, tmp_path):
+        """A key the filter wrongly claims to know is still accepted."""
+        keys_filter = DuplicateFilter(tmp_path / "packages.json")
+        self._accept(keys_filter, [make_event("a", idempotency_key="k1")])
+        with patch.object(BloomFilter, "__contains__", return_value=True):
+            assert len(self._accept(keys_filter, [make_event("b", idempotency_key="k2")])) == 1
+
+    def test_lost_filter_is_rebuilt(self, tmp_path):
+        """Deleting the filter never lets a duplicate through."""
+        keys_filter = DuplicateFilter(tmp_path / "packages.json")
+        self._accept(keys_filter, [make_event("a", idempotency_key="k1")])
+        keys_filter.bloom_path.unlink()
+        assert self._accept(keys_filter, [make_event("a", idempotency_key="k1")]) == []
+        assert keys_filter.bloom_path.exists()
+
+    def test_full_filter_grows(self, tmp_path, monkeypatch):
+        """The filter is rebuilt larger before it passes its capacity."""
+        monkeypatch.setattr(dedup, "DEFAULT_CAPACITY", 4)
+        keys_filter = DuplicateFilter(tmp_path / "packages.json")
+        for i in range(10):
+            self._accept(keys_filter, [make_event("a", idempotency_key=f"k{i}")])
+        bloom = BloomFilter(keys_filter.bloom_path)
+        assert bloom.capacity >= 10
+        assert all(f"k{i}" in bloom for i in range(10))
+        bloom.close()
+
+
+def test_store_rejects_resubmission(store):
+    """Every engine drops a retried batch without changing the log or its counters."""
+    batch = [make_event("a", idempotency_key="k1"), make_event("b", idempotency_key="k2")]
+    assert store.append_many(batch) == 2
+    before = store.summary().statistics()
+
+    assert store.append_many(batch) == 0
+    assert store.append_many([*batch, make_event("c", idempotency_key="k3")]) == 1
+    assert [r["name"] for r in store.load()] == ["a", "b", "c"]
+    assert store.summary(recompute=True).statistics()["total"] == before["total"] + 1
+    assert store.duplicates.rejected() == 4
+
+
+def test_logger_reports_rejections(tmp_path):
+    """Repeated hook calls for one transaction are logged once and counted."""
+    from src.plogr.config import Config
+    from src.plogr.logger import PackageLogger
+
+    with patch("pathlib.Path.home", return_value=tmp_path):
+        cfg = Config()
+        cfg.set("scope", "user")
+        logger = PackageLogger(cfg)
+        assert logger.log_package("bash", "dnf", "install", "5.2-1", transaction_id="7")
+        assert not logger.log_package("bash", "dnf", "install", "5.2-1", transaction_id="7")
+        # Without a transaction id nothing tells a retry from a reinstall.
+        assert logger.log_package("bash", "dnf", "install", "5.2-1")
+
+        stats = logger.get_statistics()
+        assert stats["total"] == 2
+        assert stats["duplicates_rejected"] == 1
+
+
+def test_cli_reports_skipped_duplicate():
+    """`plogr install --transaction-id` says when a submission was a duplicate."""
+    with patch("src.plogr.logger.PackageLogger") as mock_logger_class:
+        mock_logger = MagicMock()
+        mock_logger.log_package.return_value = False
+        mock_logger_class.return_value = mock_logger
+
+        result = CliRunner().invoke(
+            cli, ["install", "bash", "dnf", "--scope", "user", "--transaction-id", "7"]
+        )
+
+    assert result.exit_code == 0
+    mock_logger.log_package.assert_called_once_with(
+        "bash", "dnf", "install", transaction_id="7", timestamp=None
+    )
+    assert "Skipped install of 'bash': already logged for transaction 7." in result.output
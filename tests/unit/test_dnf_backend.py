@@ -102,7 +102,7 @@ class TestDnfBackend:
             backend = DnfBackend()
             # Create a mock logger with the expected method
             mock_logger = MagicMock()
-            mock_logger.log_package = MagicMock()
+            mock_logger.log_packages = MagicMock()
             backend.logger = mock_logger
 
             # Mock transaction object
@@ -113,7 +113,10 @@ class TestDnfBackend:
             result = backend.register_transaction(transaction)
 
             assert result is True
-            assert mock_logger.log_package.call_count == 2
+            # The whole transaction is logged as a single batch
+            mock_logger.log_packages.assert_called_once()
+            events = mock_logger.log_packages.call_args[0][0]
+            assert [e["action"] for e in events] == ["install", "remove"]
 
     def test_register_transaction_no_logger(self):
         """Test transaction registration without logger."""
@@ -169,7 +169,7 @@ class TestDownloadsEventHandler:
             ):
                 handler.on_created(mock_event)
 
-            mock_logger.log_package.assert_called_once_with(
+            mock_logger.submit_package.assert_called_once_with(
                 "test.rpm",
                 "download",
                 "install",
@@ -195,8 +195,8 @@ class TestDownloadsEventHandler:
 
         handler.on_created(mock_event)
 
-        # Should not call log_package for directories
-        mock_logger.log_package.assert_not_called()
+        # Should not call submit_package for directories
+        mock_logger.submit_package.assert_not_called()
 
     def test_on_created_non_package_file(self):
         """Test on_created with a non-package file."""
@@ -223,8 +223,8 @@ class TestDownloadsEventHandler:
             ):
                 handler.on_created(mock_event)
 
-            # Should not call log_package for non-package files
-            mock_logger.log_package.assert_not_called()
+            # Should not call submit_package for non-package files
+            mock_logger.submit_package.assert_not_called()
 
     def test_on_created_package_files(self):
         """Test on_created with various package file types."""
@@ -237,7 +237,7 @@ class TestDownloadsEventHandler:
         package_extensions = [".rpm", ".deb", ".pkg", ".exe", ".msi", ".dmg"]
 
         for ext in package_extensions:
-            mock_logger.log_package.reset_mock()
+            mock_logger.submit_package.reset_mock()
 
             # Mock event
             mock_event = MagicMock()
@@ -259,7 +259,7 @@ class TestDownloadsEventHandler:
                 ):
                     handler.on_created(mock_event)
 
-                mock_logger.log_package.assert_called_once_with(
+                mock_logger.submit_package.assert_called_once_with(
                     f"test{ext}",
                     "download",
                     "install",
@@ -334,8 +334,8 @@ class TestDownloadsEventHandler:
                 # Should log a warning about the stat error
                 mock_logger_module.warning.assert_called_once()
 
-                # Should still call log_package with file_size=0
-                mock_logger.log_package.assert_called_once_with(
+                # Should still call submit_package with file_size=0
+                mock_logger.submit_package.assert_called_once_with(
                     "test.rpm",
                     "download",
                     "install",
@@ -0,0 +1,127 @@
+"""Unit tests for the storage durability modes"""
+
+import threading
+import weakref
+from unittest.mock import patch
+
+from src.plogr.storage import JournalStore, JsonArrayStore, SqliteStore
+from src.plogr.storage import durability
+from src.plogr.storage.durability import SyncPolicy
+from tests.conftest import make_event
+
+
+class TestSyncPolicy:
+    """Test when the policy issues fsync calls."""
+
+    def test_always_syncs_every_commit(self, tmp_path):
+        """Files and directories are synced before committed() returns."""
+        path = tmp_path / "log"
+        path.write_text("x")
+        policy = SyncPolicy("always")
+        with patch("src.plogr.storage.durability.os.fsync") as fsync:
+            policy.committed(files=[path], dirs=[tmp_path])
+            policy.committed(files=[path])
+        assert fsync.call_count == 3
+
+    def test_none_never_syncs(self, tmp_path):
+        """Write-back is left entirely to the kernel."""
+        policy = SyncPolicy("none")
+        with patch("src.plogr.storage.durability.os.fsync") as fsync:
+            policy.committed(files=[tmp_path / "log"], dirs=[tmp_path])
+            policy.flush()
+        fsync.assert_not_called()
+
+    def test_batch_coalesces_until_event_bound(self, tmp_path):
+        """Many commits to the same file share one fsync of it and its directory."""
+        path = tmp_path / "log"
+        path.write_text("x")
+        policy = SyncPolicy("batch", batch_events=10, batch_delay=60)
+        with patch("src.plogr.storage.durability.os.fsync") as fsync:
+            for _ in range(9):
+                policy.committed(files=[path], dirs=[tmp_path])
+            assert fsync.call_count == 0
+            policy.committed(files=[path], dirs=[tmp_path])
+            assert fsync.call_count == 2
+            policy.flush()
+            assert fsync.call_count == 2
+
+    def test_batch_timer_bounds_delay(self, tmp_path):
+        """A quiet period never leaves writes unsynced for longer than the delay."""
+        path = tmp_path / "log"
+        path.write_text("x")
+        policy = SyncPolicy("batch", batch_events=1000, batch_delay=0.05)
+        synced = threading.Event()
+        with patch("src.plogr.storage.durability.os.fsync", side_effect=lambda fd: synced.set()):
+            policy.committed(files=[path])
+            assert synced.wait(2)
+
+    def test_exit_flushes_only_pending_policies(self, tmp_path):
+        """Synced policies are not held for the exit flush; pending ones are synced."""
+        path = tmp_path / "log"
+        path.write_text("x")
+        idle = weakref.ref(SyncPolicy("batch"))
+        policy = SyncPolicy("batch", batch_events=1000, batch_delay=60)
+        with patch.object(durability, "_pending", set()):
+            with patch("src.plogr.storage.durability.os.fsync") as fsync:
+                policy.committed(files=[path])
+                assert durability._pending == {policy}
+                durability._flush_pending()
+            assert not durability._pending
+        assert idle() is None
+        assert fsync.call_count == 1
+
+    def test_unknown_mode_falls_back(self, caplog):
+        """Typos in the setting keep the default rather than disabling logging."""
+        caplog.set_level("WARNING")
+        assert SyncPolicy("sometimes").mode == "batch"
+        assert "Unknown durability" in caplog.text
+
+
+class TestStoreDurability:
+    """Test that the engines route their writes through the policy."""
+
+    def test_json_append_batches_fsync(self, tmp_path):
+        """Appends to the JSON array are synced like journal appends."""
+        store = JsonArrayStore(tmp_path, durability=SyncPolicy("batch", batch_events=1000))
+        store.ensure()
+        with patch("src.plogr.storage.durability.os.fsync") as fsync:
+            store.append(make_event("pkg"))
+            store.append(make_event("pkg", "remove"))
+            assert fsync.call_count == 0
+            store.sync()
+            assert fsync.call_count == 1
+
+        store = JsonArrayStore(tmp_path, durability=SyncPolicy("none"))
+        with patch("src.plogr.storage.durability.os.fsync") as fsync:
+            store.append(make_event("pkg2"))
+            store.sync()
+        fsync.assert_not_called()
+
+    def test_journal_batch_defers_fsync(self, tmp_path):
+        """Appends in batch mode are synced together on flush."""
+        store = JournalStore(tmp_path, durability=SyncPolicy("batch", batch_events=1000))
+        store.ensure()
+        with patch("src.plogr.storage.durability.os.fsync") as fsync:
+            for name in ("a", "b", "c"):
+                store.append(make_event(name))
+            assert fsync.call_count == 0
+            store.sync()
+            assert fsync.call_count == 1
+        assert [r["name"] for r in store.load()] == ["a", "b", "c"]
+
+    def test_journal_always_syncs_each_append(self, tmp_path):
+        """Every append is durable once it returns."""
+        store = JournalStore(tmp_path, durability=SyncPolicy("always"))
+        store.ensure()
+        with patch("src.plogr.storage.durability.os.fsync") as fsync:
+            store.append(make_event("a"))
+            store.append(make_event("b"))
+        assert fsync.call_count == 2
+
+    def test_sqlite_maps_modes_to_synchronous(self, tmp_path):
+        """SQLite's own group commit backs batch mode."""
+        for mode, expected in (("none", 0), ("batch", 1), ("always", 2)):
+            store = SqliteStore(tmp_path, durability=SyncPolicy(mode))
+            store.ensure()
+            with store._connect() as conn:
+                assert conn.execute("PRAGMA synchronous").fetchone()[0] == expected
@@ -0,0 +1,123 @@
+"""Unit tests for removals stored as events and folded at read time"""
+
+import json
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+from src.plogr.storage import JsonArrayStore, SqliteStore, fold_events
+from src.plogr.storage.index import OpenInstallIndex
+from tests.conftest import make_event
+
+EVENTS = [
+    make_event("a", date="2025-01-01T00:00:00"),
+    make_event("b", date="2025-01-02T00:00:00"),
+    make_event("a", date="2025-01-03T00:00:00"),
+    make_event("a", "remove", date="2025-01-04T00:00:00"),
+    make_event("c", "remove", date="2025-01-05T00:00:00"),
+    make_event("b", "remove", date="2025-01-06T00:00:00"),
+    make_event("b", date="2025-01-07T00:00:00"),
+]
+
+
+def test_engines_fold_the_same_records(store):
+    """Every engine presents the stored events as the records fold_events derives."""
+    store.append_many(EVENTS[:3])
+    for event in EVENTS[3:]:
+        store.append(event)
+    assert store.load() == fold_events(EVENTS)
+
+
+class TestJsonArrayEvents:
+    """Test the append-only JSON array."""
+
+    def _store(self, tmp_path, events=EVENTS):
+        store = JsonArrayStore(tmp_path)
+        store.ensure()
+        store.append_many(events)
+        return store
+
+    def test_history_is_kept_verbatim(self, tmp_path):
+        """The file holds every event as written, laid out like json.dumps(indent=2)."""
+        store = self._store(tmp_path)
+        assert store.path.read_text() == json.dumps(EVENTS, indent=2)
+
+    def test_appends_keep_the_file(self, tmp_path):
+        """Writes extend packages.json in place instead of replacing it."""
+        store = self._store(tmp_path, EVENTS[:1])
+        inode = store.path.stat().st_ino
+        store.append(EVENTS[1])
+        assert store.path.stat().st_ino == inode
+        assert json.loads(store.path.read_text()) == EVENTS[:2]
+
+    def test_reads_without_index(self, tmp_path):
+        """Readers derive the closures themselves when the index is missing."""
+        store = self._store(tmp_path)
+        store.open_index.path.unlink()
+        reader = JsonArrayStore(tmp_path)
+        assert reader.load() == fold_events(EVENTS)
+        assert not reader.open_index.path.exists()
+
+    def test_appends_touch_only_named_packages(self, tmp_path):
+        """An append reads the open installs of the packages it names, not every closure."""
+        store = self._store(
+            tmp_path, [make_event(f"p{i}", date="2025-01-01T00:00:00") for i in range(50)]
+        )
+        store.append(make_event("p7", "remove", date="2025-01-02T00:00:00"))
+        store.open_index.stamp = None
+        with patch.object(OpenInstallIndex, "closed", property(lambda _: pytest.fail("read"))):
+            store.append_many(
+                [
+                    make_event("p8", "remove", date="2025-01-03T00:00:00"),
+                    make_event("p9", date="2025-01-03T00:00:00"),
+                ]
+            )
+        assert store.open_index.open_positions("dnf", "p9") == [9, 52]
+        assert sorted(store.open_index.closed) == [7, 8]
+
+    def test_records_closed_in_place_are_kept(self, tmp_path):
+        """Elements an older release closed in place neither open nor close anything."""
+        closed = dict(EVENTS[0], action="remove", removed=True, date_removed="2025-01-02T00:00:00")
+        store = JsonArrayStore(tmp_path)
+        store.path.write_text(json.dumps([EVENTS[2], closed], indent=2))
+        store.append(make_event("a", "remove", date="2025-01-09T00:00:00"))
+
+        records = store.load()
+        assert records[0]["date_removed"] == "2025-01-09T00:00:00"
+        assert records[1] == closed
+
+    def test_torn_append_is_repaired(self, tmp_path):
+        """An append cut off before the closing bracket is dropped on recovery."""
+        store = self._store(tmp_path)
+        intact = store.path.read_bytes()
+        store.path.write_bytes(intact[:-2] + b',\n  {\n    "name": "d",')
+
+        assert store.recover() > 0
+        assert store.path.read_bytes() == intact
+        store.append(make_event("d", date="2025-01-08T00:00:00"))
+        assert store.load() == fold_events(EVENTS + [make_event("d", date="2025-01-08T00:00:00")])
+
+    def test_compact_array_is_accepted(self, tmp_path):
+        """A hand-edited array on one line is left alone and appended to."""
+        store = JsonArrayStore(tmp_path)
+        store.path.write_text(json.dumps(EVENTS[:2]))
+        assert store.recover() == 0
+        store.append(EVENTS[2])
+        assert json.loads(store.path.read_text()) == EVENTS[:3]
+
+
+class TestSqliteEvents:
+    """Test the insert-only SQLite tables."""
+
+    def test_removal_is_a_row(self, tmp_path):
+        """The install row is never updated; the closure pairs it with its removal."""
+        store = SqliteStore(tmp_path)
+        store.ensure()
+        store.append_many(EVENTS)
+        with sqlite3.connect(store.path) as conn:
+            rows = conn.execute("SELECT action, removed FROM events ORDER BY id").fetchall()
+            closures = conn.execute("SELECT install_id, removal_id FROM closures").fetchall()
+        assert rows == [(e["action"], int(e["removed"])) for e in EVENTS]
+        assert sorted(closures) == [(2, 6), (3, 4)]
+        assert store.summary(recompute=True).totals == {"total": 5, "installed": 2, "removed": 3}
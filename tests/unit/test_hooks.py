@@ -138,8 +138,8 @@ class TestDownloadsEventHandler:
 
             handler.on_created(mock_event)
 
-            mock_logger.log_package.assert_called_once()
-            call_args = mock_logger.log_package.call_args
+            mock_logger.submit_package.assert_called_once()
+            call_args = mock_logger.submit_package.call_args
 
             # Check positional arguments: name, manager, action
             assert call_args[0][1] == "download"  # manager
@@ -175,8 +175,8 @@ class TestDownloadsEventHandler:
 
             handler.on_created(mock_event)
 
-            mock_logger.log_package.assert_called_once()
-            call_args = mock_logger.log_package.call_args
+            mock_logger.submit_package.assert_called_once()
+            call_args = mock_logger.submit_package.call_args
 
             # Check that it's logged as a download
             assert call_args[0][1] == "download"  # manager
@@ -202,7 +202,7 @@ class TestDownloadsEventHandler:
 
         handler.on_created(mock_event)
 
-        mock_logger.log_package.assert_not_called()
+        mock_logger.submit_package.assert_not_called()
 
     def test_downloads_event_handler_non_package_file(self):
         """Test downloads event handler ignores non-package files."""
@@ -226,7 +226,7 @@ class TestDownloadsEventHandler:
 
             handler.on_created(mock_event)
 
-            mock_logger.log_package.assert_not_called()
+            mock_logger.submit_package.assert_not_called()
 
         finally:
             # Clean up
@@ -254,8 +254,8 @@ class TestDownloadsEventHandler:
 
             handler.on_created(mock_event)
 
-            mock_logger.log_package.assert_called_once()
-            call_args = mock_logger.log_package.call_args
+            mock_logger.submit_package.assert_called_once()
+            call_args = mock_logger.submit_package.call_args
 
             # Should normalize to lowercase
             assert call_args[1]["metadata"]["file_type"] == ".rpm"
@@ -281,8 +281,8 @@ class TestDownloadsEventHandler:
         handler.on_created(mock_event)
 
         # Should still log the package even if file stat fails
-        mock_logger.log_package.assert_called_once()
-        call_args = mock_logger.log_package.call_args
+        mock_logger.submit_package.assert_called_once()
+        call_args = mock_logger.submit_package.call_args
 
         # File size should be 0 when stat fails
         assert call_args[1]["metadata"]["file_size"] == 0
@@ -309,8 +309,8 @@ class TestDownloadsEventHandler:
 
             handler.on_created(mock_event)
 
-            mock_logger.log_package.assert_called_once()
-            call_args = mock_logger.log_package.call_args
+            mock_logger.submit_package.assert_called_once()
+            call_args = mock_logger.submit_package.call_args
 
             assert call_args[1]["metadata"]["file_type"] == ".snap"
 
@@ -391,6 +391,13 @@ class TestHooksIntegration:
             assert "plogr remove" in content
             assert "${pkg.name}" in content
 
+            # Every line that logs carries the keys that make a rerun a no-op.
+            for line in content.splitlines():
+                if "/usr/bin/plogr" in line:
+                    assert '--transaction-id "${pid}"' in line
+                    assert '--timestamp "${tmp.plogr_started}"' in line
+            assert "pre_transaction::::/usr/bin/date +tmp.plogr_started=%s" in content
+
 
 class TestWatchdogFallback:
     """Test watchdog fallback functionality."""
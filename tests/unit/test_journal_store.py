@@ -0,0 +1,340 @@
+"""Unit tests for the append-only journal storage engine"""
+
+import datetime as dt
+import json
+from unittest.mock import patch
+
+import pytest
+
+from src.plogr.config import Config
+from src.plogr.logger import PackageLogger
+from src.plogr.storage import JournalStore, QueryFilters, fold_events, journal, open_store
+from src.plogr.storage.predicate import record_plan
+from tests.conftest import make_event
+
+
+def _journal_logger(tmp_path) -> PackageLogger:
+    with patch("pathlib.Path.home", return_value=tmp_path):
+        config = Config()
+        config.set("scope", "user")
+        config.set("log_format", "journal")
+        return PackageLogger(config)
+
+
+class TestJournalStore:
+    """Test the JournalStore engine and its integration with PackageLogger."""
+
+    def test_open_store_selects_journal(self, tmp_path):
+        """The journal engine is picked from the log_format setting."""
+        store = open_store("journal", tmp_path)
+        assert isinstance(store, JournalStore)
+        assert store.path == tmp_path / "packages.jsonl"
+
+    def test_unknown_format_falls_back(self, tmp_path, caplog):
+        """Unknown formats warn and fall back to the JSON array engine."""
+        caplog.set_level("WARNING")
+        store = open_store("bogus", tmp_path)
+        assert store.name == "json"
+        assert "Unknown log_format" in caplog.text
+
+    def test_each_event_is_one_appended_line(self, tmp_path):
+        """Installs and removals are appended, never rewritten."""
+        logger = _journal_logger(tmp_path)
+        logger.log_package("pkg1", "dnf", "install")
+        logger.log_package("pkg1", "dnf", "remove")
+
+        lines = logger.store.path.read_text().splitlines()
+        assert [json.loads(line)["action"] for line in lines] == ["install", "remove"]
+        assert logger.json_file.exists() is False
+
+    def test_query_and_statistics_fold_removals(self, tmp_path):
+        """Readers see removals applied to the matching install record."""
+        logger = _journal_logger(tmp_path)
+        logger.log_package("pkg1", "dnf", "install")
+        logger.log_package("pkg2", "dnf", "install")
+        logger.log_package("pkg1", "dnf", "remove")
+        logger.log_package("orphan", "dnf", "remove")
+
+        records = logger.query(name="pkg1")
+        assert len(records) == 1
+        assert records[0]["removed"] is True
+        assert records[0]["action"] == "remove"
+        assert "date_removed" in records[0]
+
+        stats = logger.get_statistics()
+        assert stats["total"] == 3
+        assert stats["installed"] == 1
+        assert stats["removed"] == 2
+
+    def test_torn_line_is_skipped_and_next_append_recovers(self, tmp_path):
+        """A partial trailing line does not swallow the next event."""
+        logger = _journal_logger(tmp_path)
+        logger.log_package("pkg1", "dnf", "install")
+        with logger.store.path.open("a") as fp:
+            fp.write('{"name": "torn"')
+
+        logger.log_package("pkg2", "dnf", "install")
+
+        assert [r["name"] for r in logger.query()] == ["pkg1", "pkg2"]
+
+    def test_fold_matches_most_recent_open_install(self):
+        """Repeated installs are closed newest first, like the JSON upsert."""
+        events = [
+            {"name": "a", "manager": "dnf", "action": "install", "removed": False, "date": "1"},
+            {"name": "a", "manager": "dnf", "action": "install", "removed": False, "date": "2"},
+            {"name": "a", "manager": "dnf", "action": "remove", "removed": True, "date": "3"},
+            {"name": "a", "manager": "dnf", "action": "remove", "removed": True, "date": "4"},
+        ]
+        records = fold_events(events)
+        assert [(r["date"], r["date_removed"]) for r in records] == [("1", "4"), ("2", "3")]
+
+
+class TestJournalSegments:
+    """Test segment rotation and compaction."""
+
+    def test_month_change_seals_active_segment(self, tmp_path):
+        """Events from a later month start a new active segment."""
+        store = JournalStore(tmp_path)
+        store.ensure()
+        store.append_many(
+            [
+                make_event("a", date="2025-01-05T10:00:00"),
+                make_event("b", date="2025-01-20T10:00:00"),
+            ]
+        )
+        store.append_many([make_event("c", date="2025-02-01T10:00:00")])
+        # Skewed clocks never reopen an older month.
+        store.append_many([make_event("d", date="2025-01-31T23:00:00")])
+
+        assert [p.name for p in store.segment_files()] == ["2025-01.0001.jsonl"]
+        assert [json.loads(line)["name"] for line in store.path.read_text().splitlines()] == [
+            "c",
+            "d",
+        ]
+
+    def test_size_limit_seals_active_segment(self, tmp_path):
+        """A full active segment is sealed as another piece of the same month."""
+        store = JournalStore(tmp_path, segment_max_bytes=1)
+        store.ensure()
+        for name in ("a", "b", "c"):
+            store.append(make_event(name, date="2025-03-01T10:00:00"))
+
+        assert [p.name for p in store.segment_files()] == [
+            "2025-03.0001.jsonl",
+            "2025-03.0002.jsonl",
+        ]
+        assert [r["name"] for r in store.load()] == ["a", "b", "c"]
+
+    def test_removal_matches_install_in_sealed_segment(self, tmp_path):
+        """Replay spans sealed segments and the active one."""
+        store = JournalStore(tmp_path)
+        store.ensure()
+        store.append(make_event("a", date="2025-01-05T10:00:00"))
+        store.append(make_event("a", "remove", date="2025-02-05T10:00:00"))
+
+        records = store.load()
+        assert len(records) == 1
+        assert records[0]["date_removed"] == "2025-02-05T10:00:00"
+
+    def test_compact_merges_finished_months(self, tmp_path):
+        """Pieces of past months collapse into one file; the active month is untouched."""
+        store = JournalStore(tmp_path, segment_max_bytes=1)
+        store.ensure()
+        for name, date in [
+            ("a", "2025-01-01T00:00:00"),
+            ("b", "2025-01-02T00:00:00"),
+            ("c", "2025-02-01T00:00:00"),
+            ("d", "2025-02-02T00:00:00"),
+        ]:
+            store.append(make_event(name, date=date))
+        with (tmp_path / "segments" / "2025-01.0002.jsonl").open("a") as fp:
+            fp.write('{"torn"')
+
+        before = [r["name"] for r in store.load()]
+        assert store.compact() == 2
+        assert [p.name for p in store.segment_files()] == ["2025-01.jsonl", "2025-02.0001.jsonl"]
+        assert [r["name"] for r in store.load()] == before
+        assert store.compact() == 0
+
+    def test_merged_segment_supersedes_leftover_pieces(self, tmp_path):
+        """Pieces left behind by an interrupted compaction are ignored and cleaned up."""
+        store = JournalStore(tmp_path)
+        store.ensure()
+        store.append(make_event("a", date="2025-01-01T00:00:00"))
+        store.append(make_event("b", date="2025-02-01T00:00:00"))
+        piece = tmp_path / "segments" / "2025-01.0001.jsonl"
+        (tmp_path / "segments" / "2025-01.jsonl").write_text(piece.read_text())
+
+        assert [r["name"] for r in store.load()] == ["a", "b"]
+        assert store.compact() == 1
+        assert not piece.exists()
+        assert [r["name"] for r in store.load()] == ["a", "b"]
+
+
+def _pruning_store(tmp_path) -> JournalStore:
+    store = JournalStore(tmp_path)
+    store.ensure()
+    store.append_many(
+        [
+            make_event("old", date="2025-01-05T10:00:00"),
+            make_event("kept", date="2025-01-06T10:00:00"),
+            make_event("gone", date="2025-01-07T10:00:00"),
+        ]
+    )
+    store.append(make_event("gone", "remove", date="2025-02-03T10:00:00"))
+    store.append(make_event("new", date="2025-03-01T10:00:00"))
+    store.append(make_event("kept", "remove", date="2025-03-02T10:00:00"))
+    return store
+
+
+class TestJournalPruning:
+    """Test manifest-driven segment pruning for date-filtered queries."""
+
+    def test_iter_records_streams_segments(self, tmp_path):
+        """Iterating the records folds the segments as it reads them, without a table."""
+        store = _pruning_store(tmp_path)
+        with patch.object(JournalStore, "load_table", side_effect=AssertionError("table")):
+            records = store.iter_records()
+            first = next(records)
+            assert first["name"] == "old"
+            assert [first, *records] == fold_events(store.iter_raw())
+
+    def test_sealing_records_manifest_ranges(self, tmp_path):
+        """Each sealed segment gets its date range and event count."""
+        store = _pruning_store(tmp_path)
+        manifest = store.manifest.load()
+        segment = tmp_path / "segments" / "2025-01.0001.jsonl"
+        assert manifest[segment.name] == {
+            "min_date": "2025-01-05T10:00:00",
+            "max_date": "2025-01-07T10:00:00",
+            "count": 3,
+            "raw_bytes": segment.stat().st_size,
+            "rows": 3,
+        }
+        assert manifest["2025-02.0001.jsonl"]["count"] == 1
+
+    def test_since_skips_older_segments(self, tmp_path):
+        """Segments ending before ``since`` are never opened."""
+        store = _pruning_store(tmp_path)
+        opened = []
+        real_read = journal._read_segment
+
+        def tracking_read(path):
+            opened.append(path.name)
+            return real_read(path)
+
+        with patch.object(journal, "_read_segment", side_effect=tracking_read):
+            records = store.query(since=dt.date(2025, 3, 1))
+
+        assert "2025-01.0001.jsonl" not in opened
+        assert "2025-02.0001.jsonl" not in opened
+        # The removal of an install from a pruned segment is consumed, not orphaned.
+        assert [r["name"] for r in records] == ["new"]
+
+    def test_pruned_query_matches_full_replay(self, tmp_path):
+        """Pruning never changes the result of a date-filtered query."""
+        store = _pruning_store(tmp_path)
+        for since in (dt.date(2025, 1, 6), dt.date(2025, 2, 1), dt.date(2025, 2, 4)):
+            test = record_plan(QueryFilters(since=since)).test
+            expected = [record for record in store.load() if test(record)]
+            assert store.query(since=since) == expected
+
+    def test_missing_checkpoint_falls_back_to_full_scan(self, tmp_path):
+        """Without an open-install checkpoint every segment is replayed."""
+        store = _pruning_store(tmp_path)
+        store.manifest.drop_state("2025-02.0001.jsonl")
+        assert [r["name"] for r in store.query(since=dt.date(2025, 3, 1))] == ["new"]
+
+        store.manifest.path.unlink()
+        store.rebuild_manifest()
+        assert store.manifest.state_path("2025-02.0001.jsonl").exists()
+
+    def test_nothing_to_skip_uses_cached_table(self, tmp_path):
+        """A range that starts in the first segment is answered from the cached table."""
+        store = _pruning_store(tmp_path)
+        store.load_table()
+        with patch.object(journal, "_read_segment", side_effect=AssertionError("read")):
+            records = store.query(since=dt.date(2025, 1, 1))
+        test = record_plan(QueryFilters(since=dt.date(2025, 1, 1))).test
+        assert records == [record for record in store.load() if test(record)]
+
+    def test_explain_mentions_segments_only_for_ranges(self, tmp_path):
+        store = _pruning_store(tmp_path)
+        assert not any(line.startswith("segments:") for line in store.explain(QueryFilters()))
+        ranged = store.explain(QueryFilters(since=dt.date(2025, 3, 1)))
+        assert ranged[0] == "segments: skipped 3 record(s) sealed before the range"
+
+    def test_compaction_keeps_manifest_current(self, tmp_path):
+        """Merged month files inherit the range and checkpoint of their pieces."""
+        store = JournalStore(tmp_path, segment_max_bytes=1)
+        store.ensure()
+        store.append(make_event("a", date="2025-01-01T00:00:00"))
+        store.append(make_event("b", date="2025-01-02T00:00:00"))
+        store.append(make_event("c", date="2025-02-01T00:00:00"))
+        store.append(make_event("a", "remove", date="2025-02-02T00:00:00"))
+
+        assert store.compact() == 2
+        manifest = store.manifest.load()
+        assert set(manifest) == {"2025-01.jsonl", "2025-02.0001.jsonl"}
+        assert manifest["2025-01.jsonl"]["count"] == 2
+        assert not store.manifest.state_path("2025-01.0001.jsonl").exists()
+        assert [r["name"] for r in store.query(since=dt.date(2025, 2, 1))] == ["c"]
+
+
+class TestJournalCompression:
+    """Test compression of compacted journal segments."""
+
+    def _store(self, tmp_path, codec):
+        store = JournalStore(tmp_path, segment_max_bytes=1, compression=codec)
+        store.ensure()
+        for name, date in [
+            ("a", "2025-01-01T00:00:00"),
+            ("b", "2025-01-02T00:00:00"),
+            ("c", "2025-02-01T00:00:00"),
+        ]:
+            store.append(make_event(name, date=date))
+        store.append(make_event("a", "remove", date="2025-02-02T00:00:00"))
+        return store
+
+    @pytest.mark.parametrize("codec,suffix", [("gzip", ".gz"), ("bz2", ".bz2"), ("lzma", ".xz")])
+    def test_compact_writes_compressed_month(self, tmp_path, codec, suffix):
+        """Finished months are merged through the configured codec and stay readable."""
+        store = self._store(tmp_path, codec)
+        before = store.load()
+
+        assert store.compact() == 2
+        assert store.segment_files()[0].name == f"2025-01.jsonl{suffix}"
+        assert store.load() == before
+        assert [r["name"] for r in store.query(since=dt.date(2025, 2, 1))] == ["c"]
+
+    def test_changing_codec_recompresses_history(self, tmp_path):
+        """Existing merged months follow a later change of the compression setting."""
+        store = self._store(tmp_path, None)
+        store.compact()
+        assert store.segment_files()[0].name == "2025-01.jsonl"
+
+        store = JournalStore(tmp_path, compression="lzma")
+        assert store.compact() == 1
+        assert [p.name for p in store.segment_files()][0] == "2025-01.jsonl.xz"
+        assert not (tmp_path / "segments" / "2025-01.jsonl").exists()
+        assert [r["name"] for r in store.load()] == ["a", "b", "c"]
+
+    def test_space_usage_reports_savings(self, tmp_path):
+        """Uncompressed sizes come from the manifest, stored sizes from disk."""
+        store = JournalStore(tmp_path, segment_max_bytes=1, compression="gzip")
+        store.ensure()
+        for day in range(1, 29):
+            store.append(make_event(f"pkg{day}", date=f"2025-01-{day:02d}T00:00:00"))
+        store.append(make_event("late", date="2025-02-01T00:00:00"))
+        store.compact()
+
+        usage = store.space_usage()
+        assert usage["compressed_segments"] == 1
+        assert usage["raw_bytes"] > usage["stored_bytes"]
+
+    def test_unknown_codec_falls_back_to_plain(self, tmp_path, caplog):
+        """A typo in the compression setting never blocks logging."""
+        caplog.set_level("WARNING")
+        store = open_store("journal", tmp_path, settings={"compression": "zstd"})
+        assert store.compression is None
+        assert "Unknown compression" in caplog.text
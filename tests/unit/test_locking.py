@@ -0,0 +1,80 @@
+"""Unit tests for the shared-reader / exclusive-writer store locks"""
+
+import os
+import threading
+
+import pytest
+
+from src.plogr.storage import open_store
+from src.plogr.storage.locking import file_lock
+from tests.conftest import make_event
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="flock semantics")
+
+
+def _acquired(path, shared, timeout=0.2):
+    """Try to take the lock from another thread; report whether it was granted in time."""
+    got = threading.Event()
+    release = threading.Event()
+
+    def worker():
+        with file_lock(path, shared=shared):
+            got.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    granted = got.wait(timeout)
+    release.set()
+    if granted:
+        thread.join(5)
+    # Otherwise the thread finishes as soon as the caller releases its lock.
+    return granted
+
+
+class TestFileLock:
+    """Test lock modes on a dedicated lock file."""
+
+    def test_readers_do_not_block_each_other(self, tmp_path):
+        """Shared locks are granted while another reader holds one."""
+        path = tmp_path / "log.lock"
+        path.touch()
+        with file_lock(path, shared=True):
+            assert _acquired(path, shared=True)
+
+    def test_writer_excludes_readers(self, tmp_path):
+        """Readers wait while a writer holds the exclusive lock."""
+        path = tmp_path / "log.lock"
+        with file_lock(path):
+            assert not _acquired(path, shared=True)
+        assert _acquired(path, shared=True)
+
+    def test_reader_without_lock_file_proceeds(self, tmp_path):
+        """A store nobody has written to yet has nothing to wait for."""
+        with file_lock(tmp_path / "missing.lock", shared=True):
+            pass
+        assert not (tmp_path / "missing.lock").exists()
+
+    def test_writer_creates_lock_file_with_mode(self, tmp_path):
+        """The lock file gets the store's mode, not the one the umask leaves."""
+        old = os.umask(0o077)
+        try:
+            with file_lock(tmp_path / "data.lock", file_mode=0o644):
+                pass
+        finally:
+            os.umask(old)
+        assert (tmp_path / "data.lock").stat().st_mode & 0o777 == 0o644
+
+
+def test_lock_file_survives_writes(tmp_path, log_format):
+    """Writers lock a file that is never replaced, whatever the engine does to its data."""
+    store = open_store(log_format, tmp_path, settings={"segment_max_bytes": 1})
+    store.ensure()
+    store.append(make_event("a"))
+    inode = store.lock_file.stat().st_ino
+    for name in ("b", "c"):
+        store.append(make_event(name))
+    store.compact()
+    assert store.lock_file.stat().st_ino == inode
+    with store.writing():
+        assert not _acquired(store.lock_file, shared=True)
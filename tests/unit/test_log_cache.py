@@ -0,0 +1,123 @@
+"""Unit tests for the process-wide parsed log cache"""
+
+import json
+from unittest.mock import patch
+
+from src.plogr.storage import (
+    ColumnarStore,
+    EventTable,
+    JournalStore,
+    JsonArrayStore,
+    ParsedLogCache,
+    fold_events,
+)
+from tests.conftest import make_event
+
+
+def _store(cls, tmp_path, **kwargs):
+    store = cls(tmp_path, **kwargs)
+    store.cache = ParsedLogCache()
+    store.ensure()
+    return store
+
+
+class TestParsedLogCache:
+    """Test hits, invalidation and the row bound."""
+
+    def test_unchanged_file_is_not_parsed_again(self, tmp_path):
+        """Repeated reads of the JSON array reuse the parsed table."""
+        store = _store(JsonArrayStore, tmp_path)
+        store.append_many([make_event("a"), make_event("b")])
+        assert len(store.query()) == 2
+
+        with patch("src.plogr.storage.json_array.iter_json_array") as parse:
+            assert len(store.query()) == 2
+            assert [r["name"] for r in store.query(name="b")] == ["b"]
+        parse.assert_not_called()
+        assert store.cache.stats.hits == 2
+
+    def test_write_invalidates(self, tmp_path):
+        """An append changes the size and mtime, so the next read parses again."""
+        store = _store(JsonArrayStore, tmp_path)
+        store.append(make_event("a"))
+        assert len(store.query()) == 1
+        store.append(make_event("a", "remove"))
+        assert [r["removed"] for r in store.query()] == [True]
+        assert store.cache.stats.misses == 2
+
+    def test_rows_are_bounded(self, tmp_path):
+        """Least recently used tables are evicted once the row bound is exceeded."""
+        cache = ParsedLogCache(max_events=3)
+        one = EventTable.from_records([make_event("a"), make_event("b")])
+        two = EventTable.from_records([make_event("c"), make_event("d")])
+        cache.lookup("one", 1, lambda: one)
+        cache.lookup("two", 1, lambda: two)
+        assert len(cache) == 1 and cache.rows == 2
+        assert cache.stats.evictions == 1
+
+        cache.lookup("big", 1, lambda: EventTable.from_records([make_event("x")] * 4))
+        assert cache.rows == 2
+
+
+class TestTailReads:
+    """Test that appends to the journal are folded without a full replay."""
+
+    def test_only_appended_lines_are_parsed(self, tmp_path):
+        """Removals in new lines close installs folded earlier."""
+        store = _store(JournalStore, tmp_path)
+        store.append_many([make_event("a"), make_event("b")])
+        first = store.load_table()
+        store.append_many([make_event("a", "remove"), make_event("c")])
+
+        table = store.load_table()
+        assert store.cache.stats.tail_reads == 1
+        assert list(table) == fold_events(store.iter_raw())
+        # The table handed out earlier is never changed underneath its reader.
+        assert len(first) == 2 and not first.columns["removed"][0]
+
+    def test_partial_line_waits_for_its_newline(self, tmp_path):
+        """A line still being written is picked up once it is complete."""
+        store = _store(JournalStore, tmp_path)
+        store.append(make_event("a"))
+        line = json.dumps(make_event("b")) + "\n"
+        with store.path.open("a") as fp:
+            fp.write(line[:10])
+        assert len(store.load_table()) == 1
+
+        with store.path.open("a") as fp:
+            fp.write(line[10:])
+        assert [r["name"] for r in store.load_table()] == ["a", "b"]
+        assert store.cache.stats.tail_reads == 1
+
+    def test_rewritten_file_is_reparsed(self, tmp_path):
+        """Contents replaced in place are not mistaken for an append."""
+        store = _store(JournalStore, tmp_path)
+        store.append(make_event("a"))
+        store.load_table()
+        with store.path.open("r+") as fp:
+            fp.write(json.dumps(make_event("z")) + "\n" + json.dumps(make_event("y")) + "\n")
+
+        assert [r["name"] for r in store.load_table()] == ["z", "y"]
+        assert store.cache.stats.tail_reads == 0
+
+    def test_sealing_rebuilds(self, tmp_path):
+        """A new sealed segment changes the head and forces a full fold."""
+        store = _store(JournalStore, tmp_path)
+        store.append(make_event("a", date="2025-01-01T00:00:00"))
+        store.load_table()
+        store.append(make_event("b", date="2025-02-01T00:00:00"))
+
+        assert [r["name"] for r in store.load_table()] == ["a", "b"]
+        assert store.cache.stats.misses == 2
+
+    def test_columnar_tail(self, tmp_path):
+        """The columnar engine folds tail appends onto the cached snapshot."""
+        store = _store(ColumnarStore, tmp_path)
+        store.append(make_event("a"))
+        store.compact()
+        store.append(make_event("b"))
+        assert len(store.load_table()) == 2
+        store.append(make_event("a", "remove"))
+
+        assert [r["name"] for r in store.query() if r["removed"]] == ["a"]
+        assert store.cache.stats.tail_reads == 1
@@ -3,6 +3,7 @@
 import json
 from unittest.mock import patch
 
+import pytest
 
 from src.plogr.logger import PackageLogger
 from src.plogr.config import Config
@@ -123,3 +124,55 @@ class TestPackageLogger:
             assert stats["removed"] == 1
             assert stats["downloads"] == 1
             assert stats["scope"] == "user"
+
+    def test_log_packages_single_commit(self, tmp_path):
+        """A batch is validated up front and written with one store call."""
+        with patch("pathlib.Path.home") as mock_home:
+            mock_home.return_value = tmp_path
+
+            config = Config()
+            config.set("scope", "user")
+            logger = PackageLogger(config)
+
+            events = [
+                {"name": "pkg1", "manager": "dnf", "action": "install", "version": "1.0-1"},
+                {"name": "", "manager": "dnf", "action": "install"},
+                {"name": "pkg2", "manager": "dnf", "action": "install"},
+            ]
+            with patch.object(
+                logger.store, "append_many", wraps=logger.store.append_many
+            ) as mock_append:
+                assert logger.log_packages(events) == 2
+
+            mock_append.assert_called_once()
+            data = json.loads(logger.json_file.read_text())
+            assert [e["name"] for e in data] == ["pkg1", "pkg2"]
+            assert data[0]["version"] == "1.0-1"
+
+    @pytest.mark.parametrize("log_format", ["both", "journal", "sqlite"])
+    def test_log_packages_matches_removals_within_batch(self, tmp_path, log_format):
+        """Removals close installs from earlier in the same batch."""
+        with patch("pathlib.Path.home") as mock_home:
+            mock_home.return_value = tmp_path
+
+            config = Config()
+            config.set("scope", "user")
+            config.set("log_format", log_format)
+            logger = PackageLogger(config)
+
+            logger.log_package("old", "dnf", "install")
+            logger.log_packages(
+                [
+                    {"name": "new", "manager": "dnf", "action": "install"},
+                    {"name": "new", "manager": "dnf", "action": "remove"},
+                    {"name": "old", "manager": "dnf", "action": "remove"},
+                    {"name": "ghost", "manager": "dnf", "action": "remove"},
+                ]
+            )
+
+            records = {r["name"]: r for r in logger.query()}
+            assert len(records) == 3
+            assert records["old"]["removed"] is True
+            assert records["new"]["removed"] is True
+            assert records["new"]["action"] == "remove"
+            assert records["ghost"]["removed"] is True
@@ -0,0 +1,172 @@
+"""Unit tests for the streaming migration between storage engines"""
+
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+from click.testing import CliRunner
+
+from src.plogr.cli import cli
+from src.plogr.storage import fold_events, open_store
+from src.plogr.storage.layout import FORMAT_FILE, read_format
+from src.plogr.storage.migration import CHECKPOINT_FILE, Migration, MigrationError, unfold
+from tests.conftest import make_event
+
+EVENTS = [
+    make_event("a", date="2025-01-01T00:00:00"),
+    make_event("b", date="2025-01-02T00:00:00"),
+    make_event("a", "remove", date="2025-01-03T00:00:00"),
+    make_event("a", date="2025-01-04T00:00:00"),
+    make_event("c", "remove", date="2025-01-05T00:00:00"),
+    make_event("b", "remove", date="2025-01-06T00:00:00"),
+    make_event("d", date="2025-01-07T00:00:00", manager="pip"),
+    make_event("a", "remove", date="2025-01-08T00:00:00"),
+]
+
+
+def _json_store(tmp_path, events=EVENTS):
+    store = open_store("json", tmp_path)
+    store.ensure()
+    store.append_many(events)
+    return store
+
+
+class TestUnfold:
+    """Test turning folded records back into raw events."""
+
+    def test_round_trip(self):
+        """Replaying the unfolded events folds back to the same records."""
+        records = fold_events(EVENTS)
+        assert fold_events(unfold(records)) == records
+
+    def test_removal_precedes_reinstall(self):
+        """A removal dated after a reinstall is still emitted before it."""
+        records = fold_events(EVENTS)
+        records[0]["date_removed"] = "2025-02-01T00:00:00"
+        events = list(unfold(records))
+        removal = next(i for i, e in enumerate(events) if e["action"] == "remove")
+        reinstall = [i for i, e in enumerate(events) if e["name"] == "a"][-1]
+        assert removal < reinstall
+        assert fold_events(events) == records
+
+
+@pytest.mark.parametrize("target", ["journal", "sqlite", "columnar"])
+def test_migration_preserves_log(tmp_path, target):
+    """Every engine ends up with the records and counters of the JSON log."""
+    source = _json_store(tmp_path)
+    report = Migration(source, target, batch_size=3).run()
+
+    migrated = open_store(target, tmp_path)
+    assert migrated.load() == source.load()
+    assert migrated.summary().statistics() == source.summary().statistics()
+    assert report.records == len(source.load())
+    assert report.events == len(list(unfold(source.load())))
+    assert read_format(tmp_path) == {
+        "version": 1,
+        "log_format": target,
+        "migrated_from": "json",
+    }
+    assert not (tmp_path / CHECKPOINT_FILE).exists()
+    assert not (tmp_path / f".migrate-{target}").exists()
+
+
+class TestMigrationResume:
+    """Test checkpoints of an interrupted migration."""
+
+    def _interrupt(self, source, target):
+        migration = Migration(source, target, batch_size=2)
+        calls = []
+        original = type(open_store(target, source.data_dir)).append_many
+
+        def failing(store, events):
+            if calls:
+                raise KeyboardInterrupt
+            calls.append(len(events))
+            return original(store, events)
+
+        with patch.object(type(open_store(target, source.data_dir)), "append_many", failing):
+            with pytest.raises(KeyboardInterrupt):
+                migration.run()
+
+    def test_resumes_after_last_batch(self, tmp_path):
+        """A second run skips the events the first one checkpointed."""
+        source = _json_store(tmp_path)
+        self._interrupt(source, "journal")
+        assert json.loads((tmp_path / CHECKPOINT_FILE).read_text())["events"] == 2
+
+        report = Migration(source, "journal", batch_size=2).run()
+        assert report.resumed_events == 2
+        assert open_store("journal", tmp_path).load() == source.load()
+
+    def test_changed_source_starts_over(self, tmp_path):
+        """Events logged after the checkpoint invalidate it."""
+        source = _json_store(tmp_path)
+        self._interrupt(source, "sqlite")
+        source.append(make_event("e", date="2025-01-09T00:00:00"))
+
+        report = Migration(source, "sqlite", batch_size=2).run()
+        assert report.resumed_events == 0
+        assert open_store("sqlite", tmp_path).load() == source.load()
+
+
+class TestMigrationErrors:
+    """Test migrations that must not run."""
+
+    def test_existing_target_is_kept(self, tmp_path):
+        """A target engine that already holds events is never overwritten."""
+        source = _json_store(tmp_path)
+        existing = open_store("journal", tmp_path)
+        existing.ensure()
+        existing.append(make_event("z", date="2025-01-01T00:00:00"))
+        with pytest.raises(MigrationError, match="already holds events"):
+            Migration(source, "journal").run()
+        assert existing.load()[0]["name"] == "z"
+
+    def test_same_engine(self, tmp_path):
+        """Migrating into the engine already in use is refused."""
+        with pytest.raises(MigrationError, match="already stored"):
+            Migration(_json_store(tmp_path), "json").run()
+
+
+def test_cli_migrate(tmp_path):
+    """`plogr migrate` copies the log and switches log_format."""
+    _json_store(tmp_path)
+    with (
+        patch("src.plogr.config.Config") as mock_config_class,
+        patch("src.plogr.logger.PackageLogger") as mock_logger_class,
+    ):
+        mock_config = MagicMock()
+        mock_config.settings = {}
+        mock_config_class.return_value = mock_config
+        mock_logger = MagicMock()
+        mock_logger.data_dir = tmp_path
+        mock_logger.store = open_store("json", tmp_path)
+        mock_logger_class.return_value = mock_logger
+
+        result = CliRunner().invoke(cli, ["migrate", "--scope", "user", "--to", "sqlite"])
+
+    assert result.exit_code == 0, result.output
+    assert "Migrated 5 records (8 events) from json to sqlite" in result.output
+    mock_config.set.assert_called_with("log_format", "sqlite")
+    assert read_format(tmp_path)["log_format"] == "sqlite"
+    assert (tmp_path / FORMAT_FILE).exists()
+
+
+def test_logger_records_legacy_format(tmp_path, caplog):
+    """A journal-configured logger finds the legacy JSON log and points to migrate."""
+    from src.plogr.config import Config
+    from src.plogr.logger import PackageLogger
+
+    with patch("pathlib.Path.home", return_value=tmp_path):
+        cfg = Config()
+        cfg.set("scope", "user")
+        data_dir = tmp_path / ".local/share/plogr"
+        data_dir.mkdir(parents=True)
+        _json_store(data_dir)
+        cfg.set("log_format", "journal")
+        caplog.set_level("WARNING")
+
+        PackageLogger(cfg)
+
+    assert read_format(data_dir)["log_format"] == "json"
+    assert any("plogr migrate --to journal" in rec.message for rec in caplog.records)
@@ -0,0 +1,76 @@
+"""Unit tests for the trigram index over package names"""
+
+from unittest.mock import patch
+
+import pytest
+
+from src.plogr.storage import names as names_module
+from src.plogr.storage import open_store
+from src.plogr.storage.names import NameIndex, trigrams
+from tests.conftest import make_event
+
+NAMES = ["python3-requests", "Python3-Pip", "python3", "libpython3.13", "htop", "vim-enhanced"]
+
+
+def _store(tmp_path):
+    store = open_store("journal", tmp_path)
+    store.ensure()
+    store.append_many([make_event(name) for name in NAMES])
+    return store
+
+
+def test_trigrams_are_lowercased():
+    """Grams come from the lowercased name."""
+    assert trigrams("PyTh") == {"pyt", "yth"}
+    assert trigrams("py") == set()
+
+
+@pytest.mark.parametrize("needle", ["python3-", "PYTHON", "3", "vim-e", "nothing", "n3."])
+def test_matches_substring_scan(store, needle):
+    """Every engine returns what a case-insensitive substring scan does."""
+    store.append_many([make_event(name) for name in NAMES])
+    expected = [n for n in NAMES if needle.lower() in n.lower()]
+    assert [r["name"] for r in store.query(name=needle)] == expected
+    assert store.names.path.exists()
+
+
+class TestNameIndex:
+    """Test maintenance of the sidecar."""
+
+    def test_writes_extend_index(self, tmp_path):
+        """Names written after the index was built are found without a rebuild."""
+        store = _store(tmp_path)
+        store.query(name="htop")
+        store.append(make_event("python3-numpy"))
+        with patch.object(names_module, "_add", wraps=names_module._add) as add:
+            assert [r["name"] for r in store.query(name="numpy")] == ["python3-numpy"]
+        add.assert_not_called()
+
+    def test_only_candidates_are_verified(self, tmp_path):
+        """Intersecting posting lists leaves only names holding every trigram."""
+        store = _store(tmp_path)
+        store.query(name="htop")
+        index = NameIndex(store.path)
+        with index.connect() as conn:
+            candidates = set(index._candidates(conn, "n3-"))
+        assert candidates == {"python3-requests", "Python3-Pip"}
+
+    def test_stale_index_is_rebuilt(self, tmp_path):
+        """A write the index did not see triggers a rebuild on the next query."""
+        store = _store(tmp_path)
+        store.query(name="htop")
+        with patch.object(store.names, "update"):
+            store.append(make_event("zsh"))
+        assert [r["name"] for r in store.query(name="zsh")] == ["zsh"]
+
+    def test_damaged_index_is_replaced(self, tmp_path):
+        """A file that is not a database is discarded and rebuilt."""
+        store = _store(tmp_path)
+        store.names.path.write_bytes(b"not a database" * 100)
+        assert [r["name"] for r in store.query(name="htop")] == ["htop"]
+
+    def test_unwritable_index_falls_back_to_scan(self, tmp_path):
+        """Readers that cannot build the index still get correct results."""
+        store = _store(tmp_path)
+        with patch.object(store.names, "matching", side_effect=PermissionError("read-only")):
+            assert [r["name"] for r in store.query(name="HTOP")] == ["htop"]
@@ -0,0 +1,81 @@
+"""Unit tests for the persistent open-install index"""
+
+import json
+from unittest.mock import patch
+
+from src.plogr.config import Config
+from src.plogr.logger import PackageLogger
+from src.plogr.storage.base import file_stamp
+from src.plogr.storage.index import OpenInstallIndex
+
+
+def _json_logger(tmp_path) -> PackageLogger:
+    with patch("pathlib.Path.home", return_value=tmp_path):
+        config = Config()
+        config.set("scope", "user")
+        return PackageLogger(config)
+
+
+class TestOpenInstallIndex:
+    """Test index maintenance by the JSON array engine."""
+
+    def test_index_tracks_installs_and_removals(self, tmp_path):
+        """Installs push positions and removals pop the newest one into ``closed``."""
+        logger = _json_logger(tmp_path)
+        with patch.object(logger, "_rewrite_toml_from_json_data", lambda *a, **k: None):
+            logger.log_package("pkg1", "dnf", "install")
+            logger.log_package("pkg2", "dnf", "install")
+            logger.log_package("pkg1", "dnf", "install")
+            logger.log_package("pkg1", "dnf", "remove")
+
+        index = OpenInstallIndex(logger.store.path)
+        assert index.load(file_stamp(logger.json_file))
+        assert index.count == 4
+        assert index.open_positions("dnf", "pkg1") == [0]
+        assert index.open_positions("dnf", "pkg2") == [1]
+        assert list(index.closed) == [2]
+        assert index.closed[2][0] == 3
+
+        assert [r["removed"] for r in logger.query()] == [False, False, True]
+
+    def test_missing_index_is_rebuilt(self, tmp_path):
+        """Deleting the sidecar does not change removal matching."""
+        logger = _json_logger(tmp_path)
+        with patch.object(logger, "_rewrite_toml_from_json_data", lambda *a, **k: None):
+            logger.log_package("pkg1", "dnf", "install")
+            logger.store.open_index.path.unlink()
+            logger.store.open_index.stamp = None
+            logger.log_package("pkg1", "dnf", "remove")
+
+        records = logger.query()
+        assert len(records) == 1
+        assert records[0]["removed"] is True
+
+    def test_stale_index_is_rebuilt(self, tmp_path):
+        """An out-of-band edit of packages.json invalidates the index."""
+        logger = _json_logger(tmp_path)
+        with patch.object(logger, "_rewrite_toml_from_json_data", lambda *a, **k: None):
+            logger.log_package("pkg1", "dnf", "install")
+            logger.json_file.write_text(
+                json.dumps(
+                    [
+                        {"name": "other", "manager": "dnf", "removed": False},
+                        {"name": "pkg1", "manager": "dnf", "removed": False},
+                    ]
+                )
+            )
+            logger.log_package("pkg1", "dnf", "remove")
+
+        assert [r["removed"] for r in logger.query()] == [False, True]
+
+    def test_damaged_index_is_rebuilt(self, tmp_path):
+        """A ``packages.json.idx`` that is not a database is discarded and rebuilt."""
+        logger = _json_logger(tmp_path)
+        with patch.object(logger, "_rewrite_toml_from_json_data", lambda *a, **k: None):
+            logger.log_package("pkg1", "dnf", "install")
+            logger.store.open_index.path.write_bytes(b"not a database" * 100)
+            logger.store.open_index.stamp = None
+            logger.log_package("pkg1", "dnf", "remove")
+
+        assert [r["removed"] for r in logger.query()] == [True]
+        assert logger.store.open_index.open_positions("dnf", "pkg1") == []
@@ -0,0 +1,215 @@
+"""Unit tests for streaming output formats and resumable query cursors"""
+
+import csv
+import datetime as dt
+import io
+import json
+import threading
+import tracemalloc
+from unittest.mock import patch
+
+import pytest
+
+from src.plogr.exceptions import CursorError
+from src.plogr.output import (
+    decode_cursor,
+    encode_cursor,
+    format_records,
+    parse_fields,
+    project,
+)
+from src.plogr.storage import JournalStore, QueryFilters, open_store
+from src.plogr.storage.base import STREAM_CHUNK
+from tests.conftest import make_event
+
+RECORD = make_event("htop", version="3.3", metadata={"arch": "x86_64"})
+
+
+class TestCursor:
+    """Test the opaque pagination tokens."""
+
+    def test_round_trip(self):
+        """A cursor decodes to its position for the engine that issued it."""
+        token = encode_cursor("journal", 41)
+        assert "41" not in token
+        assert decode_cursor(token, "journal") == 41
+
+    def test_other_engine_is_rejected(self):
+        """A cursor from another engine's log would point at the wrong record."""
+        with pytest.raises(CursorError, match="sqlite"):
+            decode_cursor(encode_cursor("sqlite", 3), "journal")
+
+    @pytest.mark.parametrize("token", ["", "!!", encode_cursor("journal", 1)[:-1] + "="])
+    def test_garbage_is_rejected(self, token):
+        """Malformed tokens raise ``CursorError``."""
+        with pytest.raises(CursorError):
+            decode_cursor(token, "journal")
+
+
+class TestFormats:
+    """Test the record formatters."""
+
+    def test_fields_projection(self):
+        """Fields keep their order, and ``metadata.<key>`` reaches into metadata."""
+        assert parse_fields(" name, metadata.arch ,") == ["name", "metadata.arch"]
+        assert parse_fields("") is None
+        assert project(RECORD, ["version", "name", "metadata.arch", "missing"]) == {
+            "version": "3.3",
+            "name": "htop",
+            "metadata.arch": "x86_64",
+            "missing": None,
+        }
+
+    def test_ndjson(self):
+        """One compact JSON object per line."""
+        lines = list(format_records([RECORD, RECORD], "ndjson", ["name"]))
+        assert lines == ['{"name":"htop"}\n'] * 2
+
+    def test_pretty_matches_previous_output(self):
+        """The default format is the indented JSON ``plogr query`` always printed."""
+        assert list(format_records([RECORD], "pretty")) == [json.dumps(RECORD, indent=2) + "\n"]
+
+    def test_csv(self):
+        """CSV has a header, lowercase booleans and JSON-encoded nested values."""
+        text = "".join(format_records([RECORD], "csv"))
+        rows = list(csv.reader(io.StringIO(text)))
+        assert rows[0][:4] == ["name", "manager", "action", "scope"]
+        row = dict(zip(rows[0], rows[1]))
+        assert row["removed"] == "false"
+        assert row["date_removed"] == ""
+        assert json.loads(row["metadata"]) == {"arch": "x86_64"}
+
+    def test_records_are_formatted_lazily(self):
+        """Nothing past the record being written is pulled from the source."""
+        pulled = []
+
+        def source():
+            for i in range(3):
+                pulled.append(i)
+                yield make_event(f"p{i}")
+
+        lines = format_records(source(), "ndjson")
+        next(lines)
+        assert pulled == [0]
+
+
+class TestPagination:
+    """Test ``iter_matching`` positions and resuming after them on every engine."""
+
+    def _fill(self, store, count=6):
+        store.append_many([make_event(f"p{i}") for i in range(count)])
+
+    def test_pages_cover_query(self, store):
+        """Resuming after each page's last position yields the whole result once."""
+        self._fill(store)
+        seen, after = [], None
+        while True:
+            page = []
+            for position, record in store.iter_matching(QueryFilters(), after):
+                page.append((position, record))
+                if len(page) == 2:
+                    break
+            if not page:
+                break
+            seen.extend(record["name"] for _, record in page)
+            after = page[-1][0]
+        assert seen == [f"p{i}" for i in range(6)]
+
+    def test_positions_survive_appends(self, store):
+        """Events logged between pages neither repeat nor hide records."""
+        self._fill(store, count=3)
+        after = list(store.iter_matching(QueryFilters()))[1][0]
+        store.append_many([make_event("p0", "remove"), make_event("new")])
+        resumed = [record["name"] for _, record in store.iter_matching(QueryFilters(), after)]
+        assert resumed == ["p2", "new"]
+        assert store.query()[0]["removed"]
+
+    def test_filters_apply_after_cursor(self, store):
+        """A cursor resumes a filtered query."""
+        self._fill(store)
+        positions = [position for position, _ in store.iter_matching(QueryFilters(name="p"))]
+        names = [
+            record["name"]
+            for _, record in store.iter_matching(QueryFilters(name="p"), positions[3])
+        ]
+        assert names == ["p4", "p5"]
+
+    def test_stream_does_not_hold_lock(self, store):
+        """A writer commits while a stream is half consumed; the stream still ends once."""
+        count = STREAM_CHUNK + 2
+        self._fill(store, count=count)
+        results = store.stream_matching(QueryFilters())
+        names = [next(results)[1]["name"]]
+        writer = threading.Thread(target=store.append, args=(make_event("new"),), daemon=True)
+        writer.start()
+        writer.join(5)
+        assert not writer.is_alive()
+        names.extend(record["name"] for _, record in results)
+        assert names[:count] == [f"p{i}" for i in range(count)]
+        # Snapshots end where the lock was released; chunked reads pick the write up.
+        assert names[count:] in ([], ["new"])
+
+
+def test_journal_pruned_positions_match_full_replay(tmp_path):
+    """Skipping sealed segments for ``since`` keeps each record's position."""
+    store = JournalStore(tmp_path)
+    store.ensure()
+    store.append_many(
+        [
+            make_event("old", date="2025-01-05T10:00:00"),
+            make_event("gone", date="2025-01-06T10:00:00"),
+            make_event("gone", "remove", date="2025-01-07T10:00:00"),
+            make_event("feb", date="2025-02-03T10:00:00"),
+            make_event("old", "remove", date="2025-03-01T10:00:00"),
+            make_event("mar", date="2025-03-02T10:00:00"),
+        ]
+    )
+    full = {record["name"]: position for position, record in store.iter_matching(QueryFilters())}
+    with patch.object(store, "load_table", side_effect=AssertionError("not pruned")):
+        pruned = list(store.iter_matching(QueryFilters(since=dt.date(2025, 2, 1))))
+        assert [(position, record["name"]) for position, record in pruned] == [
+            (full["feb"], "feb"),
+            (full["mar"], "mar"),
+        ]
+        resumed = store.iter_matching(QueryFilters(since=dt.date(2025, 2, 1)), full["feb"])
+        assert [record["name"] for _, record in resumed] == ["mar"]
+
+
+def test_logger_stream_resumes_and_releases_lock(tmp_path):
+    """``PackageLogger.stream`` hands out cursors and drops the shared lock when closed."""
+    from src.plogr.config import Config
+    from src.plogr.logger import PackageLogger
+
+    with patch("pathlib.Path.home", return_value=tmp_path):
+        cfg = Config()
+        cfg.set("scope", "user")
+        cfg.set("log_format", "journal")
+        logger = PackageLogger(cfg)
+        logger.log_packages(
+            [{"name": f"p{i}", "manager": "dnf", "action": "install"} for i in range(3)]
+        )
+
+        results = logger.stream()
+        cursor, _ = next(results)
+        results.close()
+        # An exclusive lock is only granted once the reader is gone.
+        with logger.store.writing():
+            pass
+        assert [r["name"] for _, r in logger.stream(after=cursor)] == ["p1", "p2"]
+        with pytest.raises(CursorError):
+            logger.stream(after=encode_cursor("sqlite", 0))
+
+
+def test_stream_memory_is_flat(tmp_path):
+    """Streaming a large result holds one record at a time, not the whole list."""
+    store = open_store("sqlite", tmp_path)
+    store.ensure()
+    store.append_many([make_event(f"pkg-{i}") for i in range(20000)])
+    tracemalloc.start()
+    try:
+        for _ in format_records((rec for _, rec in store.iter_matching(QueryFilters())), "ndjson"):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 1024 * 1024
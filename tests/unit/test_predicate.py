@@ -0,0 +1,166 @@
+"""Unit tests for compiled query predicates"""
+
+import datetime as dt
+from unittest.mock import patch
+
+import pytest
+
+from src.plogr.storage import JsonArrayStore, QueryFilters
+from src.plogr.storage.cache import ParsedLogCache
+from src.plogr.storage.predicate import Plan, meta_encodings, meta_matches, record_plan
+from src.plogr.storage.table import EventTable
+from tests.conftest import make_event
+
+EVENTS = [
+    make_event("htop", metadata={"repo": "fedora", "size": 42}),
+    make_event("vim", date="2025-01-05T00:00:00", metadata={"repo": "updates"}),
+    make_event("htop", "remove", date="2025-01-06T00:00:00"),
+    make_event("ripgrep", date="2025-02-01T00:00:00", manager="cargo", metadata={"repo": "crates"}),
+    make_event("ghost", "remove", date="2025-02-02T00:00:00", manager="apt"),
+    make_event("vim-data", date="2025-02-03T00:00:00", metadata={"size": "42", "tags": ["a"]}),
+]
+
+
+def _names(records):
+    return [r["name"] for r in records]
+
+
+class TestPlan:
+    """Test compiling checks into one test."""
+
+    def test_checks_run_cheapest_first(self):
+        """The fused test stops at the first failing check, whatever order they were added."""
+        plan = Plan("r")
+        calls = []
+
+        def costly(r):
+            calls.append(r)
+            return True
+
+        plan.add(5, "costly", "costly(r)", costly=costly)
+        plan.add(1, "positive", "r > 0")
+        assert [check.label for check in plan.ordered()] == ["positive", "costly"]
+        assert plan.test(-1) is False
+        assert calls == []
+        assert plan.test(1) is True
+        assert plan.describe() == ["scan: positive, then costly"]
+
+    def test_values_are_bound_not_spliced(self):
+        """Filter values never become source text."""
+        plan = record_plan(QueryFilters(manager="dnf') or ('x"))
+        assert not plan.test(make_event("htop"))
+
+    def test_no_checks_pass_everything(self):
+        plan = Plan("r")
+        assert plan.test(None) is True
+        assert plan.describe() == ["scan: every candidate matches"]
+
+
+class TestMetadata:
+    """Test metadata equality."""
+
+    def test_text_matches_the_value_it_spells(self):
+        """``--meta size=42`` matches the number 42 as well as the text "42"."""
+        encodings = meta_encodings("42")
+        assert meta_matches({"size": 42}, "size", encodings)
+        assert meta_matches({"size": "42"}, "size", encodings)
+        assert not meta_matches({"size": 43}, "size", encodings)
+        assert not meta_matches({"other": 42}, "size", encodings)
+        assert not meta_matches(None, "size", encodings)
+
+    def test_nested_values_compare_as_json(self):
+        assert meta_matches({"tags": ["a"]}, "tags", meta_encodings('["a"]'))
+        assert meta_matches({"on": True}, "on", meta_encodings("true"))
+
+
+FILTERS = [
+    ({"action": "remove"}, ["htop", "ghost"]),
+    ({"removed": True}, ["htop", "ghost"]),
+    ({"removed": False}, ["vim", "ripgrep", "vim-data"]),
+    ({"metadata": {"repo": "fedora"}}, ["htop"]),
+    ({"metadata": {"size": "42"}}, ["htop", "vim-data"]),
+    ({"metadata": {"size": "42", "repo": "fedora"}}, ["htop"]),
+    ({"metadata": {"repo": "nowhere"}}, []),
+    ({"name": "vim", "removed": False, "since": dt.date(2025, 2, 1)}, ["vim-data"]),
+    ({"manager": "apt", "action": "install"}, []),
+    ({"action": "upgrade"}, []),
+]
+
+
+@pytest.mark.parametrize("filters, expected", FILTERS)
+def test_engines_agree(store, filters, expected):
+    """Every engine returns the same records for the new filters."""
+    store.append_many(EVENTS)
+    assert _names(store.query(**filters)) == expected
+
+
+@pytest.mark.parametrize("filters, expected", FILTERS)
+def test_streaming_reader_agrees(tmp_path, filters, expected):
+    """The streaming ``packages.json`` reader applies the same test as the tables."""
+    store = JsonArrayStore(tmp_path)
+    store.cache = ParsedLogCache(max_events=0)
+    store.ensure()
+    store.append_many(EVENTS)
+    assert _names(store.query(**filters)) == expected
+
+
+class TestTablePlan:
+    """Test the row-number plans of ``EventTable``."""
+
+    def test_unknown_value_skips_the_scan(self):
+        """A value that was never interned matches no row without testing any."""
+        table = EventTable.fold(EVENTS)
+        plan = table.plan(QueryFilters(manager="pacman"))
+        assert plan.empty == "no event has manager 'pacman'"
+        with patch.object(Plan, "test", new_callable=lambda: property(lambda self: 1 / 0)):
+            assert table.matching(QueryFilters(manager="pacman")) == []
+
+    def test_one_pass_over_the_time_span(self):
+        """Only rows inside the time range reach the fused test."""
+        table = EventTable.fold(EVENTS)
+        filters = QueryFilters(since=dt.date(2025, 2, 1), removed=False)
+        seen = []
+        test = table.plan(filters).test
+
+        def spy(row):
+            seen.append(row)
+            return test(row)
+
+        with patch.object(Plan, "test", new_callable=lambda: property(lambda self: spy)):
+            assert table.matching(filters) == [2, 4]
+        assert seen == [2, 3, 4]
+
+
+def test_explain_describes_plan(store, log_format):
+    """Every engine explains its lookups and checks."""
+    store.append_many(EVENTS)
+    plan = store.explain(QueryFilters(manager="dnf", metadata={"repo": "fedora"}))
+    text = "\n".join(plan)
+    if log_format == "sqlite":
+        assert "sqlite:" in text
+    else:
+        assert "scan: manager is 'dnf', then metadata.repo is 'fedora'" in text
+    assert "metadata.repo is 'fedora'" in text
+
+
+def test_logger_explain_counts_and_times(tmp_path):
+    """``PackageLogger.explain`` runs the query and reports matches and time."""
+    from src.plogr.config import Config
+    from src.plogr.logger import PackageLogger
+
+    with patch("pathlib.Path.home", return_value=tmp_path):
+        cfg = Config()
+        cfg.set("scope", "user")
+        cfg.set("log_format", "journal")
+        logger = PackageLogger(cfg)
+        logger.log_packages(
+            [{"name": f"p{i}", "manager": "dnf", "action": "install"} for i in range(3)]
+        )
+        logger.log_package("p1", "dnf", "remove")
+
+        report = logger.explain(removed=False)
+        assert report["engine"] == "journal"
+        assert report["matched"] == 2
+        assert report["seconds"] >= 0
+        assert report["plan"][-1] == "scan: installed"
+        assert [r["name"] for r in logger.query(action="remove")] == ["p1"]
@@ -0,0 +1,90 @@
+"""Unit tests for the streaming log readers"""
+
+import json
+import tracemalloc
+from unittest.mock import patch
+
+import pytest
+
+from src.plogr.storage import JsonArrayStore, ParsedLogCache
+from src.plogr.storage.reader import iter_json_array, iter_lines
+from src.plogr.storage.stats import LogSummary
+
+
+def _records(count):
+    return [
+        {
+            "name": f"pkg-ü-{i}",
+            "manager": "dnf",
+            "action": "install",
+            "scope": "user",
+            "date": "2025-01-01T00:00:00",
+            "removed": False,
+            "metadata": {"size": i, "ratio": i / 7},
+        }
+        for i in range(count)
+    ]
+
+
+class TestIterJsonArray:
+    """Test incremental decoding of a memory-mapped JSON array."""
+
+    @pytest.mark.parametrize("indent", [None, 2])
+    @pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+    def test_matches_json_loads(self, tmp_path, indent, chunk_size):
+        """Records straddling window and multi-byte character boundaries decode intact."""
+        path = tmp_path / "log.json"
+        data = _records(30) + [12345, "tail"]
+        path.write_text(json.dumps(data, indent=indent, ensure_ascii=False), encoding="utf-8")
+        assert list(iter_json_array(path, chunk_size=chunk_size)) == data
+
+    def test_empty_array(self, tmp_path):
+        """An empty array yields nothing."""
+        path = tmp_path / "log.json"
+        path.write_text(" [ ] ")
+        assert list(iter_json_array(path)) == []
+
+    @pytest.mark.parametrize("text", ["", "{}", "[1, 2", "[1 2]"])
+    def test_malformed_input_raises(self, tmp_path, text):
+        """Anything but a complete array is reported like json.loads would."""
+        path = tmp_path / "log.json"
+        path.write_text(text)
+        with pytest.raises(json.JSONDecodeError):
+            list(iter_json_array(path, chunk_size=2))
+
+    def test_iter_lines(self, tmp_path):
+        """Journal lines are read from the map, including an unterminated last line."""
+        path = tmp_path / "log.jsonl"
+        path.write_bytes(b'{"a":1}\n{"b":2}')
+        assert list(iter_lines(path)) == [b'{"a":1}\n', b'{"b":2}']
+        path.write_bytes(b"")
+        assert list(iter_lines(path)) == []
+
+
+class TestStreamingStore:
+    """Test that the JSON array engine never holds the whole file as text."""
+
+    def test_query_and_statistics_do_not_read_text(self, tmp_path):
+        """Reads stream from the map instead of read_text()."""
+        store = JsonArrayStore(tmp_path)
+        store.path.write_text(json.dumps(_records(5), indent=2))
+        with patch("pathlib.Path.read_text", side_effect=AssertionError("read_text")):
+            assert [r["name"] for r in store.query(name="-3")] == ["pkg-ü-3"]
+            assert store.summary(recompute=True).totals["total"] == 5
+
+    def test_peak_memory_is_bounded(self, tmp_path):
+        """With the cache off, counting keeps far less than the parsed history in memory."""
+        store = JsonArrayStore(tmp_path)
+        store.cache = ParsedLogCache(max_events=0)
+        data = _records(20000)
+        store.path.write_text(json.dumps(data, indent=2))
+        size = store.path.stat().st_size
+        del data
+
+        tracemalloc.start()
+        stats = LogSummary.from_records(store.iter_records()).totals
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        assert stats["total"] == 20000
+        assert peak < size / 10
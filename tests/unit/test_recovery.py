@@ -0,0 +1,137 @@
+"""Unit tests for record checksums and startup crash recovery"""
+
+import json
+from unittest.mock import patch
+
+import pytest
+
+from src.plogr.storage import ColumnarStore, EventTable, JournalStore, JsonArrayStore
+from src.plogr.storage import recovery
+from src.plogr.storage.checksum import ChecksumError, encode_record, verified_body
+from src.plogr.storage.reader import decode_lines
+from tests.conftest import make_event
+
+
+class TestChecksum:
+    """Test the CRC32 carried by each JSON line."""
+
+    def test_line_stays_json(self):
+        """Other tools can still parse a checksummed line."""
+        line = encode_record(make_event("a"))
+        assert json.loads(line)["name"] == "a"
+        assert json.loads(verified_body(line)) == make_event("a")
+
+    def test_flipped_byte_is_detected(self):
+        """A damaged record no longer matches its checksum."""
+        line = encode_record(make_event("abc")).replace(b'"abc"', b'"abd"')
+        with pytest.raises(ChecksumError):
+            verified_body(line)
+        assert list(decode_lines([line], "log")) == []
+
+    def test_lines_without_checksum_are_accepted(self):
+        """Logs written before checksums still read."""
+        line = json.dumps(make_event("a")).encode()
+        assert list(decode_lines([line], "log")) == [make_event("a")]
+
+
+class TestVerifiedTail:
+    """Test the recovery pass over append-only tails."""
+
+    def _store(self, tmp_path):
+        store = JournalStore(tmp_path)
+        store.ensure()
+        store.append_many([make_event("a"), make_event("b")])
+        return store
+
+    def test_torn_write_is_truncated(self, tmp_path, caplog):
+        """A partial last line is cut off and reported."""
+        store = self._store(tmp_path)
+        intact = store.path.stat().st_size
+        with store.path.open("ab") as fp:
+            fp.write(encode_record(make_event("c"))[:20])
+
+        caplog.set_level("WARNING")
+        assert store.recover() == 20
+        assert store.path.stat().st_size == intact
+        assert "Dropped 20 byte(s)" in caplog.text
+        store.append(make_event("d"))
+        assert [r["name"] for r in store.load()] == ["a", "b", "d"]
+
+    def test_corrupt_middle_line_is_kept(self, tmp_path):
+        """Only the end is truncated; damaged lines between good ones stay for readers to skip."""
+        store = self._store(tmp_path)
+        data = store.path.read_bytes().replace(b'"a"', b'"x"')
+        store.path.write_bytes(data)
+        assert store.recover() == 0
+        assert store.path.read_bytes() == data
+        assert [r["name"] for r in store.load()] == ["b"]
+
+    def test_verified_region_is_not_rescanned(self, tmp_path):
+        """A second start only checks lines appended since the first."""
+        store = self._store(tmp_path)
+        store.recover()
+        with patch.object(recovery, "_valid", wraps=recovery._valid) as valid:
+            store.recover()
+            assert valid.call_count == 0
+            store.append(make_event("c"))
+            store.recover()
+            assert valid.call_count == 1
+
+    def test_replaced_file_is_checked_from_start(self, tmp_path):
+        """A marker describing another file is ignored."""
+        store = self._store(tmp_path)
+        store.recover()
+        store.path.unlink()
+        store.path.write_bytes(encode_record(make_event("z")) + b'{"name":')
+        assert store.recover() == len(b'{"name":')
+
+    def test_columnar_tail(self, tmp_path):
+        """The columnar engine repairs its JSON Lines tail."""
+        store = ColumnarStore(tmp_path)
+        store.ensure()
+        store.append(make_event("a"))
+        with store.wal.open("ab") as fp:
+            fp.write(b"\x00\x00\x00")
+        assert store.recover() == 3
+        assert [r["name"] for r in store.load()] == ["a"]
+
+
+def test_leftover_tmp_file_is_removed(tmp_path):
+    """An interrupted replace of packages.json leaves nothing behind."""
+    store = JsonArrayStore(tmp_path)
+    store.ensure()
+    tmp_file = tmp_path / "packages.json.tmp"
+    tmp_file.write_text("[")
+    store.recover()
+    assert not tmp_file.exists()
+
+
+def test_columnar_snapshot_checksum(tmp_path):
+    """A damaged column of the snapshot is reported instead of read."""
+    path = tmp_path / "packages.cols"
+    EventTable.fold([make_event("a"), make_event("b")]).save(path)
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="checksum"):
+        EventTable.load(path)
+
+
+def test_logger_recovers_on_start(tmp_path):
+    """Creating a logger repairs the journal before anything is written."""
+    from src.plogr.config import Config
+    from src.plogr.logger import PackageLogger
+
+    with patch("pathlib.Path.home", return_value=tmp_path):
+        cfg = Config()
+        cfg.set("scope", "user")
+        cfg.set("log_format", "journal")
+        logger = PackageLogger(cfg)
+        logger.log_package("a", "dnf", "install")
+        with logger.store.path.open("ab") as fp:
+            fp.write(b'{"name":"b"')
+
+        logger = PackageLogger(cfg)
+        assert b'{"name":"b"' not in logger.store.path.read_bytes()
+        logger.log_package("c", "dnf", "install")
+        assert [r["name"] for r in logger.query()] == ["a", "c"]
@@ -0,0 +1,131 @@
+"""Unit tests for the time-bucket rollups behind ``plogr stats``"""
+
+import datetime as dt
+import sqlite3
+from unittest.mock import patch
+
+from src.plogr.storage import open_store
+from src.plogr.storage.rollups import Rollups, bucket
+from tests.conftest import make_event
+
+EVENTS = [
+    make_event("htop", date="2025-01-30T10:00:00", repo="fedora"),
+    make_event("vim", date="2025-01-31T10:00:00", repo="updates"),
+    make_event("ripgrep", date="2025-02-01T09:00:00", manager="cargo"),
+    # DNF reports removed packages as coming from @System.
+    make_event("htop", "remove", date="2025-02-03T08:00:00", repo="@System"),
+    make_event("ghost", "remove", date="2025-02-04T08:00:00", manager="apt"),
+]
+
+LATER = [
+    make_event("htop", date="2025-02-05T08:00:00", repo="fedora"),
+    make_event("vim", "remove", date="2025-03-01T08:00:00", repo="@System"),
+]
+
+
+def _store(tmp_path):
+    store = open_store("journal", tmp_path)
+    store.ensure()
+    store.append_many(EVENTS)
+    return store
+
+
+def test_buckets():
+    """Weeks are ISO weeks, named after the year they belong to."""
+    assert bucket("2025-02-03", "day") == "2025-02-03"
+    assert bucket("2025-02-03", "month") == "2025-02"
+    assert bucket("2025-02-03", "week") == "2025-W06"
+    assert bucket("2025-12-29", "week") == "2026-W01"
+
+
+class TestEngines:
+    """Test the rollups of every engine."""
+
+    def test_counts_per_month(self, store):
+        store.append_many(EVENTS)
+        assert store.rollup("month") == [
+            {"bucket": "2025-01", "manager": "dnf", "action": "install", "events": 2},
+            {"bucket": "2025-02", "manager": "apt", "action": "remove", "events": 1},
+            {"bucket": "2025-02", "manager": "cargo", "action": "install", "events": 1},
+            {"bucket": "2025-02", "manager": "dnf", "action": "remove", "events": 1},
+        ]
+
+    def test_writes_match_rebuild(self, store):
+        """Counts the writers add equal those rebuilt from the log."""
+        store.append_many(EVENTS)
+        store.rollup()
+        store.append_many(LATER)
+        for by in ("day", "week", "month"):
+            kept = store.rollup(by, ("manager", "action", "repo"))
+            assert kept == store.rollup(by, ("manager", "action", "repo"), recompute=True)
+
+    def test_removal_counts_under_install_repo(self, store):
+        """A removal closing an install is counted under the repo the package came from."""
+        store.append_many(EVENTS)
+        store.rollup()
+        store.append_many(LATER)
+        assert store.rollup("month", ("repo", "action"), manager="dnf") == [
+            {"bucket": "2025-01", "repo": "fedora", "action": "install", "events": 1},
+            {"bucket": "2025-01", "repo": "updates", "action": "install", "events": 1},
+            {"bucket": "2025-02", "repo": "fedora", "action": "install", "events": 1},
+            {"bucket": "2025-02", "repo": "fedora", "action": "remove", "events": 1},
+            {"bucket": "2025-03", "repo": "updates", "action": "remove", "events": 1},
+        ]
+
+
+class TestRollups:
+    """Test maintenance of the sidecar."""
+
+    def test_answers_without_reading_events(self, tmp_path):
+        """Once built, the rollups are kept current by writers and read alone."""
+        store = _store(tmp_path)
+        store.rollup()
+        store.append_many(LATER)
+        with patch.object(type(store), "iter_records", side_effect=AssertionError("read")):
+            rows = store.rollup("month", ("action",), since=dt.date(2025, 2, 2))
+        assert rows == [
+            {"bucket": "2025-02", "action": "install", "events": 1},
+            {"bucket": "2025-02", "action": "remove", "events": 2},
+            {"bucket": "2025-03", "action": "remove", "events": 1},
+        ]
+
+    def test_not_created_by_writers(self, tmp_path):
+        """Writers only extend rollups a query built, so logging never pays for a rebuild."""
+        store = _store(tmp_path)
+        assert not store.rollups.path.exists()
+
+    def test_stale_rollups_are_rebuilt(self, tmp_path):
+        """Rollups that missed a write are rebuilt from the log."""
+        store = _store(tmp_path)
+        store.rollup()
+        with patch.object(Rollups, "update"):
+            store.append_many(LATER)
+        assert store.rollup("month", ("action",), since=dt.date(2025, 3, 1)) == [
+            {"bucket": "2025-03", "action": "remove", "events": 1}
+        ]
+
+    def test_missing_open_installs_are_recollected(self, tmp_path):
+        """Rollups cannot be advanced without the open installs; the rebuild restores both."""
+        store = _store(tmp_path)
+        store.rollup()
+        store.open_installs.path.unlink()
+        store.append_many(LATER)
+        assert store.rollup("month", ("repo", "action"), since=dt.date(2025, 3, 1)) == [
+            {"bucket": "2025-03", "repo": "updates", "action": "remove", "events": 1}
+        ]
+        assert store.open_installs.describes(store.generation())
+
+    def test_damaged_rollups_are_replaced(self, tmp_path):
+        store = _store(tmp_path)
+        store.rollups.path.write_bytes(b"not a database" * 100)
+        assert sum(row["events"] for row in store.rollup()) == 5
+
+    def test_unwritable_rollups_count_the_log(self, tmp_path):
+        """A reader that cannot rebuild the rollups counts the events itself."""
+        store = _store(tmp_path)
+        with patch.object(Rollups, "counts", side_effect=sqlite3.OperationalError("read-only")):
+            rows = store.rollup("day", (), until=dt.date(2025, 1, 31))
+        assert rows == [
+            {"bucket": "2025-01-30", "events": 1},
+            {"bucket": "2025-01-31", "events": 1},
+        ]
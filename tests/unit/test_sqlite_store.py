@@ -0,0 +1,99 @@
+"""Unit tests for the SQLite storage engine"""
+
+import datetime as dt
+import sqlite3
+from unittest.mock import patch
+
+from src.plogr.config import Config
+from src.plogr.logger import PackageLogger
+from src.plogr.storage import SqliteStore
+
+
+def _sqlite_logger(tmp_path) -> PackageLogger:
+    with patch("pathlib.Path.home", return_value=tmp_path):
+        config = Config()
+        config.set("scope", "user")
+        config.set("log_format", "sqlite")
+        return PackageLogger(config)
+
+
+class TestSqliteStore:
+    """Test the SqliteStore engine through PackageLogger."""
+
+    def test_selected_from_config(self, tmp_path):
+        """log_format=sqlite creates an indexed packages.db."""
+        logger = _sqlite_logger(tmp_path)
+        assert isinstance(logger.store, SqliteStore)
+
+        with sqlite3.connect(logger.store.path) as conn:
+            indexes = {
+                row[0]
+                for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+            }
+        assert {"idx_events_manager_name", "idx_events_epoch", "idx_events_removed"} <= indexes
+
+    def test_removal_closes_last_open_install(self, tmp_path):
+        """A removal closes the newest open install."""
+        logger = _sqlite_logger(tmp_path)
+        logger.log_package("pkg1", "dnf", "install", version="1.0", metadata={"arch": "x86_64"})
+        logger.log_package("pkg1", "dnf", "install", version="2.0")
+        logger.log_package("pkg1", "dnf", "remove")
+
+        records = logger.query()
+        assert [r["removed"] for r in records] == [False, True]
+        assert records[1]["version"] == "2.0"
+        assert records[1]["action"] == "remove"
+        assert records[0]["metadata"] == {"arch": "x86_64"}
+
+    def test_query_filters(self, tmp_path):
+        """Name, manager and since filters match the JSON engine's semantics."""
+        logger = _sqlite_logger(tmp_path)
+        logger.log_package("Python3-foo", "dnf", "install")
+        logger.log_package("python3_bar", "apt", "install")
+        logger.log_package("firefox.rpm", "download", "install")
+
+        assert [r["name"] for r in logger.query(name="PYTHON3")] == ["Python3-foo", "python3_bar"]
+        assert [r["name"] for r in logger.query(name="3_")] == ["python3_bar"]
+        assert [r["name"] for r in logger.query(manager="apt")] == ["python3_bar"]
+        tomorrow = dt.date.today() + dt.timedelta(days=1)
+        assert logger.query(since=tomorrow) == []
+
+    def test_statistics(self, tmp_path):
+        """Counters come straight from the database."""
+        logger = _sqlite_logger(tmp_path)
+        logger.log_package("pkg1", "dnf", "install")
+        logger.log_package("pkg2", "dnf", "install")
+        logger.log_package("pkg2", "dnf", "remove")
+        logger.log_package("file.rpm", "download", "install")
+
+        stats = logger.get_statistics()
+        assert stats == {
+            "total": 3,
+            "installed": 2,
+            "removed": 1,
+            "downloads": 1,
+            "by_manager": {
+                "dnf": {"total": 2, "installed": 1, "removed": 1},
+                "download": {"total": 1, "installed": 1, "removed": 0},
+            },
+            "by_scope": {"user": {"total": 3, "installed": 2, "removed": 1}},
+            "duplicates_rejected": 0,
+            "scope": "user",
+        }
+
+    def test_keeps_fields_without_a_column(self, tmp_path):
+        """The idempotency key and unknown fields read back like the other engines."""
+        store = SqliteStore(tmp_path)
+        store.ensure()
+        entry = {
+            "name": "pkg1",
+            "manager": "dnf",
+            "action": "install",
+            "scope": "user",
+            "date": "2025-01-01T00:00:00",
+            "removed": False,
+            "idempotency_key": "k1",
+            "note": {"kept": True},
+        }
+        store.append_many([entry])
+        assert store.load() == [entry]
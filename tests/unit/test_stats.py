@@ -0,0 +1,95 @@
+"""Unit tests for the incrementally maintained statistics sidecar"""
+
+import json
+import sqlite3
+from unittest.mock import patch
+
+from src.plogr.storage import fold_events
+from src.plogr.storage.sidecar import MemoryOpenInstalls, closed_repos
+from src.plogr.storage.stats import LogSummary
+from tests.conftest import make_event
+
+
+def _history():
+    return [
+        make_event("a"),
+        make_event("a"),
+        make_event("b", scope="system"),
+        make_event("a", "remove"),
+        make_event("orphan", "remove"),
+        make_event("file.rpm", manager="download"),
+    ]
+
+
+class TestLogSummary:
+    """Test the counters against the folded view."""
+
+    def test_apply_matches_folded_records(self):
+        """Removals close installs the same way fold_events does."""
+        summary = LogSummary()
+        open_installs = MemoryOpenInstalls()
+        summary.apply(_history(), closed_repos(_history(), open_installs))
+        assert sorted(open_installs.rows()) == [
+            ("dnf", "a", ""),
+            ("dnf", "b", ""),
+            ("download", "file.rpm", ""),
+        ]
+        assert summary.to_dict() == LogSummary.from_records(fold_events(_history())).to_dict()
+        assert summary.statistics()["by_manager"]["dnf"] == {
+            "total": 4,
+            "installed": 2,
+            "removed": 2,
+        }
+        assert summary.statistics()["by_scope"]["system"]["installed"] == 1
+        assert summary.downloads == 1
+
+
+class TestStatsFile:
+    """Test that every engine keeps the sidecar current."""
+
+    def test_writes_keep_sidecar_current(self, store):
+        """After the first recompute, status never reads the log again."""
+        store.summary()
+        for entry in _history():
+            store.append(entry)
+        assert store.stats_file.load(store.generation()) is not None
+
+        with patch.object(type(store), "iter_records", side_effect=AssertionError("read")):
+            stats = store.summary().statistics()
+        expected = LogSummary.from_records(store.load()).statistics()
+        assert stats == expected
+        assert stats["total"] == 5 and stats["removed"] == 2
+
+    def test_stale_sidecar_is_recomputed(self, store):
+        """A sidecar describing another generation is ignored."""
+        store.append_many(_history()[:3])
+        store.summary()
+        raw = json.loads(store.stats_file.path.read_text())
+        raw["generation"] = "other"
+        raw["total"] = 99
+        store.stats_file.path.write_text(json.dumps(raw))
+
+        assert store.summary().totals["total"] == 3
+        assert store.summary(recompute=True).totals["total"] == 3
+
+    def test_sidecar_holds_counters_only(self, store):
+        """Open installs are kept per package in the store's own keyed file, not in the counters."""
+        store.summary()
+        store.append_many(_history())
+        raw = json.loads(store.stats_file.path.read_text())
+        assert set(raw) == {"version", "generation", "total", "installed", "removed"} | {
+            "downloads",
+            "by_manager",
+            "by_scope",
+        }
+        with sqlite3.connect(store.open_installs.path) as conn:
+            rows = sorted(conn.execute("SELECT manager, name, value FROM open_installs"))
+        assert rows == [("dnf", "a", ""), ("dnf", "b", ""), ("download", "file.rpm", "")]
+
+    def test_missing_open_installs_are_recomputed(self, store):
+        """Counters cannot be advanced without the open installs; the next reader recounts."""
+        store.summary()
+        store.open_installs.path.unlink()
+        store.append_many(_history())
+        assert store.stats_file.load(store.generation()) is None
+        assert store.summary().totals == {"total": 5, "installed": 3, "removed": 2}
@@ -0,0 +1,136 @@
+"""Unit tests for epoch keys and the time-ordered range index"""
+
+import datetime as dt
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+from src.plogr.storage import JsonArrayStore, QueryFilters, SqliteStore, open_store
+from src.plogr.storage.cache import ParsedLogCache
+from src.plogr.storage.table import EventTable
+from src.plogr.storage.timeindex import TimeIndex, epoch_key, time_bounds
+from tests.conftest import make_event
+
+# Logged out of order, with a time zone offset and a fraction of a second.
+EVENTS = [
+    make_event("a", date="2025-01-01T08:00:00"),
+    make_event("b", date="2025-01-31T23:59:59"),
+    make_event("c", date="2025-02-01T00:00:00"),
+    make_event("late", date="2025-01-15T12:00:00"),
+    make_event("tz", date="2025-02-10T09:30:00+02:00"),
+    make_event("frac", date="2025-02-10T09:30:00.750000"),
+    make_event("d", date="2025-03-01T10:00:00"),
+]
+
+
+def _names(records):
+    return [r["name"] for r in records]
+
+
+class TestEpochKeys:
+    """Test the integer keys and bounds."""
+
+    def test_wall_clock_seconds(self):
+        """Offsets are ignored and fractions dropped, like the dates ``--days`` compared."""
+        assert epoch_key("1970-01-01T00:01:00") == 60
+        assert epoch_key("1970-01-01T00:01:00+05:00") == 60
+        assert epoch_key("1970-01-01T00:01:00.999") == 60
+        assert epoch_key("yesterday") is None
+        assert epoch_key(None) is None
+
+    def test_bounds_are_inclusive(self):
+        """A date covers its whole day; a datetime is taken to the second."""
+        day = 24 * 3600
+        assert time_bounds(dt.date(1970, 1, 2), dt.date(1970, 1, 2)) == (day, 2 * day)
+        assert time_bounds(until=dt.datetime(1970, 1, 1, 0, 0, 5)) == (None, 6)
+        assert time_bounds() == (None, None)
+
+
+class TestTimeIndex:
+    """Test bisecting the sorted keys."""
+
+    def test_span_returns_rows_in_order(self):
+        """Rows in range come back in row order whatever order their keys were added."""
+        index = TimeIndex.build([30, 10, None, 20, 10])
+        assert index.span((10, 21)) == [1, 3, 4]
+        assert index.span((None, 10)) == []
+        assert index.span((25, None)) == [0]
+
+    def test_keys_in_order_are_not_resorted(self):
+        """Appending in time order never triggers a sort."""
+        index = TimeIndex.build(range(5))
+        with patch.object(TimeIndex, "_sort") as sort:
+            assert index.span((1, 3)) == [1, 2]
+            sort.assert_not_called()
+
+    def test_table_keeps_index_current(self):
+        """Rows appended after the first range query are indexed as they arrive."""
+        table = EventTable.fold(EVENTS[:3])
+        assert table.matching(QueryFilters(since=dt.date(2025, 1, 15))) == [1, 2]
+        table.extend([EVENTS[3]])
+        with patch.object(TimeIndex, "build") as build:
+            assert table.matching(QueryFilters(since=dt.date(2025, 1, 15))) == [1, 2, 3]
+            build.assert_not_called()
+
+    def test_later_queries_read_no_timestamps(self):
+        """Once built, the index answers ranges without looking at any row's date."""
+        table = EventTable.fold(EVENTS)
+        table.matching(QueryFilters(since=dt.date(2025, 3, 1)))
+        with patch.object(EventTable, "_date_key") as key:
+            assert table.matching(QueryFilters(name="d", since=dt.date(2025, 3, 1))) == [6]
+            key.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "since, until, expected",
+    [
+        (dt.date(2025, 1, 15), None, ["b", "c", "late", "tz", "frac", "d"]),
+        (None, dt.date(2025, 1, 31), ["a", "b", "late"]),
+        (dt.date(2025, 2, 1), dt.date(2025, 2, 10), ["c", "tz", "frac"]),
+        (dt.datetime(2025, 2, 10, 9, 30), dt.datetime(2025, 2, 10, 9, 30), ["tz", "frac"]),
+        (dt.datetime(2025, 1, 31, 23, 59, 59), dt.datetime(2025, 2, 1), ["b", "c"]),
+        (dt.date(2025, 4, 1), None, []),
+    ],
+)
+def test_range_queries(store, since, until, expected):
+    """Every engine returns the events between both bounds, in log order."""
+    store.append_many(EVENTS)
+    assert _names(store.query(since=since, until=until)) == expected
+
+
+def test_streaming_reader_matches(tmp_path):
+    """The streaming ``packages.json`` reader applies the same bounds."""
+    store = JsonArrayStore(tmp_path)
+    store.cache = ParsedLogCache(max_events=0)
+    store.ensure()
+    store.append_many(EVENTS)
+    until = dt.date(2025, 1, 31)
+    assert _names(store.query(until=until)) == ["a", "b", "late"]
+
+
+def test_removals_fold_outside_range(tmp_path):
+    """An install in range still shows a removal logged after the range."""
+    store = open_store("journal", tmp_path)
+    store.ensure()
+    store.append_many([EVENTS[0], make_event("a", "remove", date="2025-03-01T00:00:00")])
+    [record] = store.query(until=dt.date(2025, 1, 31))
+    assert record["removed"] and record["date_removed"] == "2025-03-01T00:00:00"
+
+
+class TestSqliteEpochColumn:
+    """Test the indexed epoch column of ``packages.db``."""
+
+    def test_range_uses_index(self, tmp_path):
+        """Range filters are an index search, not a table scan."""
+        store = SqliteStore(tmp_path)
+        store.ensure()
+        with sqlite3.connect(store.path) as conn:
+            plan = " ".join(
+                row[-1]
+                for row in conn.execute(
+                    "EXPLAIN QUERY PLAN SELECT id FROM events WHERE epoch >= ? AND epoch < ?",
+                    (0, 1),
+                )
+            )
+        assert "idx_events_epoch" in plan
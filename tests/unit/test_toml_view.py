@@ -0,0 +1,97 @@
+"""Unit tests for the lazily materialized TOML view"""
+
+import time
+from unittest.mock import patch
+
+import pytest
+
+from src.plogr.config import Config
+from src.plogr.logger import PackageLogger, TOML_GENERATION_HEADER
+from src.plogr.monitors.toml_view import TomlViewRefresher
+
+toml = pytest.importorskip("toml")
+
+
+@pytest.fixture()
+def pkg_logger(tmp_path):
+    with patch("pathlib.Path.home", return_value=tmp_path):
+        config = Config()
+        config.set("scope", "user")
+        yield PackageLogger(config)
+
+
+class TestTomlView:
+    """Test TOML generation stamps and on-demand regeneration."""
+
+    def test_log_package_does_not_rewrite_toml(self, pkg_logger):
+        """Writes only touch the event store."""
+        with patch.object(pkg_logger, "_rewrite_toml_from_json_data") as mock_rewrite:
+            pkg_logger.log_package("pkg1", "dnf", "install")
+
+        mock_rewrite.assert_not_called()
+        assert pkg_logger.toml_is_stale()
+
+    def test_materialize_stamps_generation(self, pkg_logger):
+        """The regenerated view records the store generation it was built from."""
+        pkg_logger.log_package("pkg1", "dnf", "install")
+        pkg_logger.log_package("pkg1", "dnf", "remove")
+
+        assert pkg_logger.materialize_toml() is True
+        content = pkg_logger.toml_file.read_text()
+        assert content.startswith(TOML_GENERATION_HEADER + pkg_logger.store.generation())
+        assert "# --REMOVED--" in content
+        assert toml.loads(content)["name"] == "pkg1"
+        assert not pkg_logger.toml_is_stale()
+
+        # Current view is left alone until the store changes again.
+        assert pkg_logger.materialize_toml() is False
+        pkg_logger.log_package("pkg2", "dnf", "install")
+        assert pkg_logger.toml_is_stale()
+
+    def test_materialize_other_engines(self, tmp_path):
+        """Non-JSON engines get the same derived view."""
+        with patch("pathlib.Path.home", return_value=tmp_path):
+            config = Config()
+            config.set("scope", "user")
+            config.set("log_format", "journal")
+            pkg_logger = PackageLogger(config)
+
+        pkg_logger.log_package("pkg1", "dnf", "install")
+        assert pkg_logger.materialize_toml() is True
+        assert 'name = "pkg1"' in pkg_logger.toml_file.read_text()
+
+
+class TestTomlViewRefresher:
+    """Test the daemon's debounced refresh job."""
+
+    def test_burst_is_coalesced_into_one_rewrite(self, pkg_logger):
+        """Events arriving faster than the delay produce a single regeneration."""
+        refresher = TomlViewRefresher(pkg_logger, delay=0.2, poll_interval=0.02)
+        with patch.object(
+            pkg_logger, "materialize_toml", wraps=pkg_logger.materialize_toml
+        ) as mock_materialize:
+            refresher.start()
+            try:
+                for i in range(5):
+                    pkg_logger.log_package(f"pkg{i}", "dnf", "install")
+                    time.sleep(0.05)
+                assert mock_materialize.call_count == 0
+
+                deadline = time.monotonic() + 3
+                while mock_materialize.call_count == 0 and time.monotonic() < deadline:
+                    time.sleep(0.02)
+                assert mock_materialize.call_count == 1
+            finally:
+                refresher.stop()
+
+        assert not pkg_logger.toml_is_stale()
+        assert 'name = "pkg4"' in pkg_logger.toml_file.read_text()
+
+    def test_stop_flushes_pending_changes(self, pkg_logger):
+        """Stopping the daemon leaves an up-to-date view behind."""
+        refresher = TomlViewRefresher(pkg_logger, delay=60, poll_interval=0.01)
+        refresher.start()
+        pkg_logger.log_package("pkg1", "dnf", "install")
+        refresher.stop()
+
+        assert not pkg_logger.toml_is_stale()
@@ -0,0 +1,130 @@
+"""Unit tests for the background writer thread"""
+
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.plogr.config import Config
+from src.plogr.logger import PackageLogger
+from src.plogr.writer import BackgroundWriter
+
+
+def _entry(name, key=None):
+    entry = {"name": name, "manager": "dnf", "action": "install"}
+    if key:
+        entry["idempotency_key"] = key
+    return entry
+
+
+class _BlockingCommit:
+    """Commit callable that holds the writer on its first call until released"""
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, entries):
+        self.calls.append([e["name"] for e in entries])
+        if len(self.calls) == 1:
+            self.started.set()
+            self.release.wait(5)
+        return sum(not e.get("idempotency_key", "").startswith("dup") for e in entries)
+
+
+class TestBackgroundWriter:
+    """Test batching, futures and shutdown."""
+
+    def test_queued_submissions_share_a_commit(self):
+        """Everything queued while a write runs goes out in the next single commit."""
+        commit = _BlockingCommit()
+        writer = BackgroundWriter(commit, MagicMock())
+        first = writer.submit([_entry("a")])
+        assert commit.started.wait(5)
+        later = [writer.submit([_entry(name)]) for name in ("b", "c", "d")]
+        commit.release.set()
+        writer.close()
+
+        assert commit.calls == [["a"], ["b", "c", "d"]]
+        assert first.result() == 1
+        assert [f.result() for f in later] == [1, 1, 1]
+
+    def test_keyed_submissions_are_committed_alone(self):
+        """A duplicate is charged to the submission that carried it."""
+        commit = _BlockingCommit()
+        writer = BackgroundWriter(commit, MagicMock())
+        writer.submit([_entry("a")])
+        assert commit.started.wait(5)
+        plain = writer.submit([_entry("b")])
+        keyed = writer.submit([_entry("c", "dup-1"), _entry("d", "new-1")])
+        commit.release.set()
+        writer.close()
+
+        assert commit.calls == [["a"], ["b"], ["c", "d"]]
+        assert plain.result() == 1
+        assert keyed.result() == 1
+
+    def test_flush_syncs_after_pending_writes(self):
+        """flush() returns once earlier writes are committed and synced."""
+        order = []
+        writer = BackgroundWriter(
+            lambda entries: order.append("write") or len(entries), lambda: order.append("sync")
+        )
+        writer.submit([_entry("a")])
+        writer.flush(timeout=5)
+        assert order == ["write", "sync"]
+        writer.close()
+
+    def test_failed_write_sets_exception(self):
+        """The error reaches the future instead of killing the thread."""
+        writer = BackgroundWriter(MagicMock(side_effect=OSError("disk full")), MagicMock())
+        with pytest.raises(OSError, match="disk full"):
+            writer.submit([_entry("a")]).result(5)
+        writer.close()
+
+    def test_submit_after_close_fails(self):
+        """A closed writer accepts nothing more."""
+        writer = BackgroundWriter(MagicMock(return_value=1), MagicMock())
+        writer.close()
+        writer.close()
+        with pytest.raises(RuntimeError):
+            writer.submit([_entry("a")])
+
+
+class TestAsyncLogger:
+    """Test PackageLogger with async_writes."""
+
+    def _logger(self, tmp_path, log_format="journal"):
+        with patch("pathlib.Path.home", return_value=tmp_path):
+            config = Config()
+            config.set("scope", "user")
+            config.set("log_format", log_format)
+            config.set("async_writes", True)
+            return PackageLogger(config)
+
+    def test_submit_and_flush(self, tmp_path):
+        """Submitted events are in the log once flush() returns."""
+        logger = self._logger(tmp_path)
+        futures = [logger.submit_package(f"pkg{i}", "dnf", "install") for i in range(5)]
+        logger.flush()
+        assert [f.result() for f in futures] == [1] * 5
+        assert len(logger.query()) == 5
+        logger.close()
+
+    def test_blocking_calls_keep_their_results(self, tmp_path):
+        """log_package still reports duplicates and invalid events through the writer."""
+        logger = self._logger(tmp_path)
+        assert logger.log_package("pkg", "dnf", "install", transaction_id="7") is True
+        assert logger.log_package("pkg", "dnf", "install", transaction_id="7") is False
+        assert logger.submit_package("", "dnf", "install").result() == 0
+        logger.close()
+
+    def test_close_drains_queue(self, tmp_path):
+        """Closing writes what is still queued and falls back to inline writes."""
+        logger = self._logger(tmp_path, "both")
+        with logger:
+            logger.submit_packages([{"name": "a", "manager": "dnf", "action": "install"}] * 3)
+        assert logger.writer is None
+        assert len(logger.query()) == 3
+        assert logger.log_package("b", "dnf", "install") is True